@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Measure the time and memory it takes to import flowy.
+
+Every statement runs in a fresh interpreter, the best time out of the repeats
+is reported together with the peak RSS of the child and whether boto3 got
+imported. One JSON line is printed for each statement.
+
+    $ python benchmarks/import_time.py --repeats 10
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import subprocess
+import sys
+
+
+STATEMENTS = [
+    'import flowy',
+    'from flowy import LocalWorkflow',
+    'from flowy import SWFWorkflowWorker',
+]
+
+CHILD = """
+import resource, sys, time
+start = time.time()
+%s
+duration = time.time() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print('%%r %%r %%r' %% (duration, rss, 'boto3' in sys.modules))
+"""
+
+
+def measure(statement):
+    output = subprocess.check_output([sys.executable, '-c', CHILD % statement])
+    duration, rss, boto3 = output.decode('utf-8').split()
+    return float(duration), int(rss), boto3 == 'True'
+
+
+def run(statement, repeats):
+    results = [measure(statement) for _ in range(repeats)]
+    baseline_rss = min(measure('pass')[1] for _ in range(repeats))
+    return {
+        'benchmark': 'import_time',
+        'statement': statement,
+        'seconds': min(r[0] for r in results),
+        'rss_kb': min(r[1] for r in results) - baseline_rss,
+        'boto3': results[0][2],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    for statement in STATEMENTS:
+        print(json.dumps(run(statement, args.repeats)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Compare the local backend activity/decision executor combinations.
+
+Runs the same map/reduce workflow with every combination of thread and
+process pools for activities and decisions, with and without the warm up,
+and prints one JSON line per combination.
+
+    $ python benchmarks/local_executors.py --activities 200
+"""
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from flowy import LocalWorkflow
+from flowy import parallel_reduce
+
+
+def square(x):
+    return x * x
+
+
+def add(x, y):
+    return x + y
+
+
+class MapReduce(object):
+    def __init__(self, square, add):
+        self.square = square
+        self.add = add
+
+    def __call__(self, n):
+        return parallel_reduce(self.add, [self.square(i) for i in range(n)])
+
+
+EXECUTORS = {
+    'thread': ThreadPoolExecutor,
+    'process': ProcessPoolExecutor,
+}
+
+
+def run(activities, activity_executor, decision_executor, warm_up):
+    w = LocalWorkflow(MapReduce,
+                      activity_executor=EXECUTORS[activity_executor],
+                      decision_executor=EXECUTORS[decision_executor],
+                      warm_up=warm_up)
+    w.conf_activity('square', square)
+    w.conf_activity('add', add)
+    start = time.time()
+    result = w.run(activities, _wait=True)
+    duration = time.time() - start
+    assert result == sum(i * i for i in range(activities))
+    return {
+        'benchmark': 'local_executors',
+        'activities': activities,
+        'activity_executor': activity_executor,
+        'decision_executor': decision_executor,
+        'warm_up': warm_up,
+        'seconds': duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--activities', type=int, default=200)
+    args = parser.parse_args()
+    combinations = itertools.product(sorted(EXECUTORS), sorted(EXECUTORS),
+                                     [False, True])
+    for activity_executor, decision_executor, warm_up in combinations:
+        print(json.dumps(run(args.activities, activity_executor,
+                             decision_executor, warm_up)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Measure how the local runner copes with a large fan-out.
+
+A single workflow schedules N activities at once and sums their results. The
+benchmark reports the end-to-end time and the number of decisions executed per
+completed activity; the lower, the better the completions are coalesced.
+
+    $ python benchmarks/local_fanout.py --activities 10000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from flowy import LocalWorkflow
+
+
+def activity(x):
+    return x
+
+
+class FanOut(object):
+    def __init__(self, a):
+        self.a = a
+
+    def __call__(self, n):
+        # Schedule everything before touching any of the results
+        results = [self.a(i) for i in range(n)]
+        return sum(results)
+
+
+class CountingLocalWorkflow(LocalWorkflow):
+    """Count the decisions. Only accurate with in-process decisions."""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingLocalWorkflow, self).__init__(*args, **kwargs)
+        self.decisions = 0
+        self.decisions_lock = threading.Lock()
+
+    def __call__(self, state, input_data, tracer):
+        with self.decisions_lock:
+            self.decisions += 1
+        return super(CountingLocalWorkflow, self).__call__(
+            state, input_data, tracer)
+
+
+def run(activities, activity_workers):
+    w = CountingLocalWorkflow(FanOut,
+                              activity_workers=activity_workers,
+                              workflow_workers=1,
+                              executor=ThreadPoolExecutor)
+    w.conf_activity('a', activity)
+    start = time.time()
+    result = w.run(activities, _wait=True)
+    duration = time.time() - start
+    assert result == sum(range(activities))
+    return {
+        'benchmark': 'local_fanout',
+        'activities': activities,
+        'activity_workers': activity_workers,
+        'decisions': w.decisions,
+        'decisions_per_activity': float(w.decisions) / activities,
+        'seconds': duration,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--activities', type=int, default=10000)
+    parser.add_argument('--activity-workers', type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.activities, args.activity_workers)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Measure the end to end SWF worker throughput against the emulator.
+
+Starts a number of fan-out workflows at once and runs the deciders and the
+activity workers in threads, talking to an in-memory SWF emulator. Prints
+one JSON line with the throughput and the workflow latencies.
+
+    $ python benchmarks/swf_emulator.py --workflows 50 --deciders 4
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+import uuid
+
+from flowy import SWFActivityConfig
+from flowy import SWFActivityWorker
+from flowy import SWFClient
+from flowy import SWFWorkflowConfig
+from flowy import SWFWorkflowStarter
+from flowy import SWFWorkflowWorker
+from flowy.swf.emulator import SWFEmulator
+
+
+DOMAIN = 'benchmark'
+TASK_LIST = 'benchmark'
+
+a_conf = SWFActivityConfig(default_task_list=TASK_LIST,
+                           default_schedule_to_start=600,
+                           default_schedule_to_close=600,
+                           default_start_to_close=600,
+                           default_heartbeat=600)
+
+
+def task(hb, x):
+    return x + 1
+
+
+w_conf = SWFWorkflowConfig(default_task_list=TASK_LIST,
+                           default_decision_duration=600,
+                           default_workflow_duration=3600,
+                           default_child_policy='TERMINATE')
+w_conf.conf_activity('task', 1)
+
+
+class FanOut(object):
+    def __init__(self, task):
+        self.task = task
+
+    def __call__(self, n):
+        results = [self.task(i) for i in range(n)]
+        return sum(results)
+
+
+def start_workers(swf_client, deciders, activity_workers):
+    workflow_worker = SWFWorkflowWorker()
+    workflow_worker.register(w_conf, FanOut, version=1)
+    activity_worker = SWFActivityWorker()
+    activity_worker.register(a_conf, task, version=1)
+    workflow_worker.register_remote(swf_client, DOMAIN)
+    activity_worker.register_remote(swf_client, DOMAIN)
+    for worker, count in ((workflow_worker, deciders),
+                          (activity_worker, activity_workers)):
+        for _ in range(count):
+            t = threading.Thread(target=worker.run_forever,
+                                 args=(DOMAIN, TASK_LIST),
+                                 kwargs={'swf_client': swf_client,
+                                         'setup_log': False,
+                                         'register_remote': False})
+            t.daemon = True
+            t.start()
+
+
+def run(workflows, activities, deciders, activity_workers):
+    emulator = SWFEmulator()
+    swf_client = SWFClient(client=emulator)
+    start_workers(swf_client, deciders, activity_workers)
+    start = time.time()
+    runs = []
+    for _ in range(workflows):
+        wid = str(uuid.uuid4())
+        runs.append((wid, SWFWorkflowStarter(
+            DOMAIN, 'FanOut', 1, wid=wid, swf_client=swf_client)(activities)))
+    latencies = []
+    for wid, run_id in runs:
+        status = emulator.wait_closed(wid, run_id)
+        assert status == 'COMPLETED', status
+        first, = swf_client.get_workflow_execution_history(
+            DOMAIN, wid, run_id, max_page_size=1)['events']
+        last, = swf_client.get_workflow_execution_history(
+            DOMAIN, wid, run_id, reverse_order=True, max_page_size=1)['events']
+        latencies.append(last['eventTimestamp'] - first['eventTimestamp'])
+    duration = time.time() - start
+    latencies.sort()
+    return {
+        'benchmark': 'swf_emulator',
+        'workflows': workflows,
+        'activities': activities,
+        'deciders': deciders,
+        'activity_workers': activity_workers,
+        'seconds': duration,
+        'workflows_per_second': workflows / duration,
+        'activities_per_second': workflows * activities / duration,
+        'latency_median': latencies[len(latencies) // 2],
+        'latency_max': latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workflows', type=int, default=50)
+    parser.add_argument('--activities', type=int, default=20)
+    parser.add_argument('--deciders', type=int, default=4)
+    parser.add_argument('--activity-workers', type=int, default=8)
+    args = parser.parse_args()
+    print(json.dumps(run(args.workflows, args.activities, args.deciders,
+                         args.activity_workers)))
+
+
+if __name__ == '__main__':
+    main()
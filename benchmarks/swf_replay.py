@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""Measure the SWF decision replay cost as the history grows.
+
+Synthetic histories are generated for three workflow shapes: a fan-out of
+independent activities, a chain of dependent activities and a parallel reduce.
+For every shape and size the benchmark times:
+
+ * poll: paging through the history and parsing it, using poll_decision;
+ * replay: the same, plus running the workflow code over the history up to
+   the final decision, like a decider does on every decision task;
+ * serialization: encoding, decoding and traversing the task results.
+
+One JSON line is printed for each measurement, the best time out of the
+repeats is reported.
+
+    $ python benchmarks/swf_replay.py --sizes 10 100 1000 10000 100000
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import time
+
+from flowy import SWFWorkflowConfig
+from flowy import SWFWorkflowWorker
+from flowy import parallel_reduce
+from flowy.serialization import dumps
+from flowy.serialization import loads
+from flowy.serialization import traverse_data
+from flowy.swf.history import SWFExecutionHistory
+from flowy.swf.worker import load_events
+from flowy.swf.worker import poll_decision
+
+
+DOMAIN = 'benchmark'
+TASK_LIST = 'benchmark'
+PAGE_SIZE = 1000  # the SWF maximum
+
+
+class FanOut(object):
+    def __init__(self, task, red):
+        self.task = task
+
+    def __call__(self, n):
+        results = [self.task(i) for i in range(n)]
+        return sum(results)
+
+
+class Chain(object):
+    def __init__(self, task, red):
+        self.task = task
+
+    def __call__(self, n):
+        x = 0
+        for _ in range(n):
+            x = self.task(x)
+        return x
+
+
+class Reduce(object):
+    def __init__(self, task, red):
+        self.task = task
+        self.red = red
+
+    def __call__(self, n):
+        return parallel_reduce(self.red, [self.task(i) for i in range(n)])
+
+
+WORKFLOWS = {
+    'fanout': FanOut,
+    'chain': Chain,
+    'reduce': Reduce,
+}
+
+# The approximate number of events added for each task, used to pick the
+# number of tasks for a history size.
+EVENTS_PER_TASK = {
+    'fanout': 3,
+    'chain': 6,
+    'reduce': 7,
+}
+
+
+def task(x):
+    return x + 1
+
+
+def red(x, y):
+    return x + y
+
+
+ACTIVITIES = {'task': task, 'red': red}
+
+# Schedule everything at once, the rate limit only slows down the history
+# generation, not the final decision replay.
+config = SWFWorkflowConfig(rate_limit=10 ** 9)
+config.conf_activity('task', version=1)
+config.conf_activity('red', version=1)
+
+worker = SWFWorkflowWorker()
+for name, workflow in WORKFLOWS.items():
+    worker.register(config, workflow, version=1, name=name)
+
+
+class HistoryBuilder(object):
+    """Append SWF events to a history, the way SWF would record them."""
+
+    def __init__(self, name, input_data):
+        self.events = []
+        self.add('WorkflowExecutionStarted', {
+            'workflowType': {'name': name, 'version': '1'},
+            'taskList': {'name': TASK_LIST},
+            'taskStartToCloseTimeout': '60',
+            'executionStartToCloseTimeout': '3600',
+            'childPolicy': 'TERMINATE',
+            'input': input_data,
+        })
+        self.decision_scheduled()
+
+    def add(self, e_type, attrs):
+        event_id = len(self.events) + 1
+        attrs_key = e_type[0].lower() + e_type[1:] + 'EventAttributes'
+        self.events.append({'eventId': event_id, 'eventType': e_type,
+                            'eventTimestamp': 1e9 + event_id,
+                            attrs_key: attrs})
+        return event_id
+
+    def decision_scheduled(self):
+        self.scheduled_id = self.add('DecisionTaskScheduled', {
+            'taskList': {'name': TASK_LIST}})
+
+    def decision(self):
+        """Start the scheduled decision."""
+        self.started_id = self.add('DecisionTaskStarted', {
+            'scheduledEventId': self.scheduled_id})
+
+    def decision_completed(self):
+        return self.add('DecisionTaskCompleted', {
+            'scheduledEventId': self.scheduled_id,
+            'startedEventId': self.started_id})
+
+    def activity(self, call_key, name, input_data, completed_id):
+        """Schedule, run and complete an activity."""
+        args, kwargs = loads(input_data)
+        scheduled_id = self.add('ActivityTaskScheduled', {
+            'activityId': call_key,
+            'activityType': {'name': name, 'version': '1'},
+            'input': input_data,
+            'decisionTaskCompletedEventId': completed_id})
+        started_id = self.add('ActivityTaskStarted', {
+            'scheduledEventId': scheduled_id})
+        self.add('ActivityTaskCompleted', {
+            'scheduledEventId': scheduled_id,
+            'startedEventId': started_id,
+            'result': dumps(ACTIVITIES[name](*args, **kwargs))})
+
+
+class RecordingDecision(object):
+    """Collect the activities scheduled by a decision."""
+
+    def __init__(self):
+        self.scheduled = []
+        self.closed = False
+
+    def schedule_activity(self, call_key, name, version, input_data, *args):
+        self.scheduled.append((call_key, name, input_data))
+
+    def flush(self):
+        self.closed = True
+
+    def finish(self, result):
+        self.closed = True
+
+    def fail(self, reason):
+        raise RuntimeError('The workflow failed: %s' % reason)
+
+    def restart(self, input_data):
+        raise RuntimeError('Unexpected restart.')
+
+
+def make_history(name, tasks):
+    """Run the workflow until it finishes, completing all the activities
+    scheduled by a decision before the next one starts.
+
+    Returns the history up to the start of the final decision.
+    """
+    input_data = dumps([[tasks], {}])
+    builder = HistoryBuilder(name, input_data)
+    while 1:
+        builder.decision()
+        execution_history = SWFExecutionHistory(*load_events(builder.events))
+        decision = RecordingDecision()
+        worker(name, '1', input_data, decision, execution_history)
+        if not decision.scheduled:
+            return builder.events
+        completed_id = builder.decision_completed()
+        for call_key, activity_name, activity_input in decision.scheduled:
+            builder.activity(call_key, activity_name, activity_input,
+                             completed_id)
+        builder.decision_scheduled()
+
+
+def make_chain_history(tasks):
+    """Same as make_history('chain', tasks) but in linear time.
+
+    Running the decisions one by one would be quadratic in the chain length.
+    """
+    input_data = dumps([[tasks], {}])
+    builder = HistoryBuilder('chain', input_data)
+    for i in range(tasks):
+        builder.decision()
+        completed_id = builder.decision_completed()
+        builder.activity('task-%s-0' % i, 'task', dumps([[i], {}]),
+                         completed_id)
+        builder.decision_scheduled()
+    builder.decision()
+    return builder.events
+
+
+class PagesClient(object):
+    """Serve a history in pages, like PollForDecisionTask does."""
+
+    def __init__(self, events):
+        self.events = events
+        self.responses = []
+
+    def poll_for_decision_task(self, domain, task_list, identity=None,
+                               next_page_token=None, **kwargs):
+        start = int(next_page_token or 0)
+        page = {'taskToken': 'token',
+                'events': self.events[start:start + PAGE_SIZE]}
+        if start + PAGE_SIZE < len(self.events):
+            page['nextPageToken'] = str(start + PAGE_SIZE)
+        return page
+
+    def respond_decision_task_completed(self, token, decisions=None, **kwargs):
+        self.responses.append(decisions)
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def bench_poll(events):
+    client = PagesClient(events)
+    poll_decision(client, DOMAIN, TASK_LIST)
+
+
+def bench_replay(events):
+    client = PagesClient(events)
+    name, version, input_data, exec_history, decision = poll_decision(
+        client, DOMAIN, TASK_LIST)
+    worker(name, version, input_data, decision, exec_history)
+    assert client.responses, 'No decision was sent.'
+
+
+def bench_serialization(tasks):
+    value = [{'task': i, 'result': [i, str(i)]} for i in range(tasks)]
+    traverse_data(loads(dumps(value)))
+
+
+def run(workflow, size, repeat):
+    tasks = max(size // EVENTS_PER_TASK[workflow], 1)
+    result = {
+        'benchmark': 'swf_replay',
+        'workflow': workflow,
+        'tasks': tasks,
+    }
+    start = time.time()
+    try:
+        if workflow == 'chain':
+            events = make_chain_history(tasks)
+        else:
+            events = make_history(workflow, tasks)
+    except RuntimeError as e:
+        # e.g. the workflow code exceeding the recursion limit
+        result['error'] = str(e)
+        return result
+    result['events'] = len(events)
+    result['generate_seconds'] = time.time() - start
+    result['poll_seconds'] = best_time(lambda: bench_poll(events), repeat)
+    result['replay_seconds'] = best_time(lambda: bench_replay(events), repeat)
+    result['serialization_seconds'] = best_time(
+        lambda: bench_serialization(tasks), repeat)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10, 100, 1000, 10000, 100000],
+                        help='the approximate number of events in a history')
+    parser.add_argument('--workflows', nargs='+', choices=sorted(WORKFLOWS),
+                        default=sorted(WORKFLOWS))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for workflow in args.workflows:
+        for size in args.sizes:
+            print(json.dumps(run(workflow, size, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
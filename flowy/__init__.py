@@ -1,14 +1,62 @@
-from flowy.local.config import LocalWorkflow
-from flowy.swf.config import SWFActivityConfig
-from flowy.swf.config import SWFWorkflowConfig
-from flowy.swf.client import SWFClient
-from flowy.swf.starter import SWFWorkflowStarter
-from flowy.swf.worker import SWFActivityWorker
-from flowy.swf.worker import SWFWorkflowWorker
-from flowy.operations import finish_order
-from flowy.operations import first
-from flowy.operations import parallel_reduce
-from flowy.result import restart
-from flowy.result import TaskError
-from flowy.result import TaskTimedout
-from flowy.result import wait
+"""The public names are imported lazily, on first use.
+
+Importing the SWF backend pulls in boto3, which is slow and memory hungry;
+LocalWorkflow users and the process pool workers don't need it.
+"""
+
+import importlib
+import sys
+import types
+
+
+_LAZY = {
+    'LocalWorkflow': 'flowy.local.config',
+    'AggregateMetrics': 'flowy.metrics',
+    'StatsdMetrics': 'flowy.metrics',
+    'SWFActivityConfig': 'flowy.swf.config',
+    'SWFWorkflowConfig': 'flowy.swf.config',
+    'SWFClient': 'flowy.swf.client',
+    'SWFWorkflowStarter': 'flowy.swf.starter',
+    'SWFActivityWorker': 'flowy.swf.worker',
+    'SWFWorkflowWorker': 'flowy.swf.worker',
+    'finish_order': 'flowy.operations',
+    'first': 'flowy.operations',
+    'parallel_reduce': 'flowy.operations',
+    'restart': 'flowy.result',
+    'TaskError': 'flowy.result',
+    'TaskTimedout': 'flowy.result',
+    'wait': 'flowy.result',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    try:
+        module_name = _LAZY[name]
+    except KeyError:
+        raise AttributeError(
+            "module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module(module_name), name)
+    setattr(sys.modules[__name__], name, value)  # don't come back here
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+if sys.version_info < (3, 7):
+    # No module __getattr__ (PEP 562), swap in a module subclass instead
+    class _LazyModule(types.ModuleType):
+        def __getattr__(self, name):
+            return __getattr__(name)
+
+        def __dir__(self):
+            return __dir__()
+
+    _module = _LazyModule(__name__, __doc__)
+    _module.__dict__.update(globals())
+    # Python 2 clears the globals of a collected module, keep it alive
+    _module._original = sys.modules[__name__]
+    sys.modules[__name__] = _module
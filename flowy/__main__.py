@@ -1,11 +1,40 @@
 import argparse
+import itertools
+import json
 import sys
+import time
 
 from flowy import SWFWorkflowStarter
 
 
-def main():
-    parser = argparse.ArgumentParser()
+COMMANDS = ('analyze', 'analyze-run', 'replay', 'worker')
+
+
+def main(argv=None):
+    """Run a command, or start a workflow: flowy DOMAIN NAME VERSION ...
+
+    A leading -- forces the start form, for a domain named like a command:
+    flowy -- replay NAME VERSION.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] == '--':
+        return start(argv[1:])
+    if argv and argv[0] in ('analyze', 'analyze-run'):
+        return analyze(argv)
+    if argv and argv[0] == 'replay':
+        return replay(argv[1:])
+    if argv and argv[0] == 'worker':
+        return worker(argv[1:])
+    return start(argv)
+
+
+def start(argv):
+    parser = argparse.ArgumentParser(
+        prog='flowy',
+        usage='flowy [--] domain name version [options] [args ...]',
+        epilog='The other commands are %s. Use flowy -- domain ... to start '
+        'a workflow in a domain named like a command.' % ', '.join(COMMANDS))
     parser.add_argument("domain")
     parser.add_argument("name")
     parser.add_argument("version")
@@ -14,9 +43,17 @@ def main():
     parser.add_argument("--workflow-duration", type=int, default=None)
     parser.add_argument("--child-policy", type=str, default=None)
     parser.add_argument("--lambda-role", type=str, default=None)
+    parser.add_argument("--from-file", metavar='PATH',
+                        help='start a workflow for each [args, kwargs] JSON '
+                        'line in the file, - for stdin, and print the results '
+                        'as JSON lines')
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help='the number of concurrent starts for --from-file')
     parser.add_argument('args', nargs=argparse.REMAINDER)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.from_file and args.args:
+        parser.error('cannot use both --from-file and arguments')
 
     starter = SWFWorkflowStarter(args.domain, args.name, args.version,
                                  swf_client=None, task_list=args.task_list,
@@ -24,8 +61,191 @@ def main():
                                  workflow_duration=args.workflow_duration,
                                  child_policy=args.child_policy,
                                  lambda_role=args.lambda_role)
+    if args.from_file:
+        if args.from_file == '-':
+            return start_many(starter, sys.stdin, args.concurrency)
+        with open(args.from_file) as f:
+            return start_many(starter, f, args.concurrency)
     return not starter(*args.args)  # 0 is success
 
 
+def start_many(starter, lines, concurrency, out=None, progress=None,
+               progress_interval=5):
+    """Start the workflows for the JSON lines, print the results.
+
+    Each result is a JSON object on its own line, with the input line number
+    and either the workflow and run ids or the error. A progress line is
+    written every progress_interval seconds. Returns 0 if all the workflows
+    were started.
+    """
+    out = sys.stdout if out is None else out
+    progress = sys.stderr if progress is None else progress
+    counts = {'started': 0, 'failed': 0}
+    line_numbers = {}  # input index -> line number, for the pending starts
+    indexes = itertools.count()
+
+    def write(result):
+        counts['failed' if 'error' in result else 'started'] += 1
+        out.write(json.dumps(result, sort_keys=True) + '\n')
+
+    def inputs():
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                args, kwargs = json.loads(line)
+                if not isinstance(args, list) or not isinstance(kwargs, dict):
+                    raise ValueError()
+            except (ValueError, TypeError):
+                write({'line': number, 'error': 'Invalid [args, kwargs] line.'})
+                continue
+            line_numbers[next(indexes)] = number
+            yield args, kwargs
+
+    start_time = last_progress = time.time()
+    for result in starter.start_many(inputs(), concurrency):
+        number = line_numbers.pop(result.index)
+        if result.error is None:
+            write({'line': number, 'workflowId': result.wid,
+                   'runId': result.run_id})
+        else:
+            write({'line': number, 'error': str(result.error)})
+        now = time.time()
+        if now - last_progress >= progress_interval:
+            last_progress = now
+            done = counts['started'] + counts['failed']
+            progress.write('%s started, %s failed, %.1f/s\n' % (
+                counts['started'], counts['failed'],
+                done / (now - start_time)))
+    progress.write('%s started, %s failed in %.1fs\n' % (
+        counts['started'], counts['failed'], time.time() - start_time))
+    return int(counts['failed'] > 0)
+
+
+def analyze(argv):
+    parser = argparse.ArgumentParser(
+        prog='flowy', description='Analyze a workflow execution history.')
+    subparsers = parser.add_subparsers(dest='command')
+    from_file = subparsers.add_parser(
+        'analyze', help='analyze a history saved in a (gzip) JSON file')
+    from_file.add_argument('path')
+    from_run = subparsers.add_parser(
+        'analyze-run', help='analyze the history of a workflow execution')
+    from_run.add_argument('domain')
+    from_run.add_argument('workflow_id')
+    from_run.add_argument('run_id')
+    for p in (from_file, from_run):
+        p.add_argument('--top', type=int, default=10)
+        p.add_argument('--chrome-trace', metavar='PATH',
+                       help='also export the history in the Chrome trace '
+                       'format')
+
+    args = parser.parse_args(argv)
+
+    from flowy.swf import analysis
+    if args.command == 'analyze':
+        events = analysis.load_history_file(args.path)
+    else:
+        from flowy.swf.client import SWFClient
+        events = analysis.get_history(SWFClient(), args.domain,
+                                      args.workflow_id, args.run_id)
+    print(analysis.report(events, top=args.top))
+    if args.chrome_trace:
+        with open(args.chrome_trace, 'w') as f:
+            json.dump(analysis.to_chrome_trace(events), f)
+    return 0
+
+
+def replay(argv):
+    parser = argparse.ArgumentParser(
+        prog='flowy replay',
+        description='Replay a decision from a saved workflow execution '
+        'history and print the decisions.')
+    parser.add_argument('path', help='the history, a (gzip) JSON file')
+    parser.add_argument('worker', help='the module defining the workflow, '
+                        'scanned for workflows, or module:attribute naming a '
+                        'SWFWorkflowWorker')
+    parser.add_argument('--upto', type=int, metavar='EVENT_ID',
+                        help='replay the last decision started at or before '
+                        'this event, the default is the last decision')
+    parser.add_argument('--profile', action='store_true',
+                        help='run under cProfile and tracemalloc and report '
+                        'the hot frames')
+    parser.add_argument('--top', type=int, default=20)
+
+    args = parser.parse_args(argv)
+
+    from flowy.swf import analysis
+    from flowy.swf import replay
+    events = analysis.load_history_file(args.path)
+    worker = replay.load_worker(args.worker)
+    if args.profile:
+        decisions, profile_report = replay.profile(
+            args.top, replay.replay, worker, events, upto=args.upto)
+    else:
+        decisions = replay.replay(worker, events, upto=args.upto)
+    print(json.dumps(decisions, indent=2, sort_keys=True))
+    if args.profile:
+        print(profile_report)
+    return 0
+
+
+def worker(argv):
+    parser = argparse.ArgumentParser(
+        prog='flowy worker',
+        description='Run a worker in pre-forked processes that share the '
+        'imported code.')
+    parser.add_argument('kind', choices=['activity', 'workflow'])
+    parser.add_argument('domain')
+    parser.add_argument('task_list')
+    parser.add_argument('package', help='the package to scan for tasks')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='the number of worker processes, the default is '
+                        'the number of CPUs')
+    parser.add_argument('--threads', metavar='N or MIN:MAX', default='1',
+                        help='the polling threads in each process, MIN:MAX '
+                        'scales them with the pending tasks')
+    parser.add_argument('--max-tasks', type=int, default=None,
+                        help='replace a process after this many tasks')
+    parser.add_argument('--max-rss', type=int, default=None, metavar='MB',
+                        help='replace a process once it uses more memory; '
+                        'without /proc this is the peak memory use')
+    parser.add_argument('--manifest', metavar='PATH',
+                        help='a scan manifest, see Worker.write_manifest')
+    parser.add_argument('--registration-cache', metavar='PATH',
+                        help='a file to cache the verified remote types in')
+    parser.add_argument('--no-register', action='store_true',
+                        help="don't register the types remotely")
+
+    args = parser.parse_args(argv)
+
+    import importlib
+    import multiprocessing
+    from flowy import SWFActivityWorker
+    from flowy import SWFWorkflowWorker
+    from flowy.swf.client import SWFClient
+    from flowy.swf.supervisor import Supervisor
+    from flowy.utils import setup_default_logger
+
+    setup_default_logger()
+    worker_class = {'activity': SWFActivityWorker,
+                    'workflow': SWFWorkflowWorker}[args.kind]
+    w = worker_class(registration_cache=args.registration_cache)
+    w.scan(package=importlib.import_module(args.package),
+           manifest=args.manifest)
+    if not args.no_register:
+        w.register_remote(SWFClient(), args.domain)
+    processes = args.processes or multiprocessing.cpu_count()
+    max_rss = args.max_rss * 1024 * 1024 if args.max_rss else None
+    if ':' in args.threads:
+        concurrency = tuple(int(n) for n in args.threads.split(':', 1))
+    else:
+        concurrency = int(args.threads)
+    Supervisor(w, args.domain, args.task_list, processes=processes,
+               max_tasks=args.max_tasks, max_rss=max_rss,
+               concurrency=concurrency).run()
+    return 0
+
+
 if __name__ == '__main__':
     sys.exit(main())
@@ -3,6 +3,7 @@ import keyword
 
 import venusian
 
+from flowy.metrics import null_metrics
 from flowy.result import is_result_proxy
 from flowy.result import restart_type
 from flowy.result import SuspendTask
@@ -84,6 +85,10 @@ class ActivityConfig(object):
             def callback(venusian_scanner, *_):
                 """This gets called by venusian at scan time."""
                 self.register(venusian_scanner, key, func)
+                # Set by Worker.write_manifest
+                record = getattr(venusian_scanner, 'record_registration', None)
+                if record is not None:
+                    record(self.category, key, self, func)
 
             venusian.attach(func, callback, category=self.category)
             return func
@@ -99,7 +104,7 @@ class ActivityConfig(object):
         """Wrap the func so that it can be called with serialized input_data.
 
         The wrapped function can be called with this signature:
-        wrapped(input_data, *extra_args)
+        wrapped(input_data, *extra_args, metrics=None)
         This in turn, after deserializing the input_data, will call the original
         func like so: func(*(extra_args + args), **kwargs)
 
@@ -108,21 +113,30 @@ class ActivityConfig(object):
         # We can't pickle closures, thus making multiprocessing ->
         # concurrent.futures -> local backend fail. Instead, use partials.
         # This won't work on python 2.6, https://bugs.python.org/issue5228
-        return functools.partial(_activity_wrapper, self, func)
+        wrapped = functools.partial(_activity_wrapper, self, func)
+        wrapped.takes_metrics = True  # see Worker.__call__
+        return wrapped
 
 
-def _activity_wrapper(self, func, input_data, *extra_args):
-    try:
-        args, kwargs = self.deserialize_input(input_data)
-    except Exception:
-        logger.exception('Cannot deserialize the input:')
-        raise ValueError('Cannot deserialize the input: %r' % (input_data,))
-    result = func(*(tuple(extra_args) + tuple(args)), **kwargs)
-    try:
-        return self.serialize_result(result)
-    except Exception:
-        logger.exception('Cannot serialize the result:')
-        raise ValueError('Cannot serialize the result: %r' % (result,))
+def _activity_wrapper(self, func, input_data, *extra_args, **options):
+    metrics = options.get('metrics', null_metrics)
+    metrics.histogram('activity.input_size', len(input_data))
+    with metrics.timer('activity.deserialize'):
+        try:
+            args, kwargs = self.deserialize_input(input_data)
+        except Exception:
+            logger.exception('Cannot deserialize the input:')
+            raise ValueError('Cannot deserialize the input: %r' % (input_data,))
+    with metrics.timer('activity.execute'):
+        result = func(*(tuple(extra_args) + tuple(args)), **kwargs)
+    with metrics.timer('activity.serialize'):
+        try:
+            serialized_result = self.serialize_result(result)
+        except Exception:
+            logger.exception('Cannot serialize the result:')
+            raise ValueError('Cannot serialize the result: %r' % (result,))
+    metrics.histogram('activity.result_size', len(serialized_result))
+    return serialized_result
 
 
 class WorkflowConfig(ActivityConfig):
@@ -179,7 +193,7 @@ class WorkflowConfig(ActivityConfig):
         """Wrap the factory so that it can be called with serialized input_data.
 
         The wrapped factory can be called with this signature:
-        wrapped(input_data, *extra_args)
+        wrapped(input_data, *extra_args, metrics=None)
         This will instantiate all proxy factories, passing *extra_args to each
         instance and then, with all proxies, instantiate the factory.
         Finally, the factory instance is called with (*args, **kwargs) and its
@@ -188,7 +202,9 @@ class WorkflowConfig(ActivityConfig):
         There are some additional things going on, related to restart handling.
         """
         # See Activity.wrap for an explanation why there isn't a closure here.
-        return functools.partial(_workflow_wrapper, self, factory)
+        wrapped = functools.partial(_workflow_wrapper, self, factory)
+        wrapped.takes_metrics = True  # see Worker.__call__
+        return wrapped
 
     def __repr__(self):
         klass = self.__class__.__name__
@@ -200,17 +216,30 @@ class WorkflowConfig(ActivityConfig):
         return '<%s deps=%s>' % (klass, ','.join(deps))
 
 
-def _workflow_wrapper(self, factory, input_data, *extra_args):
+def _workflow_wrapper(self, factory, input_data, *extra_args, **options):
+    metrics = options.get('metrics', null_metrics)
     wf_kwargs = {}
     for dep_name, proxy in self.proxy_factory_registry.items():
         wf_kwargs[dep_name] = proxy(*extra_args)
     func = factory(**wf_kwargs)
+    with metrics.timer('workflow.deserialize'):
+        try:
+            args, kwargs = self.deserialize_input(input_data)
+        except Exception:
+            logger.exception('Cannot deserialize the input:')
+            raise ValueError('Cannot deserialize the input: %r' % (input_data,))
+    replay = metrics.timer('workflow.replay').start()
     try:
-        args, kwargs = self.deserialize_input(input_data)
-    except Exception:
-        logger.exception('Cannot deserialize the input:')
-        raise ValueError('Cannot deserialize the input: %r' % (input_data,))
-    result = func(*args, **kwargs)
+        result = func(*args, **kwargs)
+    finally:
+        replay.stop()
+        metrics.histogram('workflow.proxy_calls', sum(
+            getattr(proxy, 'call_number', 0) for proxy in wf_kwargs.values()))
+    with metrics.timer('workflow.serialize'):
+        return _serialize_workflow_result(self, result)
+
+
+def _serialize_workflow_result(self, result):
     # Can't use directly isinstance(result, restart_type) because if the
     # result is a single result proxy it will be evaluated. This also
     # fixes another issue, on python2 isinstance() swallows any
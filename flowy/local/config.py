@@ -1,10 +1,17 @@
+from functools import partial
+
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
 
 from flowy.config import WorkflowConfig
 from flowy.local.decision import Decision
+from flowy.local.executor import ActivityExecutor
+from flowy.local.executor import make_executor
 from flowy.local.proxy import ActivityProxy
 from flowy.local.proxy import WorkflowProxy
 from flowy.local.runner import RootWorkflowRunner
+from flowy.local.transport import loads
+from flowy.local.transport import MmapTransport
 from flowy.proxy import Proxy
 from flowy.tracer import ExecutionTracer
 from flowy.worker import Worker
@@ -14,20 +21,76 @@ class LocalWorkflow(WorkflowConfig):
     def __init__(self, w,
                  activity_workers=8,
                  workflow_workers=2,
-                 executor=ProcessPoolExecutor):
+                 executor=None,
+                 activity_executor=None,
+                 decision_executor=None,
+                 warm_up=False,
+                 mmap_threshold=None,
+                 coroutine_workers=1000):
+        """Initialize the local workflow.
+
+        The activities run on activity_executor, a process pool by default,
+        and the decisions on decision_executor, a thread pool by default.
+        Decisions are cheap replays, running them in other processes costs
+        more in pickling the state than it saves. The executor argument can
+        be used to set both at once.
+
+        If warm_up is set, the worker processes import the modules of the
+        workflow and its activities as soon as the run starts.
+
+        Activities can also be coroutine functions (async def). These run on a
+        dedicated event loop, with at most coroutine_workers of them in flight
+        at the same time, instead of the activity executor.
+
+        If mmap_threshold is set, activity results that support the buffer
+        protocol (bytes, bytearrays, NumPy arrays, ...) and are at least that
+        many bytes large are passed around in memory mapped files instead of
+        being pickled and serialized in the state. The activities consuming
+        them receive a MappedResult handle instead of the value.
+        """
         super(LocalWorkflow, self).__init__()
         self.activity_workers = activity_workers
         self.workflow_workers = workflow_workers
-        self.executor = executor
+        if activity_executor is None:
+            activity_executor = executor or ProcessPoolExecutor
+        if decision_executor is None:
+            decision_executor = executor or ThreadPoolExecutor
+        self.activity_executor = activity_executor
+        self.decision_executor = decision_executor
+        self.warm_up = warm_up
+        self.w = w
+        self.mmap_threshold = mmap_threshold
+        self.coroutine_workers = coroutine_workers
         self.worker = Worker()
         self.worker.register_task('local', self.wrap(w))
 
+    @staticmethod
+    def deserialize_input(input_data):
+        """Deserialize the input, a child workflow can get MappedResults."""
+        args, kwargs = loads(input_data)
+        if not isinstance(args, list):
+            raise ValueError('Invalid args: %r' % (args,))
+        if not isinstance(kwargs, dict):
+            raise ValueError('Invalid kwargs: %r' % (kwargs,))
+        return args, kwargs
+
     def conf_activity(self, dep_name, f):
         self.conf_proxy_factory(dep_name, ActivityProxy(dep_name, f))
 
     def conf_workflow(self, dep_name, f):
         self.conf_proxy_factory(dep_name, WorkflowProxy(dep_name, f))
 
+    def modules(self):
+        """The names of the modules with the workflow and its tasks."""
+        modules = set([_module_name(self.w)])
+        for proxy_factory in self.proxy_factory_registry.values():
+            if isinstance(proxy_factory.f, LocalWorkflow):
+                modules.update(proxy_factory.f.modules())
+            else:
+                modules.add(_module_name(proxy_factory.f))
+        modules.discard(None)
+        return modules
+
     def __call__(self, state, input_data, tracer):
         # NB: The final trace can be computed only on the last decision
         # thread/process
@@ -43,9 +106,25 @@ class LocalWorkflow(WorkflowConfig):
         tracer = None
         if kwargs.pop('_trace', False):
             tracer = ExecutionTracer()
-        a_executor = self.executor(max_workers=self.activity_workers)
-        w_executor = self.executor(max_workers=self.workflow_workers)
+        modules = self.modules() if self.warm_up else None
+        a_executor = ActivityExecutor(
+            make_executor(self.activity_executor, self.activity_workers,
+                          warm_up_modules=modules),
+            coroutine_workers=self.coroutine_workers)
+        w_executor = make_executor(self.decision_executor,
+                                   self.workflow_workers,
+                                   warm_up_modules=modules)
+        transport = None
+        if self.mmap_threshold is not None:
+            transport = MmapTransport(self.mmap_threshold)
         input_data = Proxy.serialize_input(*args, **kwargs)
         wr = RootWorkflowRunner(self, w_executor, a_executor, input_data,
-                                tracer=tracer)
+                                tracer=tracer,
+                                transport=transport)
         return wr.run(wait=wait)
+
+
+def _module_name(obj):
+    if isinstance(obj, partial):
+        obj = obj.func
+    return getattr(obj, '__module__', None)
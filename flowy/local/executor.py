@@ -0,0 +1,182 @@
+import importlib
+import threading
+from collections import deque
+from functools import partial
+
+try:
+    import asyncio
+except ImportError:  # python 2
+    asyncio = None
+
+try:
+    from concurrent.futures import Future
+except ImportError:
+    from futures import Future
+
+
+__all__ = ['CoroutineExecutor', 'ActivityExecutor', 'is_coroutine_function',
+           'make_executor']
+
+
+def is_coroutine_function(func):
+    """Check if func is an async def function (or marked as a coroutine)."""
+    if asyncio is None:
+        return False
+    if isinstance(func, partial):
+        func = func.func
+    return asyncio.iscoroutinefunction(func)
+
+
+class CoroutineExecutor(object):
+    """Run coroutine functions on a dedicated event loop.
+
+    It has the same submit/shutdown interface as the executors from
+    concurrent.futures and it returns the same kind of futures, so the runner
+    can treat the coroutines as any other activity.
+
+    The event loop runs in a daemon thread that is started on the first
+    submit. At most max_workers coroutines are in flight at the same time, the
+    others are queued and started in the submit order.
+    """
+
+    def __init__(self, max_workers=1000):
+        if asyncio is None:
+            raise RuntimeError('Coroutines require asyncio.')
+        if max_workers <= 0:
+            raise ValueError('max_workers must be greater than 0')
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.loop = None
+        self.thread = None
+        self.closed = False
+        # These are only accessed from the event loop thread
+        self.running = 0
+        self.waiting = deque()
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            if self.loop is None:
+                self._start_loop()
+            future = Future()
+            self.loop.call_soon_threadsafe(self._enqueue, future, fn, args,
+                                           kwargs)
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop the event loop once all the submitted coroutines finish."""
+        with self.lock:
+            self.closed = True
+            if self.loop is None:
+                return
+            self.loop.call_soon_threadsafe(self._stop_if_idle)
+        if wait:
+            self.thread.join()
+
+    def _start_loop(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop,
+                                       name='flowy-coroutines')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def _enqueue(self, future, fn, args, kwargs):
+        self.waiting.append((future, fn, args, kwargs))
+        self._start_waiting()
+
+    def _start_waiting(self):
+        while self.waiting and self.running < self.max_workers:
+            future, fn, args, kwargs = self.waiting.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                task = self.loop.create_task(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            self.running += 1
+            task.add_done_callback(partial(self._task_done, future))
+
+    def _task_done(self, future, task):
+        self.running -= 1
+        if task.cancelled():
+            future.set_exception(asyncio.CancelledError())
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+        self._start_waiting()
+        if self.closed:
+            self._stop_if_idle()
+
+    def _stop_if_idle(self):
+        if not self.running and not self.waiting:
+            self.loop.stop()
+
+
+class ActivityExecutor(object):
+    """Send coroutine functions to a coroutine executor, the rest to a pool.
+
+    The coroutine executor is created on the first coroutine submitted.
+    """
+
+    def __init__(self, executor, coroutine_workers=1000):
+        self.executor = executor
+        self.coroutine_workers = coroutine_workers
+        self.coroutine_executor = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, fn, *args, **kwargs):
+        if not is_coroutine_function(fn):
+            return self.executor.submit(fn, *args, **kwargs)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            if self.coroutine_executor is None:
+                self.coroutine_executor = CoroutineExecutor(
+                    self.coroutine_workers)
+        return self.coroutine_executor.submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+        with self.lock:
+            self.closed = True
+            coroutine_executor = self.coroutine_executor
+        if coroutine_executor is not None:
+            coroutine_executor.shutdown(wait=wait)
+
+
+def make_executor(executor, max_workers, warm_up_modules=None):
+    """Instantiate the executor and, optionally, warm up its workers.
+
+    The warm up imports warm_up_modules in every worker before the first task
+    reaches it. The workers are also started right away by submitting some
+    dummy import tasks, this way the first tasks don't pay for the process
+    creation either.
+    """
+    if not warm_up_modules:
+        return executor(max_workers=max_workers)
+    warm_up_modules = tuple(sorted(warm_up_modules))
+    try:
+        pool = executor(max_workers=max_workers,
+                        initializer=import_modules,
+                        initargs=(warm_up_modules, ))
+    except TypeError:  # initializers are only available on python 3.7+
+        pool = executor(max_workers=max_workers)
+    for _ in range(max_workers):
+        pool.submit(import_modules, warm_up_modules)
+    return pool
+
+
+def import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
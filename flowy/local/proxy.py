@@ -1,5 +1,6 @@
 from flowy.local.decision import ActivityDecision
 from flowy.local.decision import WorkflowDecision
+from flowy.local.transport import loads
 from flowy.proxy import Proxy
 from flowy.swf.history import SWFTaskExecutionHistory as TaskHistory
 from flowy.tracer import TracingProxy
@@ -14,8 +15,9 @@ class ActivityProxy(object):
         th = TaskHistory(history, self.identity)
         ad = ActivityDecision(decision, self.identity, self.f)
         if tracer is None:
-            return Proxy(th, ad)
-        return TracingProxy(tracer, self.identity, th, ad)
+            return Proxy(th, ad, deserialize_result=loads)
+        return TracingProxy(tracer, self.identity, th, ad,
+                            deserialize_result=loads)
 
 
 class WorkflowProxy(object):
@@ -27,5 +29,6 @@ class WorkflowProxy(object):
         th = TaskHistory(history, self.identity)
         wd = WorkflowDecision(decision, self.identity, self.f)
         if tracer is None:
-            return Proxy(th, wd)
-        return TracingProxy(tracer, self.identity, th, wd)
+            return Proxy(th, wd, deserialize_result=loads)
+        return TracingProxy(tracer, self.identity, th, wd,
+                            deserialize_result=loads)
@@ -1,9 +1,16 @@
 import copy
+import time
+from collections import deque
+from collections import namedtuple
 from functools import partial
 from threading import Event
 from threading import RLock
 
 from flowy import serialization
+from flowy.local.executor import is_coroutine_function
+from flowy.local.transport import loads
+from flowy.local.transport import MappedResult
+from flowy.local.transport import transport_result
 from flowy.result import TaskError
 
 
@@ -11,14 +18,21 @@ class WorkflowRunner(object):
     def __init__(self, workflow, workflow_executor, activity_executor,
                  input_data,
                  state=None,
-                 tracer=None):
+                 tracer=None,
+                 transport=None):
         self.workflow = workflow
         self.workflow_executor = workflow_executor
         self.activity_executor = activity_executor
         self.input_data = input_data
         self.state = state if state is not None else State()
         self.tracer = tracer
+        self.transport = transport
         self.lock = RLock()
+        # Finished tasks are queued here and applied in batches by whichever
+        # thread manages to get the lock, see dispatch_completions.
+        self.completions = deque()
+        # At most one decision is in flight (will_restart) and at most one
+        # more is pending (history_updated) at any time.
         self.will_restart = True
         self.history_updated = False
         self.restarted = False
@@ -39,24 +53,31 @@ class WorkflowRunner(object):
         assert int(retry_n) == 0
         self.tracer.schedule_workflow(node_id, name)
 
+    def trace_start(self, task_id, at):
+        if self.tracer is None:
+            return
+        name, call_n, _ = task_id.split('-')
+        node_id = '%s-%s' % (name, call_n)
+        self.tracer.start(node_id, at)
+
     def trace_flush(self):
         if self.tracer is None:
             return
         self.tracer.flush_scheduled()
 
-    def trace_result(self, task_id, result):
+    def trace_result(self, task_id, result, at=None):
         if self.tracer is None:
             return
         name, call_n, _ = task_id.split('-')
         node_id = '%s-%s' % (name, call_n)
-        self.tracer.result(node_id, result)
+        self.tracer.result(node_id, result, at)
 
-    def trace_error(self, task_id, reason):
+    def trace_error(self, task_id, reason, at=None):
         if self.tracer is None:
             return
         name, call_n, _ = task_id.split('-')
         node_id = '%s-%s' % (name, call_n)
-        self.tracer.error(node_id, reason)
+        self.tracer.error(node_id, reason, at)
 
     def reschedule_decision(self):
         if self.restarted:
@@ -75,16 +96,20 @@ class WorkflowRunner(object):
         f.add_done_callback(self.schedule_tasks)
 
     def schedule_tasks(self, result):
-        with self.lock:
-            if self.restarted:
-                return
-            try:
-                result = result.result()
-            except Exception as e:
-                self.fail(e)
-                return
-            handle_func = 'handle_%s' % result['type']
-            getattr(self, handle_func)(result)
+        try:
+            with self.lock:
+                if self.restarted:
+                    return
+                try:
+                    result = result.result()
+                except Exception as e:
+                    self.fail(e)
+                    return
+                handle_func = 'handle_%s' % result['type']
+                getattr(self, handle_func)(result)
+        finally:
+            # Pick up the completions queued while the lock was held
+            self.dispatch_completions()
 
     def fail(self, reason):
         raise NotImplementedError
@@ -99,8 +124,16 @@ class WorkflowRunner(object):
         self.trace_flush()
         for a in result.get('activities', []):
             try:
-                args, kwargs = serialization.loads(a['input_data'])
-                f = self.activity_executor.submit(a['f'], *args, **kwargs)
+                args, kwargs = loads(a['input_data'])
+                func = a['f']
+                # Coroutines run in this process, there is nothing to transport
+                # and they can't be wrapped in the timing function either.
+                if not is_coroutine_function(func):
+                    if self.transport is not None:
+                        func = partial(transport_result, self.transport, func)
+                    if self.tracer is not None:
+                        func = partial(timed_call, func)
+                f = self.activity_executor.submit(func, *args, **kwargs)
                 f.add_done_callback(partial(
                     self.complete_activity_and_reschedule_decision, a['id']))
             except RuntimeError:
@@ -109,7 +142,8 @@ class WorkflowRunner(object):
             r = ChildWorkflowRunner(w['f'], self.workflow_executor,
                                     self.activity_executor, w['input_data'],
                                     parent=self,
-                                    wid=w['id'])
+                                    wid=w['id'],
+                                    transport=self.transport)
             r.reschedule_decision()
         self.reschedule_if_history_updated()
 
@@ -119,28 +153,64 @@ class WorkflowRunner(object):
             self.tracer.reset()
 
     def complete_activity_and_reschedule_decision(self, task_id, result):
-        with self.lock:
-            try:
-                r = result.result()
-            except Exception as e:
-                self.state.set_error(task_id, str(e))
-                self.trace_error(task_id, e)
-            else:
-                self.state.set_result(task_id, serialization.dumps(r))
-                self.trace_result(task_id, r)
-            self.update_history_or_reschedule()
+        self.completions.append((self.set_activity_outcome, task_id, result))
+        self.dispatch_completions()
 
     def fail_subwf_and_reschedule_decision(self, task_id, reason):
-        with self.lock:
-            self.state.set_error(task_id, str(reason))
-            self.trace_error(task_id, reason)
-            self.update_history_or_reschedule()
+        self.completions.append((self.set_subwf_error, task_id, reason))
+        self.dispatch_completions()
 
     def complete_subwf_and_reschedule_decision(self, task_id, result):
-        with self.lock:
-            self.state.set_result(task_id, result)
-            self.trace_result(task_id, serialization.loads(result))
-            self.update_history_or_reschedule()
+        self.completions.append((self.set_subwf_result, task_id, result))
+        self.dispatch_completions()
+
+    def dispatch_completions(self):
+        """Apply all the queued completions and update the history once.
+
+        The callbacks never wait for the lock. If another thread holds it, the
+        completion is left in the queue and the lock holder will apply it
+        after it's done, together with any other completions that arrived in
+        the meantime. This way a burst of finished tasks is handled as a
+        single batch and triggers at most one new decision.
+        """
+        completions = self.completions
+        while completions and self.lock.acquire(False):
+            try:
+                updated = False
+                while completions:
+                    set_outcome, task_id, value = completions.popleft()
+                    set_outcome(task_id, value)
+                    updated = True
+                if updated:
+                    self.update_history_or_reschedule()
+            finally:
+                self.lock.release()
+            # Loop, a completion may have been queued just before the release
+
+    def set_activity_outcome(self, task_id, result):
+        finished = None
+        try:
+            r = result.result()
+            if isinstance(r, TimedOutcome):
+                self.trace_start(task_id, r.started)
+                finished = r.finished
+                if r.error is not None:
+                    raise r.error
+                r = r.value
+        except Exception as e:
+            self.state.set_error(task_id, str(e))
+            self.trace_error(task_id, e, finished)
+        else:
+            self.state.set_result(task_id, serialization.dumps(r))
+            self.trace_result(task_id, r, finished)
+
+    def set_subwf_error(self, task_id, reason):
+        self.state.set_error(task_id, str(reason))
+        self.trace_error(task_id, reason)
+
+    def set_subwf_result(self, task_id, result):
+        self.state.set_result(task_id, result)
+        self.trace_result(task_id, loads(result))
 
     def update_history_or_reschedule(self):
         if self.will_restart:
@@ -162,11 +232,13 @@ class RootWorkflowRunner(WorkflowRunner):
     def __init__(self, workflow, workflow_executor, activity_executor,
                  input_data,
                  state=None,
-                 tracer=None):
+                 tracer=None,
+                 transport=None):
         super(RootWorkflowRunner, self).__init__(workflow, workflow_executor,
                                                  activity_executor, input_data,
                                                  state=state,
-                                                 tracer=tracer)
+                                                 tracer=tracer,
+                                                 transport=transport)
         self.stop = Event()
 
     def run(self, wait=False):
@@ -174,6 +246,11 @@ class RootWorkflowRunner(WorkflowRunner):
         self.stop.wait()
         self.activity_executor.shutdown(wait=wait)
         self.workflow_executor.shutdown(wait=wait)
+        if self.transport is not None:
+            # The handles are invalid after the transport is closed
+            if hasattr(self, 'final_value'):
+                self.final_value = copy_mapped_results(self.final_value)
+            self.transport.close()
         if hasattr(self, 'final_value'):
             if isinstance(self.final_value, Exception):
                 raise self.final_value
@@ -189,7 +266,7 @@ class RootWorkflowRunner(WorkflowRunner):
         self.stop_running(TaskError(result['reason']))
 
     def handle_finish(self, result):
-        self.stop_running(serialization.loads(result['result']))
+        self.stop_running(loads(result['result']))
 
     def fail(self, reason):
         self.stop_running(TaskError(str(reason)))
@@ -198,18 +275,21 @@ class RootWorkflowRunner(WorkflowRunner):
         super(RootWorkflowRunner, self).handle_restart(result)
         RestartedRootRunner(self.workflow, self.workflow_executor,
                             self.activity_executor, result['input_data'], self,
-                            tracer=self.tracer).reschedule_decision()
+                            tracer=self.tracer,
+                            transport=self.transport).reschedule_decision()
 
 
 class RestartedRootRunner(WorkflowRunner):
     def __init__(self, workflow, workflow_executor, activity_executor,
                  input_data, root,
                  state=None,
-                 tracer=None):
+                 tracer=None,
+                 transport=None):
         super(RestartedRootRunner, self).__init__(
             workflow, workflow_executor, activity_executor, input_data,
             state=state,
-            tracer=tracer)
+            tracer=tracer,
+            transport=transport)
         self.root = root
 
     def handle_fail(self, result):
@@ -226,7 +306,8 @@ class RestartedRootRunner(WorkflowRunner):
         r = RestartedRootRunner(self.workflow, self.workflow_executor,
                                 self.activity_executor, result['input_data'],
                                 self.root,
-                                tracer=self.tracer)
+                                tracer=self.tracer,
+                                transport=self.transport)
         r.reschedule_decision()
 
 
@@ -234,11 +315,13 @@ class ChildWorkflowRunner(WorkflowRunner):
     def __init__(self, workflow, workflow_executor, activity_executor,
                  input_data, parent, wid,
                  state=None,
-                 tracer=None):
+                 tracer=None,
+                 transport=None):
         super(ChildWorkflowRunner, self).__init__(
             workflow, workflow_executor, activity_executor, input_data,
             state=state,
-            tracer=tracer)
+            tracer=tracer,
+            transport=transport)
         self.parent = parent
         self.wid = wid
 
@@ -258,10 +341,41 @@ class ChildWorkflowRunner(WorkflowRunner):
         r = ChildWorkflowRunner(self.workflow, self.workflow_executor,
                                 self.activity_executor, result['input_data'],
                                 self.parent, self.wid,
-                                tracer=self.tracer)
+                                tracer=self.tracer,
+                                transport=self.transport)
         r.reschedule_decision()
 
 
+def copy_mapped_results(value):
+    """Replace the MappedResults in value, at any depth, with their bytes."""
+    if isinstance(value, MappedResult):
+        return value.tobytes()
+    if isinstance(value, list):
+        return [copy_mapped_results(x) for x in value]
+    if isinstance(value, tuple):
+        return tuple(copy_mapped_results(x) for x in value)
+    if isinstance(value, dict):
+        return dict((k, copy_mapped_results(v)) for k, v in value.items())
+    return value
+
+
+TimedOutcome = namedtuple('TimedOutcome', 'started finished value error')
+
+
+def timed_call(func, *args, **kwargs):
+    """Call func and record when it started and finished, for tracing.
+
+    The call happens in the activity worker, this is why it's module level
+    function and the errors are returned instead of raised.
+    """
+    started = time.time()
+    try:
+        value = func(*args, **kwargs)
+    except Exception as e:
+        return TimedOutcome(started, time.time(), None, e)
+    return TimedOutcome(started, time.time(), value, None)
+
+
 class State(object):
     def __init__(self):
         self.running = set()
@@ -0,0 +1,139 @@
+"""Move large activity results between processes using memory mapped files.
+
+By default, every activity result is pickled back from the worker process,
+JSON encoded in the runner state and copied for every decision. For large
+binary results (bytes, bytearrays, NumPy arrays and other buffer objects) this
+is wasteful. The transport writes such results in a temporary file and only a
+small handle travels through the state. The consumers map the file in memory
+and read it without copying.
+
+All the files are stored in a directory owned by the root workflow runner and
+are removed once the run is over.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+
+from flowy import serialization
+
+
+__all__ = ['MmapTransport', 'MappedResult', 'loads']
+
+
+class MmapTransport(object):
+    """Store results larger than a threshold in memory mapped files.
+
+    The transport object is pickled and sent to the worker processes together
+    with the activity, this is why it only holds the directory path and the
+    threshold.
+    """
+
+    def __init__(self, threshold, directory=None):
+        self.threshold = max(int(threshold), 1)
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='flowy_')
+        self.directory = directory
+
+    def put(self, value):
+        """Return a handle for large buffer values or the value unchanged."""
+        try:
+            view = memoryview(value)
+        except TypeError:
+            return value
+        if _nbytes(view) < self.threshold:
+            return value
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.result')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(view)
+            size = f.tell()
+        return MappedResult(path, size)
+
+    def close(self):
+        """Remove all the files created by this transport."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __repr__(self):
+        return '<%s threshold=%s directory=%r>' % (
+            self.__class__.__name__, self.threshold, self.directory)
+
+
+class MappedResult(object):
+    """A handle to a result stored in a memory mapped file.
+
+    Use view() to get a read-only memoryview over the result data, tobytes()
+    to get a copy of it. The handle is only valid for the duration of the
+    run that created it.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self._map = None
+
+    def view(self):
+        """Map the file in memory and return a read-only memoryview."""
+        if self._map is None:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def tobytes(self):
+        return self.view().tobytes()
+
+    def __len__(self):
+        return self.size
+
+    def __json__(self):
+        return {' m': [self.path, self.size]}
+
+    def __getstate__(self):
+        # Open maps can't be pickled, they are recreated on demand
+        return {'path': self.path, 'size': self.size}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['size'])
+
+    def __eq__(self, other):
+        if not isinstance(other, MappedResult):
+            return NotImplemented
+        return self.path == other.path
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __repr__(self):
+        return '<%s %s bytes>' % (self.__class__.__name__, self.size)
+
+
+def _nbytes(view):
+    nbytes = getattr(view, 'nbytes', None)  # not available on python 2
+    if nbytes is None:
+        nbytes = len(view) * view.itemsize
+    return nbytes
+
+
+def loads(value):
+    """Like flowy.serialization.loads, but also decode the MappedResult
+    handles; only the local backend knows about them."""
+    return serialization.loads(value, tags=_TAGS)
+
+
+def _load_mapped_result(value):
+    return MappedResult(*value)
+
+
+_TAGS = {' m': _load_mapped_result}
+
+
+def transport_result(transport, func, *args, **kwargs):
+    """Call func and pass its result through the transport.
+
+    This runs in the activity worker and, like the config wrappers, must be a
+    module level function so that it can be used in partials and pickled.
+    """
+    return transport.put(func(*args, **kwargs))
@@ -0,0 +1,159 @@
+"""A manifest of the registrations found by a worker scan.
+
+Scanning imports every module of the package, which can take seconds for a
+large code base. The manifest, written at build time, records what the scan
+found: the category, the key, the config and the function of every
+registration. A worker started with the manifest imports only the modules
+that define them and registers them directly.
+
+    # at build time
+    SWFActivityWorker().write_manifest('activities.json', package=myapp)
+    # at startup
+    worker.scan(package=myapp, manifest='activities.json')
+
+The manifest also holds a fingerprint of the package source files, their
+modification times and sizes; if they changed since it was written, the
+manifest is stale and the worker falls back to a full scan. Write it after
+the files are in their final place: copying them usually changes their
+modification times, and makes the manifest stale.
+"""
+
+import hashlib
+import importlib
+import json
+import os
+import sys
+
+from flowy.utils import logger
+
+
+__all__ = ['dump_manifest', 'load_manifest', 'fingerprint']
+
+
+MANIFEST_VERSION = 2
+
+
+def fingerprint(package):
+    """Hash the paths, the modification times and the sizes of the package
+    source files.
+
+    Only the files are stat-ed, reading them all would cost a good part of
+    the scan time the manifest saves.
+    """
+    digest = hashlib.sha1()
+    for rel_path, path in _source_files(package):
+        stat = os.stat(path)
+        digest.update(('%s %r %d\n' % (rel_path, stat.st_mtime,
+                                        stat.st_size)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _source_files(package):
+    paths = getattr(package, '__path__', None)
+    if paths is None:  # a module
+        path = package.__file__
+        if path.endswith(('.pyc', '.pyo')):
+            path = path[:-1]
+        return [(os.path.basename(path), path)]
+    files = []
+    for root in paths:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    path = os.path.join(dirpath, filename)
+                    files.append((os.path.relpath(path, root), path))
+    return files
+
+
+def object_path(obj, module_name):
+    """Return 'module:attribute' for obj, as found in module_name."""
+    module = sys.modules[module_name]
+    name = getattr(obj, '__name__', None)
+    if name is None or getattr(module, name, None) is not obj:
+        for name, value in sorted(vars(module).items()):
+            if value is obj:
+                break
+        else:
+            raise ValueError('Cannot find %r in module %s.'
+                             % (obj, module_name))
+    return '%s:%s' % (module_name, name)
+
+
+def resolve(path):
+    """Import and return the object at 'module:attribute'."""
+    module_name, name = path.split(':', 1)
+    return getattr(importlib.import_module(module_name), name)
+
+
+def dump_manifest(path, package, categories, registrations):
+    """Write the manifest of the (category, key, config, func) registrations.
+
+    The config must be a global of the module defining func. ValueError is
+    raised if a config or a function can't be found again at import time.
+    """
+    entries = []
+    for category, key, config, func in registrations:
+        entries.append({
+            'category': category,
+            'key': key,
+            'config': object_path(config, func.__module__),
+            'func': object_path(func, func.__module__),
+        })
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'package': package.__name__,
+        'categories': sorted(categories),
+        'fingerprint': fingerprint(package),
+        'registrations': entries,
+    }
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.rename(tmp_path, path)  # readers never see a partial manifest
+
+
+def load_manifest(path, package, categories):
+    """Return the (config, key, func) registrations for the categories.
+
+    Return None, logging the reason, if the manifest is missing, stale or
+    doesn't cover all the categories. A categories of None means all the
+    categories in the manifest.
+    """
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError) as e:
+        logger.warning('Cannot read the manifest %s: %s', path, e)
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        logger.warning('Unknown manifest version in %s.', path)
+        return None
+    if manifest['package'] != package.__name__:
+        logger.warning('The manifest %s is for another package: %s',
+                       path, manifest['package'])
+        return None
+    if categories is None:
+        categories = manifest['categories']
+    if not set(categories).issubset(manifest['categories']):
+        logger.warning('The manifest %s is missing categories: %s', path,
+                       sorted(set(categories) - set(manifest['categories'])))
+        return None
+    if manifest['fingerprint'] != fingerprint(package):
+        logger.warning('The manifest %s is stale.', path)
+        return None
+    registrations = []
+    for entry in manifest['registrations']:
+        if entry['category'] not in categories:
+            continue
+        try:
+            config = resolve(entry['config'])
+            func = resolve(entry['func'])
+        except (ImportError, AttributeError) as e:
+            logger.warning('The manifest %s is stale: %s', path, e)
+            return None
+        key = entry['key']
+        if isinstance(key, list):
+            key = tuple(key)
+        registrations.append((config, key, func))
+    return registrations
@@ -0,0 +1,267 @@
+"""Pluggable metrics for the workers.
+
+The workers report what they do to a metrics object: timings (in seconds),
+counters and histograms, identified by dotted names. The default does nothing;
+AggregateMetrics keeps the aggregates in memory and StatsdMetrics sends
+everything to a statsd daemon over UDP.
+
+    worker = SWFWorkflowWorker(metrics=StatsdMetrics(prefix='myapp'))
+"""
+
+import random
+import re
+import socket
+import threading
+import time
+
+from flowy.utils import logger
+
+
+__all__ = ['Metrics', 'KeyedMetrics', 'Timer', 'AggregateMetrics',
+           'StatsdMetrics', 'null_metrics']
+
+
+class Metrics(object):
+    """The metrics interface; this implementation discards everything."""
+
+    def timer(self, name):
+        """Return a new, not started, Timer for name."""
+        return Timer(self, name)
+
+    def timing(self, name, seconds):
+        """Record a duration, in seconds."""
+
+    def incr(self, name, value=1):
+        """Increment a counter."""
+
+    def histogram(self, name, value):
+        """Record a value in a distribution, like a size or a count."""
+
+    def keyed(self, *key):
+        """Return metrics reporting to this one, with the key appended to
+        all the names."""
+        if self is null_metrics:
+            return self
+        return KeyedMetrics(self, *key)
+
+
+null_metrics = Metrics()
+
+
+class KeyedMetrics(Metrics):
+    """Append a key, like a task name and version, to the metric names.
+
+    The characters that can't be used in statsd names are replaced.
+    """
+
+    def __init__(self, metrics, *key):
+        self.metrics = metrics
+        self.suffix = ''.join(
+            '.' + re.sub(r'[^\w-]', '_', str(part)) for part in key)
+
+    def timing(self, name, seconds):
+        self.metrics.timing(name + self.suffix, seconds)
+
+    def incr(self, name, value=1):
+        self.metrics.incr(name + self.suffix, value)
+
+    def histogram(self, name, value):
+        self.metrics.histogram(name + self.suffix, value)
+
+
+class Timer(object):
+    """Time a phase and report it when stopped.
+
+    A timer can be started and stopped more than once, each interval is
+    reported separately. The elapsed attribute is the sum of all the intervals
+    and count is their number.
+
+        with metrics.timer('phase'):
+            ...
+    """
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.elapsed = 0.0
+        self.count = 0
+        self._started = None
+
+    def start(self):
+        self._started = time.time()
+        return self
+
+    def stop(self):
+        """Report the time since the timer was started and return it."""
+        elapsed = time.time() - self._started
+        self._started = None
+        self.elapsed += elapsed
+        self.count += 1
+        self.metrics.timing(self.name, elapsed)
+        return elapsed
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _Distribution(object):
+    """Count, sum, min, max and a uniform sample of the recorded values."""
+
+    def __init__(self, sample_size):
+        self.sample_size = sample_size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.sample = []
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.sample) < self.sample_size:
+            self.sample.append(value)
+        else:  # reservoir sampling
+            i = random.randrange(self.count)
+            if i < self.sample_size:
+                self.sample[i] = value
+
+    def summary(self):
+        sample = sorted(self.sample)
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+            'median': sample[len(sample) // 2],
+            'p95': sample[min(int(len(sample) * 0.95), len(sample) - 1)],
+        }
+
+
+class AggregateMetrics(Metrics):
+    """Aggregate the metrics in memory; safe to use from multiple threads.
+
+    The percentiles are computed over a uniform sample of at most sample_size
+    values for each name.
+    """
+
+    def __init__(self, sample_size=1024):
+        self.sample_size = sample_size
+        self.lock = threading.Lock()
+        self.reset()
+        self._stop_reporting = None
+
+    def reset(self):
+        with self.lock:
+            self._reset()
+
+    def _reset(self):
+        self.counters = {}
+        self.timings = {}
+        self.histograms = {}
+
+    def timing(self, name, seconds):
+        self._add(self.timings, name, seconds)
+
+    def incr(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def histogram(self, name, value):
+        self._add(self.histograms, name, value)
+
+    def _add(self, distributions, name, value):
+        with self.lock:
+            try:
+                distribution = distributions[name]
+            except KeyError:
+                distribution = distributions[name] = _Distribution(
+                    self.sample_size)
+            distribution.add(value)
+
+    def summary(self, reset=False):
+        """Return the counters and the distribution stats, by name.
+
+        With reset set, the aggregates are also cleared.
+        """
+        with self.lock:
+            summary = {
+                'counters': dict(self.counters),
+                'timings': dict((name, d.summary())
+                                for name, d in self.timings.items()),
+                'histograms': dict((name, d.summary())
+                                   for name, d in self.histograms.items()),
+            }
+            if reset:
+                self._reset()
+        return summary
+
+    def report(self, reset=False):
+        """Format the summary as a text table."""
+        summary = self.summary(reset)
+        lines = []
+        for name, value in sorted(summary['counters'].items()):
+            lines.append('%-40s %12s' % (name, value))
+        for kind, fmt in (('timings', '%.4f'), ('histograms', '%.1f')):
+            for name, s in sorted(summary[kind].items()):
+                stats = ' '.join('%s=%s' % (k, fmt % s[k]) for k in (
+                    'mean', 'min', 'median', 'p95', 'max'))
+                lines.append('%-40s %12s %s' % (name, s['count'], stats))
+        return '\n'.join(lines)
+
+    def report_every(self, interval=60, reset=True):
+        """Log the report every interval seconds, in a daemon thread.
+
+        With reset set, every report covers only its interval.
+        """
+        self.stop_reporting()
+        stop = self._stop_reporting = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                report = self.report(reset)
+                logger.info('Metrics for the last %ss:\n%s', interval, report)
+
+        thread = threading.Thread(target=loop, name='flowy-metrics')
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop_reporting(self):
+        if self._stop_reporting is not None:
+            self._stop_reporting.set()
+            self._stop_reporting = None
+
+
+class StatsdMetrics(Metrics):
+    """Send the metrics to a statsd daemon over UDP.
+
+    The timings are sent in milliseconds. Sending is best effort, any socket
+    errors are ignored.
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='flowy'):
+        self.address = (socket.gethostbyname(host), port)
+        self.prefix = prefix + '.' if prefix else ''
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def timing(self, name, seconds):
+        self._send('%s%s:%.3f|ms' % (self.prefix, name, seconds * 1000))
+
+    def incr(self, name, value=1):
+        self._send('%s%s:%s|c' % (self.prefix, name, value))
+
+    def histogram(self, name, value):
+        self._send('%s%s:%s|h' % (self.prefix, name, value))
+
+    def _send(self, data):
+        try:
+            self.socket.sendto(data.encode('utf-8'), self.address)
+        except socket.error:
+            pass
@@ -44,6 +44,9 @@ class Proxy(object):
             self.deserialize_result = deserialize_result
 
     def __call__(self, *args, **kwargs):
+        return self.call(args, kwargs)
+
+    def call(self, args, kwargs, traversed=None):
         """Consult the execution history for results or schedule a new task.
 
         This is method gets called from the user workflow code.
@@ -68,6 +71,10 @@ class Proxy(object):
             * If any placeholders in arguments, don't do anything because there
               are unresolved dependencies.
             * Finally, if all the arguments look OK, schedule it for execution.
+
+        The arguments are traversed, looking for result proxies, only if the
+        task must be scheduled. If the caller already traversed them it can
+        pass the result as traversed: ([args, kwargs], (err, placeholders)).
         """
         task_exec_history = self.task_exec_history
         call_number = self.call_number
@@ -94,7 +101,9 @@ class Proxy(object):
                 order = task_exec_history.order(call_number, retry_number)
                 r = error(err, order)
                 break
-            traversed_args, (err, placeholders) = traverse_data([args, kwargs])
+            if traversed is None:
+                traversed = traverse_data([args, kwargs])
+            traversed_args, (err, placeholders) = traversed
             if err:
                 r = copy_result_proxy(err)
                 break
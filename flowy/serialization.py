@@ -13,6 +13,7 @@ else:
     uni = str
 
 import collections
+import functools
 import json
 import uuid
 from base64 import b64decode
@@ -59,6 +60,31 @@ def collect_err_and_results(result, value):
     return err, results
 
 
+def collect_dependencies(result, value):
+    """Collect the first error, the placeholders flag and the ready results.
+
+    This combines check_err_and_placeholders and collect_err_and_results, so
+    a single traversal is enough for both scheduling and tracing.
+    """
+    err, placeholders, results = result
+    if not is_result_proxy(value):
+        return result
+    try:
+        wait(value)
+    except TaskError:
+        if err is None:
+            err = value
+        else:
+            err = first(err, value)
+    except SuspendTask:
+        placeholders = True
+    else:
+        if results is None:
+            results = []
+        results.append(value)
+    return err, placeholders, results
+
+
 def traverse_data(value, f=check_err_and_placeholders, initial=(None, False), seen=frozenset(), make_list=True):
     if is_result_proxy(value):
         try:
@@ -121,11 +147,19 @@ def _tag(value):
     return value
 
 
-def loads(value):
-    return json.loads(value, object_hook=_obj_hook)
+def loads(value, tags=None):
+    """Decode a dumps string.
+
+    The tags map extra tags to the functions decoding their values, for the
+    types that other modules encode with __json__.
+    """
+    if not tags:
+        return json.loads(value, object_hook=_obj_hook)
+    return json.loads(value, object_hook=functools.partial(_obj_hook,
+                                                           tags=tags))
 
 
-def _obj_hook(obj):
+def _obj_hook(obj, tags=None):
     if len(obj) != 1:
         return obj
     key, value = next(iter(obj.items()))
@@ -133,4 +167,6 @@ def _obj_hook(obj):
         return uuid.UUID(value)
     elif key == ' b':
         return b64decode(value)
+    elif tags and key in tags:
+        return tags[key](value)
     return obj
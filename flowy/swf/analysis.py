@@ -0,0 +1,429 @@
+"""Offline analysis of Amazon SWF workflow execution histories.
+
+The histories are lists of events, as returned by GetWorkflowExecutionHistory
+or PollForDecisionTask. The event timestamps can be datetime objects (boto3),
+or seconds since the epoch (the raw JSON responses and the AWS CLI output).
+
+The task dependencies are not recorded in the history, they are inferred: a
+task depends on all the tasks that finished between the start of the
+previous decision and the start of the decision that scheduled it.
+"""
+
+import bisect
+import calendar
+import datetime
+import gzip
+import json
+
+from flowy.tracer import ExecutionTracer
+from flowy.utils import chrome_trace
+
+
+__all__ = ['HistoryTask', 'event_time', 'history_tasks', 'to_chrome_trace',
+           'load_history_file', 'get_history', 'history_dependencies',
+           'history_tracer', 'latency_stats', 'time_breakdown', 'report']
+
+
+class HistoryTask(object):
+    """The life cycle of a task in a workflow execution history.
+
+    The kind is one of decision, activity, workflow or timer. The times are in
+    seconds since the epoch; started and finished are None if the task didn't
+    start or finish. The outcome is the last event type for the task.
+    """
+
+    def __init__(self, kind, task_id, name, scheduled):
+        self.kind = kind
+        self.task_id = task_id
+        self.name = name
+        self.scheduled = scheduled
+        self.started = None
+        self.finished = None
+        self.outcome = None
+        # The ids of the scheduled/started/finished events
+        self.scheduled_id = None
+        self.started_id = None
+        self.finished_id = None
+        # The decision task that scheduled this task, if any
+        self.decision = None
+
+    def schedule_to_start(self):
+        if self.started is None:
+            return None
+        return self.started - self.scheduled
+
+    def start_to_close(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def __repr__(self):
+        return '<%s %s %r %s>' % (self.__class__.__name__, self.kind,
+                                  self.task_id, self.outcome)
+
+
+def event_time(event):
+    """Return the event timestamp in seconds since the epoch."""
+    ts = event['eventTimestamp']
+    if isinstance(ts, datetime.datetime):
+        if ts.utcoffset() is not None:
+            ts = ts - ts.utcoffset()
+        return calendar.timegm(ts.timetuple()) + ts.microsecond / 1e6
+    return float(ts)
+
+
+# event type -> (attributes key, kind, start or finish, reference field)
+_TRANSITIONS = {
+    'DecisionTaskStarted': (
+        'decisionTaskStartedEventAttributes', 'decision', 'started',
+        'scheduledEventId'),
+    'DecisionTaskCompleted': (
+        'decisionTaskCompletedEventAttributes', 'decision', 'finished',
+        'scheduledEventId'),
+    'DecisionTaskTimedOut': (
+        'decisionTaskTimedOutEventAttributes', 'decision', 'finished',
+        'scheduledEventId'),
+    'ActivityTaskStarted': (
+        'activityTaskStartedEventAttributes', 'activity', 'started',
+        'scheduledEventId'),
+    'ActivityTaskCompleted': (
+        'activityTaskCompletedEventAttributes', 'activity', 'finished',
+        'scheduledEventId'),
+    'ActivityTaskFailed': (
+        'activityTaskFailedEventAttributes', 'activity', 'finished',
+        'scheduledEventId'),
+    'ActivityTaskTimedOut': (
+        'activityTaskTimedOutEventAttributes', 'activity', 'finished',
+        'scheduledEventId'),
+    'ActivityTaskCanceled': (
+        'activityTaskCanceledEventAttributes', 'activity', 'finished',
+        'scheduledEventId'),
+    'ChildWorkflowExecutionStarted': (
+        'childWorkflowExecutionStartedEventAttributes', 'workflow',
+        'started', 'initiatedEventId'),
+    'ChildWorkflowExecutionCompleted': (
+        'childWorkflowExecutionCompletedEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'ChildWorkflowExecutionFailed': (
+        'childWorkflowExecutionFailedEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'ChildWorkflowExecutionTimedOut': (
+        'childWorkflowExecutionTimedOutEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'ChildWorkflowExecutionCanceled': (
+        'childWorkflowExecutionCanceledEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'ChildWorkflowExecutionTerminated': (
+        'childWorkflowExecutionTerminatedEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'StartChildWorkflowExecutionFailed': (
+        'startChildWorkflowExecutionFailedEventAttributes', 'workflow',
+        'finished', 'initiatedEventId'),
+    'TimerFired': (
+        'timerFiredEventAttributes', 'timer', 'finished', 'startedEventId'),
+    'TimerCanceled': (
+        'timerCanceledEventAttributes', 'timer', 'finished', 'startedEventId'),
+}
+
+
+def history_tasks(events):
+    """Rebuild the tasks life cycle from the history events.
+
+    Returns a list of HistoryTask objects in their schedule order.
+    """
+    tasks = []
+    by_event_id = {}
+    decision_by_completed_id = {}
+    for event in events:
+        e_type = event.get('eventType')
+        at = event_time(event)
+        task = attrs = None
+        if e_type == 'DecisionTaskScheduled':
+            task = HistoryTask('decision', str(event['eventId']), 'decision',
+                               at)
+        elif e_type == 'ActivityTaskScheduled':
+            attrs = event['activityTaskScheduledEventAttributes']
+            task = HistoryTask('activity', attrs['activityId'],
+                               attrs['activityType']['name'], at)
+        elif e_type == 'StartChildWorkflowExecutionInitiated':
+            attrs = event[
+                'startChildWorkflowExecutionInitiatedEventAttributes']
+            task = HistoryTask('workflow', attrs['workflowId'],
+                               attrs['workflowType']['name'], at)
+        elif e_type == 'TimerStarted':
+            attrs = event['timerStartedEventAttributes']
+            task = HistoryTask('timer', attrs['timerId'], 'timer', at)
+        if task is not None:
+            task.scheduled_id = event['eventId']
+            if attrs is not None:
+                task.decision = decision_by_completed_id.get(
+                    attrs.get('decisionTaskCompletedEventId'))
+            by_event_id[event['eventId']] = task
+            tasks.append(task)
+            continue
+        try:
+            attrs_key, kind, transition, ref = _TRANSITIONS[e_type]
+        except KeyError:
+            continue
+        task = by_event_id.get(event[attrs_key].get(ref))
+        if task is None or task.kind != kind:
+            continue  # the start of the task is not in this history
+        if transition == 'started':
+            task.started = at
+            task.started_id = event['eventId']
+        else:
+            task.finished = at
+            task.finished_id = event['eventId']
+            task.outcome = e_type
+            if e_type == 'DecisionTaskCompleted':
+                decision_by_completed_id[event['eventId']] = task
+    return tasks
+
+
+def to_chrome_trace(events, process_name='swf'):
+    """Export a workflow execution history in the Trace Event Format.
+
+    Returns a JSON serializable dict that can be loaded in Perfetto or
+    chrome://tracing, with a span for each decision, activity, child workflow
+    and timer. A span starts when the task starts (or when it's scheduled if
+    it never started) and the unfinished tasks end with the history.
+    """
+    events = list(events)
+    tasks = history_tasks(events)
+    end = max(event_time(e) for e in events) if events else 0
+    spans = []
+    for task in tasks:
+        start = task.started if task.started is not None else task.scheduled
+        finish = task.finished if task.finished is not None else end
+        args = {'id': task.task_id,
+                'queued': start - task.scheduled,
+                'outcome': task.outcome}
+        spans.append((task.name, task.kind, start, finish, args))
+    return chrome_trace(spans, process_name=process_name)
+
+
+def load_history_file(path):
+    """Load the events from a saved history, optionally gzip compressed.
+
+    The file can contain a list of events or an object with an events list,
+    like the output of `aws swf get-workflow-execution-history`.
+    """
+    with open(path, 'rb') as f:
+        compressed = f.read(2) == b'\x1f\x8b'
+    opener = gzip.open if compressed else open
+    with opener(path, 'rb') as f:
+        history = json.loads(f.read().decode('utf-8'))
+    if isinstance(history, dict):
+        history = history['events']
+    return history
+
+
+def get_history(swf_client, domain, workflow_id, run_id):
+    """Load all the events of a workflow execution, page by page.
+
+    :type swf_client: :class:`flowy.swf.client.SWFClient`
+    :param swf_client: an implementation or duck typing of `SWFClient`
+    """
+    events = []
+    token = None
+    while 1:
+        page = swf_client.get_workflow_execution_history(
+            domain, workflow_id, run_id, next_page_token=token)
+        events.extend(page['events'])
+        token = page.get('nextPageToken')
+        if not token:
+            return events
+
+
+def history_dependencies(tasks):
+    """Infer the task dependencies; map each task to its dependencies.
+
+    Only activities and child workflows are considered. A task depends on the
+    tasks that finished after the start of the previous decision and before
+    the start of the decision that scheduled it, as those are the results
+    that made the decision schedule it.
+    """
+    decisions = sorted((t for t in tasks if t.kind == 'decision'
+                        and t.started_id is not None),
+                       key=lambda t: t.started_id)
+    decision_starts = [d.started_id for d in decisions]
+    finished = sorted((t for t in tasks if t.kind in ('activity', 'workflow')
+                       and t.finished_id is not None),
+                      key=lambda t: t.finished_id)
+    finished_ids = [t.finished_id for t in finished]
+    deps = {}
+    for task in tasks:
+        if task.kind not in ('activity', 'workflow'):
+            continue
+        deps[task] = []
+        if task.decision is None or task.decision.started_id is None:
+            continue
+        i = bisect.bisect_left(decision_starts, task.decision.started_id)
+        window_start = decision_starts[i - 1] if i > 0 else 0
+        lo = bisect.bisect_right(finished_ids, window_start)
+        hi = bisect.bisect_left(finished_ids, task.decision.started_id)
+        deps[task] = finished[lo:hi]
+    return deps
+
+
+def history_tracer(events):
+    """Build an ExecutionTracer from a history.
+
+    The tracer can be used for all the analysis and rendering, like the
+    critical path or the Chrome trace export. The results of the tasks are
+    not recorded, only their outcome.
+
+    The tasks scheduled by the same decision are flushed together, on the
+    same level. An id reused after the previous task closed, which SWF
+    allows, gets a #N suffix.
+    """
+    tasks = history_tasks(events)
+    tracer = ExecutionTracer()
+    records = []
+    node_ids = {}
+    seen = {}
+    for task in tasks:
+        if task.kind not in ('activity', 'workflow'):
+            continue
+        seen[task.task_id] = seen.get(task.task_id, 0) + 1
+        if seen[task.task_id] == 1:
+            node_ids[task] = task.task_id
+        else:
+            node_ids[task] = '%s#%s' % (task.task_id, seen[task.task_id])
+        records.append((task.scheduled, 0, task))
+        if task.started is not None:
+            records.append((task.started, 1, task))
+        if task.finished is not None:
+            records.append((task.finished, 2, task))
+    # Sort only by time and transition, the sort is stable
+    records.sort(key=lambda r: r[:2])
+    batch = None  # the decision, or time, of the schedules not flushed yet
+    for at, transition, task in records:
+        node_id = node_ids[task]
+        if transition == 0:
+            decision = task.decision if task.decision is not None else at
+            if batch is not None and decision != batch:
+                tracer.flush_scheduled()
+            batch = decision
+            if task.kind == 'activity':
+                tracer.schedule_activity(node_id, task.name, at=at)
+            else:
+                tracer.schedule_workflow(node_id, task.name, at=at)
+            continue
+        if batch is not None:
+            tracer.flush_scheduled()
+            batch = None
+        if transition == 1:
+            tracer.start(node_id, at=at)
+        elif task.outcome.endswith('Completed'):
+            tracer.result(node_id, task.outcome, at=at)
+        else:
+            tracer.error(node_id, task.outcome, at=at)
+    if batch is not None:
+        tracer.flush_scheduled()
+    for task, task_deps in history_dependencies(tasks).items():
+        if task not in node_ids:
+            continue
+        for dep in task_deps:
+            if dep in node_ids:
+                tracer.add_dependency(node_ids[dep], node_ids[task])
+    return tracer
+
+
+def latency_stats(tasks):
+    """Aggregate the schedule to start and start to close latencies.
+
+    Returns a dict mapping (kind, name) to a dict with the task count and,
+    for each latency, a dict with the min, mean, median, p95 and max values
+    or None if there are no values.
+    """
+    groups = {}
+    for task in tasks:
+        if task.kind == 'timer':
+            continue
+        groups.setdefault((task.kind, task.name), []).append(task)
+    stats = {}
+    for key, group in groups.items():
+        stats[key] = {
+            'count': len(group),
+            'schedule_to_start': _stats(t.schedule_to_start() for t in group),
+            'start_to_close': _stats(t.start_to_close() for t in group),
+        }
+    return stats
+
+
+def time_breakdown(events):
+    """Split the workflow duration along the critical path.
+
+    The critical path is a chain of tasks with the decisions in between.
+    Returns a dict with the total duration, the time spent by the tasks in
+    the task lists (queueing), executing, and the time between a task
+    finishing and the next one being scheduled (decider lag), all in seconds.
+    """
+    events = list(events)
+    if not events:
+        return {'total': 0, 'queueing': 0, 'executing': 0,
+                'decider_lag': 0, 'critical_path': []}
+    begin = event_time(events[0])
+    end = max(event_time(e) for e in events)
+    view = history_tracer(events).view()
+    path = view.critical_path()
+    queueing = executing = decider_lag = 0
+    last = begin
+    for node_id in path:
+        start = view.start_time(node_id)
+        decider_lag += view.scheduled_at[node_id] - last
+        queueing += start - view.scheduled_at[node_id]
+        executing += view.finished_at[node_id] - start
+        last = view.finished_at[node_id]
+    decider_lag += end - last
+    return {'total': end - begin, 'queueing': queueing,
+            'executing': executing, 'decider_lag': decider_lag,
+            'critical_path': path}
+
+
+def report(events, top=10):
+    """A plain text report of where the time went in a workflow execution."""
+    events = list(events)
+    tasks = history_tasks(events)
+    breakdown = time_breakdown(events)
+    total = breakdown['total'] or 1
+    lines = ['Events: %s, duration: %.3fs' % (len(events), breakdown['total'])]
+    lines.append('Critical path: %s tasks' % len(breakdown['critical_path']))
+    for key, label in (('queueing', 'queueing'),
+                       ('executing', 'executing'),
+                       ('decider_lag', 'decider lag')):
+        lines.append('  %-12s %10.3fs %5.1f%%' % (
+            label, breakdown[key], 100.0 * breakdown[key] / total))
+    lines.append('Latencies (count, schedule to start, start to close, '
+                 'mean/p95/max):')
+    stats = latency_stats(tasks)
+    by_total = sorted(
+        stats.items(),
+        key=lambda item: -sum(s['mean'] * item[1]['count']
+                              for s in (item[1]['schedule_to_start'],
+                                        item[1]['start_to_close']) if s))
+    for (kind, name), s in by_total[:top]:
+        lines.append('  %-8s %-20s %6s  %s  %s' % (
+            kind, name, s['count'], _fmt_stats(s['schedule_to_start']),
+            _fmt_stats(s['start_to_close'])))
+    return '\n'.join(lines)
+
+
+def _stats(values):
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    return {
+        'min': values[0],
+        'mean': sum(values) / float(len(values)),
+        'median': values[len(values) // 2],
+        'p95': values[min(len(values) - 1, int(len(values) * 0.95))],
+        'max': values[-1],
+    }
+
+
+def _fmt_stats(stats):
+    if stats is None:
+        return '%26s' % '-'
+    return '%8.3f/%8.3f/%8.3f' % (stats['mean'], stats['p95'], stats['max'])
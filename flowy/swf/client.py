@@ -193,6 +193,27 @@ class SWFClient(object):
         response = self.client.poll_for_decision_task(**kwargs)
         return response
 
+    def get_workflow_execution_history(self, domain, workflow_id, run_id,
+                                       next_page_token=None,
+                                       max_page_size=1000,
+                                       reverse_order=False):
+        """Wrapper for `boto3.client('swf').get_workflow_execution_history`."""
+        assert max_page_size <= 1000, 'Page size greater than 1000.'
+
+        kwargs = {
+            'domain': str_or_none(domain),
+            'execution': {
+                'workflowId': str_or_none(workflow_id),
+                'runId': str_or_none(run_id)
+            },
+            'nextPageToken': str_or_none(next_page_token),
+            'maximumPageSize': max_page_size,
+            'reverseOrder': reverse_order
+        }
+        normalize_data(kwargs)
+        response = self.client.get_workflow_execution_history(**kwargs)
+        return response
+
     def poll_for_activity_task(self, domain, task_list, identity=None):
         """Wrapper for `boto3.client('swf').poll_for_activity_task`."""
         identity = str(identity)[:IDENTITY_SIZE] if identity else identity
@@ -229,6 +250,30 @@ class SWFClient(object):
         response = self.client.respond_activity_task_failed(**kwargs)
         return response
 
+    def count_pending_activity_tasks(self, domain, task_list):
+        """Wrapper for `boto3.client('swf').count_pending_activity_tasks`."""
+        kwargs = {
+            'domain': str_or_none(domain),
+            'taskList': {
+                'name': str_or_none(task_list),
+            },
+        }
+        normalize_data(kwargs)
+        response = self.client.count_pending_activity_tasks(**kwargs)
+        return response
+
+    def count_pending_decision_tasks(self, domain, task_list):
+        """Wrapper for `boto3.client('swf').count_pending_decision_tasks`."""
+        kwargs = {
+            'domain': str_or_none(domain),
+            'taskList': {
+                'name': str_or_none(task_list),
+            },
+        }
+        normalize_data(kwargs)
+        response = self.client.count_pending_decision_tasks(**kwargs)
+        return response
+
     def respond_activity_task_completed(self, task_token, result=None):
         """Wrapper for `boto3.client('swf').respond_activity_task_completed`."""
         kwargs = {
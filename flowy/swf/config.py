@@ -1,10 +1,12 @@
 import functools
+import hashlib
 
 from botocore.exceptions import ClientError
 
 from flowy.swf.client import cp_encode
 from flowy.swf.client import duration_encode
 from flowy.swf.proxy import SWFActivityProxyFactory
+from flowy.swf.proxy import SWFLocalActivityProxyFactory
 from flowy.swf.proxy import SWFWorkflowProxyFactory
 from flowy.config import ActivityConfig
 from flowy.config import WorkflowConfig
@@ -37,13 +39,39 @@ class SWFConfigMixin(object):
         name, version = str(name), str(version)
         registry.register_task((name, version), self.wrap(func))
         registry.add_remote_reg_callback(
-            functools.partial(self.register_remote, name=name, version=version))
+            RemoteRegistration(self, name, version))
+
+    def defaults_hash(self):
+        """A hash of the defaults checked by the remote registration."""
+        return hashlib.sha1(repr(self._cvt_values()).encode('utf-8')).hexdigest()
 
     def __call__(self, version, name=None):
         key = (name, version)
         return super(SWFConfigMixin, self).__call__(key)
 
 
+class RemoteRegistration(object):
+    """A remote registration callback for a config, name and version.
+
+    The cache key identifies what gets verified: the type, domain, name,
+    version and the config defaults. If a registration succeeded once for a
+    key it's not needed again, unless the type is deprecated in SWF.
+    """
+
+    def __init__(self, config, name, version):
+        self.config = config
+        self.name = name
+        self.version = version
+
+    def __call__(self, swf_client, domain):
+        self.config.register_remote(swf_client, domain, self.name,
+                                    self.version)
+
+    def cache_key(self, domain):
+        return (self.config.category, str(domain), self.name, self.version,
+                self.config.defaults_hash())
+
+
 class SWFActivityConfig(SWFConfigMixin, ActivityConfig):
     """A configuration object for Amazon SWF Activities."""
     category = 'swf_activity'  # venusian category used for this type of confs
@@ -164,8 +192,8 @@ class SWFActivityConfig(SWFConfigMixin, ActivityConfig):
 class SWFWorkflowConfig(SWFConfigMixin, WorkflowConfig):
     """A configuration object suited for Amazon SWF Workflows.
 
-    Use conf_activity and conf_workflow to configure workflow implementation
-    dependencies.
+    Use conf_activity, conf_local_activity and conf_workflow to configure
+    workflow implementation dependencies.
     """
 
     category = 'swf_workflow'  # venusian category used for this type of confs
@@ -327,6 +355,41 @@ class SWFWorkflowConfig(SWFConfigMixin, WorkflowConfig):
             retry=retry)
         self.conf_proxy_factory(dep_name, proxy_factory)
 
+    def conf_local_activity(self, dep_name, func,
+                            timeout=None,
+                            serialize_input=None,
+                            deserialize_result=None,
+                            deserialize_input=None,
+                            serialize_result=None,
+                            retry=(0, 0, 0)):
+        """Configure an activity dependency that runs in the decider.
+
+        The calls skip the SWF round trips of the activities: func runs when
+        the decision is made and its outcome is recorded in a marker, read
+        back by the later decisions. Use it for small and fast functions, it
+        takes from the decision duration. Like a decision, an attempt can run
+        more than once if the decision fails.
+
+        The func doesn't get a heartbeat argument. The timeout is in seconds,
+        a timed out call is left running in a thread. The retry delays are
+        like in conf_activity but failed attempts are retried too, not only
+        the timed out ones; the attempts without a delay run in the same
+        decision.
+
+            cfg.conf_local_activity('parse', parse, timeout=5, retry=(0, 10))
+        """
+        if timeout is not None and not timeout > 0:
+            raise ValueError('Invalid timeout: %r' % (timeout, ))
+        activity_config = ActivityConfig(deserialize_input, serialize_result)
+        proxy_factory = SWFLocalActivityProxyFactory(
+            identity=str(dep_name),
+            func=activity_config.wrap(func),
+            timeout=timeout,
+            serialize_input=serialize_input,
+            deserialize_result=deserialize_result,
+            retry=retry)
+        self.conf_proxy_factory(dep_name, proxy_factory)
+
     def conf_workflow(self, dep_name, version,
                       name=None,
                       task_list=None,
@@ -357,10 +420,11 @@ class SWFWorkflowConfig(SWFConfigMixin, WorkflowConfig):
         f = super(SWFWorkflowConfig, self).wrap(func)
 
         @functools.wraps(func)
-        def wrapper(input_data, *extra_args):
+        def wrapper(input_data, *extra_args, **options):
             extra_args = extra_args + (DescCounter(int(self.rate_limit)), )
-            return f(input_data, *extra_args)
+            return f(input_data, *extra_args, **options)
 
+        wrapper.takes_metrics = True
         return wrapper
 
 
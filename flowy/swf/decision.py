@@ -1,25 +1,38 @@
+import threading
 import uuid
 
 from botocore.exceptions import ClientError
 
+from flowy.metrics import null_metrics
 from flowy.swf.client import SWFDecisions
+from flowy.swf.history import LOCAL_ACTIVITY_MARKER
+from flowy.swf.history import local_outcome
+from flowy.swf.history import task_key
+from flowy.swf.history import timer_key
+from flowy.swf.retry import RetryPolicy
 from flowy.utils import logger
 
 
-INPUT_SIZE = RESULT_SIZE = 32768
+INPUT_SIZE = RESULT_SIZE = MARKER_SIZE = 32768
 REASON_SIZE = 256
 
 
 class SWFActivityDecision(object):
-    def __init__(self, swf_client, token):
+    def __init__(self, swf_client, token, metrics=None, retry=None):
         """SWF activity type decision.
 
         :type swf_client: :class:`flowy.swf.client.SWFClient`
         :param swf_client: an instanced SWF client
         :param token: the token identifying the ActivityTask worker
+        :type metrics: :class:`flowy.metrics.Metrics`
+        :param metrics: gets the heartbeats and the errors
+        :type retry: :class:`flowy.swf.retry.RetryPolicy`
+        :param retry: the retry policy for the SWF calls
         """
         self.swf_client = swf_client
         self.token = token
+        self.metrics = null_metrics if metrics is None else metrics
+        self.retry = RetryPolicy(metrics=self.metrics) if retry is None else retry
 
     def heartbeat(self, details=None):
         """Used to report that the activity is still making progress. Details
@@ -31,20 +44,25 @@ class SWFActivityDecision(object):
         :rtype: bool
         :returns: did someone heard my heartbeat?
         """
+        self.metrics.incr('activity.heartbeats')
         try:
-            self.swf_client.record_activity_task_heartbeat(self.token,
-                                                           details=details)
+            self.retry.call('RecordActivityTaskHeartbeat',
+                            self.swf_client.record_activity_task_heartbeat,
+                            self.token, details=details)
         except ClientError:
             logger.exception('Error while sending the heartbeat:')
+            self.metrics.incr('activity.heartbeat_errors')
             return False
         return True
 
     def fail(self, reason):
         try:
-            self.swf_client.respond_activity_task_failed(self.token,
-                                                         reason=reason)
+            self.retry.call('RespondActivityTaskFailed',
+                            self.swf_client.respond_activity_task_failed,
+                            self.token, reason=reason)
         except ClientError:
             logger.exception('Error while failing the activity:')
+            self.metrics.incr('activity.respond_errors')
             return False
         return True
 
@@ -59,17 +77,20 @@ class SWFActivityDecision(object):
         if len(result) > RESULT_SIZE:
             self.fail("Result too large: %s/%s" % (len(result), RESULT_SIZE))
         try:
-            self.swf_client.respond_activity_task_completed(self.token,
-                                                            result=result)
+            self.retry.call('RespondActivityTaskCompleted',
+                            self.swf_client.respond_activity_task_completed,
+                            self.token, result=result)
         except ClientError:
             logger.exception('Error while finishing the activity:')
+            self.metrics.incr('activity.respond_errors')
             return False
         return True
 
 
 class SWFWorkflowDecision(object):
     def __init__(self, swf_client, token, name, version, task_list,
-                 decision_duration, workflow_duration, tags, child_policy):
+                 decision_duration, workflow_duration, tags, child_policy,
+                 metrics=None, retry=None):
         """SWF workflow type decision.
 
         :type swf_client: :class:`flowy.swf.client.SWFClient`
@@ -82,6 +103,10 @@ class SWFWorkflowDecision(object):
         :param workflow_duration: exec duration in seconds of workflow
         :param tags: list of str tags, searchable later
         :param child_policy: policy to use for the child workflow executions
+        :type metrics: :class:`flowy.metrics.Metrics`
+        :param metrics: gets the number of decisions sent and the errors
+        :type retry: :class:`flowy.swf.retry.RetryPolicy`
+        :param retry: the retry policy used to send the decisions
         """
         self.swf_client = swf_client
         self.token = token
@@ -91,7 +116,18 @@ class SWFWorkflowDecision(object):
         self.tags = tags
         self.child_policy = child_policy
         self.decisions = SWFDecisions()
+        self.markers = []
         self.closed = False
+        self.metrics = null_metrics if metrics is None else metrics
+        self.retry = RetryPolicy(metrics=self.metrics) if retry is None else retry
+
+    def _clear(self):
+        """Clear the queued decisions but keep the local activity markers,
+        the local activities ran already."""
+        decisions = self.decisions = SWFDecisions()
+        for details in self.markers:
+            decisions.record_marker(LOCAL_ACTIVITY_MARKER, details)
+        return decisions
 
     def fail(self, reason):
         """Fail the workflow and flush.
@@ -99,7 +135,7 @@ class SWFWorkflowDecision(object):
         Any other decisions queued are cleared.
         The reason is truncated if too large.
         """
-        decisions = self.decisions = SWFDecisions()
+        decisions = self._clear()
         decisions.fail_workflow_execution(reason=str(reason)[:REASON_SIZE])
         self.flush()
 
@@ -108,11 +144,14 @@ class SWFWorkflowDecision(object):
         if self.closed:
             return
         self.closed = True
+        self.metrics.histogram('workflow.decisions', len(self.decisions._data))
         try:
-            self.swf_client.respond_decision_task_completed(
-                self.token, decisions=self.decisions._data)
+            self.retry.call('RespondDecisionTaskCompleted',
+                            self.swf_client.respond_decision_task_completed,
+                            self.token, decisions=self.decisions._data)
         except ClientError:
             logger.exception('Error while sending the decisions:')
+            self.metrics.incr('workflow.respond_errors')
             # ignore the error and let the decision timeout and retry
 
     def restart(self, input_data):
@@ -120,7 +159,7 @@ class SWFWorkflowDecision(object):
 
         Any other decisions queued are cleared.
         """
-        decisions = self.decisions = SWFDecisions()
+        decisions = self._clear()
         input_data = str(input_data)
         if len(input_data) > INPUT_SIZE:
             self.fail("Restart input too large: %s/%s" % (len(input_data), INPUT_SIZE))
@@ -139,7 +178,7 @@ class SWFWorkflowDecision(object):
 
         Any other decisions queued are cleared.
         """
-        decisions = self.decisions = SWFDecisions()
+        decisions = self._clear()
         result = str(result)
         if len(result) > RESULT_SIZE:
             self.fail("Result too large: %s/%s" % (len(result), RESULT_SIZE))
@@ -152,6 +191,11 @@ class SWFWorkflowDecision(object):
         self.decisions.start_timer(timer_id=timer_key(call_key),
                                    start_to_fire_timeout=str(delay))
 
+    def record_local_activity(self, details):
+        """Record the outcome of a local activity attempt in a marker."""
+        self.markers.append(details)
+        self.decisions.record_marker(LOCAL_ACTIVITY_MARKER, details)
+
     def schedule_activity(self, call_key, name, version, input_data, task_list,
                           heartbeat, schedule_to_close, schedule_to_start,
                           start_to_close):
@@ -222,9 +266,78 @@ class SWFActivityTaskDecision(SWFWorkflowTaskDecision):
             self.proxy_factory.start_to_close)
 
 
-def timer_key(call_key):
-    return '%s:t' % call_key
+class SWFLocalActivityTaskDecision(SWFWorkflowTaskDecision):
+    """Run the activity attempts in the decider and record their outcomes.
 
+    The attempts aren't rate limited, they don't stay running. An attempt
+    with a delay waits for a timer, so for a new decision task.
+    """
 
-def task_key(identity, call_number, retry_number):
-    return '%s-%s-%s' % (identity, call_number, retry_number)
+    def __init__(self, decision, execution_history, proxy_factory):
+        super(SWFLocalActivityTaskDecision, self).__init__(
+            decision, execution_history, proxy_factory, None)
+        self.ran = False
+
+    def schedule(self, call_number, retry_number, delay, input_data):
+        tk = task_key(self.proxy_factory.identity, call_number, retry_number)
+        if delay > 0 and not self.execution_history.is_timer_ready(tk):
+            if not self.execution_history.is_timer_running(tk):
+                self.decision.schedule_timer(tk, delay)
+        else:
+            retried = retry_number + 1 < len(self.proxy_factory.retry)
+            self._schedule(tk, input_data, retried)
+
+    def _schedule(self, task_key, input_data, retried=False):
+        pf = self.proxy_factory
+        metrics = self.decision.metrics
+        result = error = None
+        with metrics.timer('workflow.local_activity'):
+            try:
+                result = call_with_timeout(pf.func, (input_data, ), pf.timeout)
+            except LocalActivityTimeout:
+                logger.warning('Local activity %r timed out after %ss.',
+                               task_key, pf.timeout)
+                metrics.incr('workflow.local_activity.timeouts')
+            except Exception as e:
+                logger.exception('Error in local activity %r:', task_key)
+                metrics.incr('workflow.local_activity.errors')
+                error = e
+        details = local_outcome(task_key, result, error, retried)
+        if len(details) > MARKER_SIZE:
+            details = local_outcome(task_key, error='Result too large: %s/%s'
+                                    % (len(details), MARKER_SIZE))
+        self.decision.record_local_activity(details)
+        self.execution_history.add_local_outcome(details)
+        self.ran = True
+
+
+class LocalActivityTimeout(Exception):
+    """A local activity didn't finish in time."""
+
+
+def call_with_timeout(func, args, timeout=None):
+    """Call func(*args), raise LocalActivityTimeout after timeout seconds.
+
+    With a timeout the call runs in a daemon thread that is left running if
+    it times out, a thread can't be interrupted.
+    """
+    if timeout is None:
+        return func(*args)
+    outcome = []
+
+    def target():
+        try:
+            outcome.append((True, func(*args)))
+        except Exception as e:
+            outcome.append((False, e))
+
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    if not outcome:
+        raise LocalActivityTimeout(timeout)
+    succeeded, value = outcome[0]
+    if not succeeded:
+        raise value
+    return value
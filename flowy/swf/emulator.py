@@ -0,0 +1,747 @@
+"""An in-memory Amazon SWF service for tests and load tests.
+
+SWFEmulator implements the subset of the low-level boto3 SWF client API used by
+flowy, so it can be wrapped by SWFClient like the real client:
+
+    emulator = SWFEmulator()
+    swf_client = SWFClient(client=emulator)
+
+The methods take the same keyword arguments as the boto3 client methods and
+return the same response structures. The histories are kept in memory and
+the same events SWF would record are added for decisions, activities, timers
+and child workflows, including their timeouts. The errors are raised as
+botocore ClientError exceptions with the SWF fault codes.
+
+The polls block until a task is available or poll_timeout seconds pass, like
+the SWF long polling. All the durations, including the timeouts, are
+multiplied by time_scale; use a small value to speed up the tests.
+
+Compared to SWF, the emulator is lenient with the configuration: the domains
+don't have to be registered and the unset timeouts never expire.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+
+from botocore.exceptions import ClientError
+
+
+__all__ = ['SWFEmulator']
+
+
+class _StartFailed(Exception):
+    """A workflow execution can't be started, the cause is the argument."""
+
+
+class _Execution(object):
+    def __init__(self, domain, workflow_id, run_id, workflow_type, task_list,
+                 execution_timeout, task_timeout, child_policy, parent=None):
+        self.domain = domain
+        self.workflow_id = workflow_id
+        self.run_id = run_id
+        self.workflow_type = workflow_type
+        self.task_list = task_list
+        self.execution_timeout = execution_timeout
+        self.task_timeout = task_timeout
+        self.child_policy = child_policy
+        # (parent execution, initiated event id) for child workflows
+        self.parent = parent
+        self.parent_started_id = None
+        self.events = []
+        self.open = True
+        self.close_status = None
+        # The decision task state: scheduled and not started yet, in
+        # progress, and whether events were added while in progress.
+        self.decision_scheduled_id = None
+        self.decision_started_id = None
+        self.decision_token = None
+        self.decision_pending = False
+        self.previous_started_id = 0
+        self.activities = {}  # activity id -> _ActivityTask
+        self.timers = {}  # timer id -> started event id
+        self.children = {}  # workflow id -> _Execution
+
+    def execution(self):
+        return {'workflowId': self.workflow_id, 'runId': self.run_id}
+
+
+class _ActivityTask(object):
+    def __init__(self, execution, scheduled_id, activity_id, activity_type,
+                 input, task_list, timeouts):
+        self.execution = execution
+        self.scheduled_id = scheduled_id
+        self.activity_id = activity_id
+        self.activity_type = activity_type
+        self.input = input
+        self.task_list = task_list
+        (self.heartbeat_timeout, self.schedule_to_start_timeout,
+         self.schedule_to_close_timeout, self.start_to_close_timeout) = timeouts
+        self.started_id = None
+        self.token = None
+        self.beats = 0
+        self.details = None
+        self.cancel_requested = False
+        self.closed = False
+
+
+class SWFEmulator(object):
+    """An in-memory implementation of the boto3 SWF client."""
+
+    def __init__(self, poll_timeout=60, time_scale=1.0, page_size=1000):
+        self.poll_timeout = poll_timeout
+        self.time_scale = time_scale
+        self.page_size = page_size
+        self.cond = threading.Condition()
+        self.types = {}  # (domain, kind, name, version) -> config
+        self.executions = {}  # run id -> _Execution
+        self.open_executions = {}  # (domain, workflow id) -> _Execution
+        self.decision_queues = {}  # (domain, task list) -> deque
+        self.activity_queues = {}  # (domain, task list) -> deque
+        self.tokens = {}  # task token -> _Execution or _ActivityTask
+        self.decision_events = {}  # task token -> history snapshot
+        self.deadlines = []  # heap of (at, seq, callback, args)
+        self.seq = itertools.count()
+
+    def register_activity_type(self, domain, name, version, **config):
+        self._register(domain, 'activity', name, version, config)
+        return {}
+
+    def register_workflow_type(self, domain, name, version, **config):
+        self._register(domain, 'workflow', name, version, config)
+        return {}
+
+    def describe_activity_type(self, domain, activityType):
+        return self._describe(domain, 'activity', activityType)
+
+    def describe_workflow_type(self, domain, workflowType):
+        return self._describe(domain, 'workflow', workflowType)
+
+    def start_workflow_execution(self, domain, workflowId, workflowType,
+                                 **attrs):
+        with self.cond:
+            self._expire()
+            try:
+                ex = self._start(domain, workflowId, workflowType, attrs)
+            except _StartFailed as e:
+                code = {
+                    'WORKFLOW_TYPE_DOES_NOT_EXIST': 'UnknownResourceFault',
+                    'WORKFLOW_ALREADY_RUNNING':
+                    'WorkflowExecutionAlreadyStartedFault',
+                }.get(e.args[0], 'DefaultUndefinedFault')
+                raise _fault(code, e.args[0], 'StartWorkflowExecution')
+            return {'runId': ex.run_id}
+
+    def get_workflow_execution_history(self, domain, execution,
+                                       nextPageToken=None,
+                                       maximumPageSize=1000,
+                                       reverseOrder=False):
+        with self.cond:
+            self._expire()
+            ex = self.executions.get(execution.get('runId'))
+            if (ex is None or ex.domain != domain
+                    or ex.workflow_id != execution.get('workflowId')):
+                raise _fault('UnknownResourceFault', 'Unknown execution.',
+                             'GetWorkflowExecutionHistory')
+            return self._page(ex.events, nextPageToken, maximumPageSize,
+                              reverseOrder)
+
+    def poll_for_decision_task(self, domain, taskList, identity=None,
+                               nextPageToken=None, maximumPageSize=1000,
+                               reverseOrder=False):
+        with self.cond:
+            if nextPageToken:
+                token, offset = nextPageToken.rsplit(':', 1)
+                ex = self.tokens.get(token)
+                if token not in self.decision_events:
+                    raise _fault('UnknownResourceFault', 'Unknown page token.',
+                                 'PollForDecisionTask')
+                return self._decision_page(ex, token, offset,
+                                           maximumPageSize, reverseOrder)
+            ex = self._wait(self.decision_queues, (domain, taskList['name']),
+                            _decision_ready)
+            if ex is None:
+                return {'taskToken': '', 'events': [], 'startedEventId': 0,
+                        'previousStartedEventId': 0}
+            ex.decision_started_id = self._event(
+                ex, 'DecisionTaskStarted',
+                scheduledEventId=ex.decision_scheduled_id, identity=identity)
+            token = ex.decision_token = _new_id()
+            self.tokens[token] = ex
+            self.decision_events[token] = list(ex.events)
+            self._at(ex.task_timeout, self._decision_timed_out, ex, token)
+            return self._decision_page(ex, token, 0, maximumPageSize,
+                                       reverseOrder)
+
+    def count_pending_decision_tasks(self, domain, taskList):
+        with self.cond:
+            return self._count(self.decision_queues, (domain, taskList['name']),
+                               _decision_ready)
+
+    def count_pending_activity_tasks(self, domain, taskList):
+        with self.cond:
+            return self._count(self.activity_queues, (domain, taskList['name']),
+                               _activity_ready)
+
+    def respond_decision_task_completed(self, taskToken, decisions=(),
+                                        executionContext=None):
+        with self.cond:
+            self._expire()
+            ex = self._task(taskToken, _Execution,
+                            'RespondDecisionTaskCompleted')
+            completed_id = self._event(
+                ex, 'DecisionTaskCompleted',
+                scheduledEventId=ex.decision_scheduled_id,
+                startedEventId=ex.decision_started_id,
+                executionContext=executionContext)
+            pending = ex.decision_pending
+            ex.previous_started_id = ex.decision_started_id
+            self._end_decision(ex)
+            for decision in decisions:
+                self._decide(ex, completed_id, decision, pending)
+                if not ex.open:
+                    break
+            if pending:
+                self._schedule_decision(ex)
+            self.cond.notify_all()
+            return {}
+
+    def poll_for_activity_task(self, domain, taskList, identity=None):
+        with self.cond:
+            task = self._wait(self.activity_queues, (domain, taskList['name']),
+                              _activity_ready)
+            if task is None:
+                return {'taskToken': '', 'startedEventId': 0}
+            ex = task.execution
+            task.started_id = self._event(ex, 'ActivityTaskStarted',
+                                          scheduledEventId=task.scheduled_id,
+                                          identity=identity)
+            task.token = _new_id()
+            self.tokens[task.token] = task
+            self._at(task.start_to_close_timeout, self._activity_timed_out,
+                     task, 'START_TO_CLOSE')
+            self._at(task.heartbeat_timeout, self._activity_timed_out, task,
+                     'HEARTBEAT', task.beats)
+            return _clean({
+                'taskToken': task.token,
+                'activityId': task.activity_id,
+                'startedEventId': task.started_id,
+                'workflowExecution': ex.execution(),
+                'activityType': task.activity_type,
+                'input': task.input,
+            })
+
+    def record_activity_task_heartbeat(self, taskToken, details=None):
+        with self.cond:
+            self._expire()
+            task = self._task(taskToken, _ActivityTask,
+                              'RecordActivityTaskHeartbeat')
+            task.details = details
+            task.beats += 1
+            self._at(task.heartbeat_timeout, self._activity_timed_out, task,
+                     'HEARTBEAT', task.beats)
+            return {'cancelRequested': task.cancel_requested}
+
+    def respond_activity_task_completed(self, taskToken, result=None):
+        with self.cond:
+            self._expire()
+            task = self._task(taskToken, _ActivityTask,
+                              'RespondActivityTaskCompleted')
+            self._close_activity(task, 'ActivityTaskCompleted', result=result,
+                                 startedEventId=task.started_id)
+            return {}
+
+    def respond_activity_task_failed(self, taskToken, reason=None,
+                                     details=None):
+        with self.cond:
+            self._expire()
+            task = self._task(taskToken, _ActivityTask,
+                              'RespondActivityTaskFailed')
+            self._close_activity(task, 'ActivityTaskFailed', reason=reason,
+                                 details=details,
+                                 startedEventId=task.started_id)
+            return {}
+
+    def wait_closed(self, workflow_id, run_id, timeout=None):
+        """Block until the execution closes, return its close status.
+
+        Returns None if the execution is still open after timeout seconds.
+        This is not part of the SWF API, it's a convenience for tests.
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while 1:
+                self._expire()
+                ex = self.executions.get(run_id)
+                if ex is None or ex.workflow_id != workflow_id:
+                    raise _fault('UnknownResourceFault', 'Unknown execution.',
+                                 'WaitClosed')
+                if not ex.open:
+                    return ex.close_status
+                wait = self._wait_time(end)
+                if wait is not None and wait <= 0:
+                    return None
+                self.cond.wait(wait)
+
+    def _register(self, domain, kind, name, version, config):
+        key = (domain, kind, name, version)
+        with self.cond:
+            if key in self.types:
+                raise _fault('TypeAlreadyExistsFault',
+                             'Type already registered: %s %s %s' % key[1:],
+                             'Register%sType' % kind.capitalize())
+            config.pop('description', None)
+            self.types[key] = config
+
+    def _describe(self, domain, kind, t):
+        key = (domain, kind, t['name'], t['version'])
+        with self.cond:
+            config = self.types.get(key)
+        if config is None:
+            raise _fault('UnknownResourceFault',
+                         'Unknown type: %s %s %s' % key[1:],
+                         'Describe%sType' % kind.capitalize())
+        return {'typeInfo': {'%sType' % kind: dict(t),
+                             'status': 'REGISTERED'},
+                'configuration': dict(config)}
+
+    def _start(self, domain, workflow_id, workflow_type, attrs, parent=None):
+        key = (domain, 'workflow', workflow_type['name'],
+               workflow_type['version'])
+        config = self.types.get(key)
+        if config is None:
+            raise _StartFailed('WORKFLOW_TYPE_DOES_NOT_EXIST')
+        if (domain, workflow_id) in self.open_executions:
+            raise _StartFailed('WORKFLOW_ALREADY_RUNNING')
+        task_list = (attrs.get('taskList', {}).get('name')
+                     or config.get('defaultTaskList', {}).get('name'))
+        if task_list is None:
+            raise _StartFailed('DEFAULT_TASK_LIST_UNDEFINED')
+        execution_timeout = (attrs.get('executionStartToCloseTimeout')
+                             or config.get('defaultExecutionStartToCloseTimeout')
+                             or 'NONE')
+        task_timeout = (attrs.get('taskStartToCloseTimeout')
+                        or config.get('defaultTaskStartToCloseTimeout')
+                        or 'NONE')
+        child_policy = (attrs.get('childPolicy')
+                        or config.get('defaultChildPolicy') or 'TERMINATE')
+        ex = _Execution(domain, workflow_id, _new_id(),
+                        dict(workflow_type), task_list, execution_timeout,
+                        task_timeout, child_policy, parent)
+        started = {
+            'workflowType': ex.workflow_type,
+            'taskList': {'name': task_list},
+            'input': attrs.get('input'),
+            'executionStartToCloseTimeout': execution_timeout,
+            'taskStartToCloseTimeout': task_timeout,
+            'childPolicy': child_policy,
+            'tagList': attrs.get('tagList'),
+            'continuedExecutionRunId': attrs.get('continuedExecutionRunId'),
+        }
+        if parent is not None:
+            started['parentWorkflowExecution'] = parent[0].execution()
+            started['parentInitiatedEventId'] = parent[1]
+        self._event(ex, 'WorkflowExecutionStarted', **started)
+        self.executions[ex.run_id] = ex
+        self.open_executions[(domain, workflow_id)] = ex
+        self._at(execution_timeout, self._workflow_timed_out, ex)
+        self._schedule_decision(ex)
+        return ex
+
+    def _decide(self, ex, completed_id, decision, pending):
+        d_type = decision['decisionType']
+        attrs = decision.get(_attrs_key(d_type, 'DecisionAttributes'), {})
+        if d_type in _CLOSE_DECISIONS and pending:
+            # SWF doesn't close executions with events the decider didn't see
+            self._event(ex, d_type + 'Failed', cause='UNHANDLED_DECISION',
+                        decisionTaskCompletedEventId=completed_id)
+            return
+        handler = getattr(self, '_decide_%s' % d_type, None)
+        if handler is None:
+            raise _fault('ValidationException',
+                         'Unsupported decision: %s' % d_type,
+                         'RespondDecisionTaskCompleted')
+        handler(ex, completed_id, attrs)
+
+    def _decide_ScheduleActivityTask(self, ex, completed_id, attrs):
+        a_type = attrs['activityType']
+        activity_id = attrs['activityId']
+        config = self.types.get((ex.domain, 'activity', a_type['name'],
+                                 a_type['version']))
+        task_list = attrs.get('taskList', {}).get('name')
+        if config is not None:
+            task_list = task_list or config.get('defaultTaskList',
+                                                {}).get('name')
+        cause = None
+        if config is None:
+            cause = 'ACTIVITY_TYPE_DOES_NOT_EXIST'
+        elif activity_id in ex.activities:
+            cause = 'ACTIVITY_ID_ALREADY_IN_USE'
+        elif task_list is None:
+            cause = 'DEFAULT_TASK_LIST_UNDEFINED'
+        if cause is not None:
+            self._event(ex, 'ScheduleActivityTaskFailed', activityType=a_type,
+                        activityId=activity_id, cause=cause,
+                        decisionTaskCompletedEventId=completed_id)
+            self._schedule_decision(ex)
+            return
+        timeouts = tuple(
+            attrs.get(name) or config.get('defaultTask' + name[0].upper()
+                                          + name[1:])
+            for name in ('heartbeatTimeout', 'scheduleToStartTimeout',
+                         'scheduleToCloseTimeout', 'startToCloseTimeout'))
+        scheduled_id = self._event(
+            ex, 'ActivityTaskScheduled', activityType=a_type,
+            activityId=activity_id, input=attrs.get('input'),
+            control=attrs.get('control'), taskList={'name': task_list},
+            heartbeatTimeout=timeouts[0], scheduleToStartTimeout=timeouts[1],
+            scheduleToCloseTimeout=timeouts[2],
+            startToCloseTimeout=timeouts[3],
+            decisionTaskCompletedEventId=completed_id)
+        task = _ActivityTask(ex, scheduled_id, activity_id, a_type,
+                             attrs.get('input'), task_list, timeouts)
+        ex.activities[activity_id] = task
+        self._at(task.schedule_to_start_timeout, self._activity_timed_out,
+                 task, 'SCHEDULE_TO_START')
+        self._at(task.schedule_to_close_timeout, self._activity_timed_out,
+                 task, 'SCHEDULE_TO_CLOSE')
+        self._queue(self.activity_queues, (ex.domain, task_list), task)
+
+    def _decide_RequestCancelActivityTask(self, ex, completed_id, attrs):
+        activity_id = attrs['activityId']
+        task = ex.activities.get(activity_id)
+        if task is None:
+            self._event(ex, 'RequestCancelActivityTaskFailed',
+                        activityId=activity_id, cause='ACTIVITY_ID_UNKNOWN',
+                        decisionTaskCompletedEventId=completed_id)
+            self._schedule_decision(ex)
+            return
+        requested_id = self._event(ex, 'ActivityTaskCancelRequested',
+                                   activityId=activity_id,
+                                   decisionTaskCompletedEventId=completed_id)
+        task.cancel_requested = True
+        if task.started_id is None:
+            self._close_activity(task, 'ActivityTaskCanceled',
+                                 latestCancelRequestedEventId=requested_id)
+
+    def _decide_RecordMarker(self, ex, completed_id, attrs):
+        self._event(ex, 'MarkerRecorded', markerName=attrs['markerName'],
+                    details=attrs.get('details'),
+                    decisionTaskCompletedEventId=completed_id)
+
+    def _decide_StartTimer(self, ex, completed_id, attrs):
+        timer_id = attrs['timerId']
+        if timer_id in ex.timers:
+            self._event(ex, 'StartTimerFailed', timerId=timer_id,
+                        cause='TIMER_ID_ALREADY_IN_USE',
+                        decisionTaskCompletedEventId=completed_id)
+            self._schedule_decision(ex)
+            return
+        started_id = ex.timers[timer_id] = self._event(
+            ex, 'TimerStarted', timerId=timer_id,
+            control=attrs.get('control'),
+            startToFireTimeout=attrs['startToFireTimeout'],
+            decisionTaskCompletedEventId=completed_id)
+        self._at(attrs['startToFireTimeout'], self._timer_fired, ex, timer_id,
+                 started_id)
+
+    def _decide_CancelTimer(self, ex, completed_id, attrs):
+        timer_id = attrs['timerId']
+        started_id = ex.timers.pop(timer_id, None)
+        if started_id is None:
+            self._event(ex, 'CancelTimerFailed', timerId=timer_id,
+                        cause='TIMER_ID_UNKNOWN',
+                        decisionTaskCompletedEventId=completed_id)
+            self._schedule_decision(ex)
+            return
+        self._event(ex, 'TimerCanceled', timerId=timer_id,
+                    startedEventId=started_id,
+                    decisionTaskCompletedEventId=completed_id)
+
+    def _decide_StartChildWorkflowExecution(self, ex, completed_id, attrs):
+        w_type = attrs['workflowType']
+        workflow_id = attrs['workflowId']
+        initiated = dict(attrs, decisionTaskCompletedEventId=completed_id)
+        initiated_id = self._event(
+            ex, 'StartChildWorkflowExecutionInitiated', **initiated)
+        try:
+            child = self._start(ex.domain, workflow_id, w_type, attrs,
+                                parent=(ex, initiated_id))
+        except _StartFailed as e:
+            self._event(ex, 'StartChildWorkflowExecutionFailed',
+                        workflowType=w_type, workflowId=workflow_id,
+                        cause=e.args[0], initiatedEventId=initiated_id,
+                        decisionTaskCompletedEventId=completed_id)
+            self._schedule_decision(ex)
+            return
+        child.parent_started_id = self._event(
+            ex, 'ChildWorkflowExecutionStarted',
+            workflowExecution=child.execution(), workflowType=w_type,
+            initiatedEventId=initiated_id)
+        ex.children[workflow_id] = child
+        self._schedule_decision(ex)
+
+    def _decide_CompleteWorkflowExecution(self, ex, completed_id, attrs):
+        self._close(ex, 'COMPLETED', 'WorkflowExecutionCompleted',
+                    result=attrs.get('result'),
+                    decisionTaskCompletedEventId=completed_id)
+
+    def _decide_FailWorkflowExecution(self, ex, completed_id, attrs):
+        self._close(ex, 'FAILED', 'WorkflowExecutionFailed',
+                    reason=attrs.get('reason'), details=attrs.get('details'),
+                    decisionTaskCompletedEventId=completed_id)
+
+    def _decide_CancelWorkflowExecution(self, ex, completed_id, attrs):
+        self._close(ex, 'CANCELED', 'WorkflowExecutionCanceled',
+                    details=attrs.get('details'),
+                    decisionTaskCompletedEventId=completed_id)
+
+    def _decide_ContinueAsNewWorkflowExecution(self, ex, completed_id, attrs):
+        w_type = dict(ex.workflow_type)
+        if attrs.get('workflowTypeVersion'):
+            w_type['version'] = attrs['workflowTypeVersion']
+        attrs = dict(attrs, continuedExecutionRunId=ex.run_id)
+        attrs.setdefault('taskList', {'name': ex.task_list})
+        attrs.setdefault('childPolicy', ex.child_policy)
+        # The new run replaces this one, also as the child of the parent
+        parent, ex.parent = ex.parent, None
+        self._close(ex, 'CONTINUED_AS_NEW', 'WorkflowExecutionContinuedAsNew',
+                    input=attrs.get('input'),
+                    decisionTaskCompletedEventId=completed_id)
+        new = self._start(ex.domain, ex.workflow_id, w_type, attrs, parent)
+        ex.events[-1][_attrs_key('WorkflowExecutionContinuedAsNew')][
+            'newExecutionRunId'] = new.run_id
+        if parent is not None:
+            new.parent_started_id = ex.parent_started_id
+            parent[0].children[ex.workflow_id] = new
+
+    def _close(self, ex, status, e_type, **attrs):
+        self._event(ex, e_type, **attrs)
+        ex.open = False
+        ex.close_status = status
+        del self.open_executions[(ex.domain, ex.workflow_id)]
+        self._end_decision(ex)
+        for task in ex.activities.values():
+            task.closed = True
+            self.tokens.pop(task.token, None)
+        ex.activities.clear()
+        ex.timers.clear()
+        for child in list(ex.children.values()):
+            if not child.open:
+                continue
+            if ex.child_policy == 'TERMINATE':
+                self._close(child, 'TERMINATED', 'WorkflowExecutionTerminated',
+                            childPolicy=ex.child_policy,
+                            cause='CHILD_POLICY_APPLIED')
+            elif ex.child_policy == 'REQUEST_CANCEL':
+                self._event(child, 'WorkflowExecutionCancelRequested',
+                            cause='CHILD_POLICY_APPLIED')
+                self._schedule_decision(child)
+        if ex.parent is not None:
+            parent, initiated_id = ex.parent
+            if parent.open:
+                parent.children.pop(ex.workflow_id, None)
+                p_type, p_attrs = _PARENT_EVENTS[status]
+                p_attrs = dict((k, attrs.get(v)) for k, v in p_attrs.items())
+                self._event(parent, p_type, workflowExecution=ex.execution(),
+                            workflowType=ex.workflow_type,
+                            initiatedEventId=initiated_id,
+                            startedEventId=ex.parent_started_id, **p_attrs)
+                self._schedule_decision(parent)
+        self.cond.notify_all()
+
+    def _schedule_decision(self, ex):
+        if not ex.open:
+            return
+        if ex.decision_started_id is not None:
+            ex.decision_pending = True
+        elif ex.decision_scheduled_id is None:
+            ex.decision_scheduled_id = self._event(
+                ex, 'DecisionTaskScheduled', taskList={'name': ex.task_list},
+                startToCloseTimeout=ex.task_timeout)
+            self._queue(self.decision_queues, (ex.domain, ex.task_list), ex)
+
+    def _end_decision(self, ex):
+        self.tokens.pop(ex.decision_token, None)
+        self.decision_events.pop(ex.decision_token, None)
+        ex.decision_scheduled_id = ex.decision_started_id = None
+        ex.decision_token = None
+        ex.decision_pending = False
+
+    def _close_activity(self, task, e_type, **attrs):
+        ex = task.execution
+        task.closed = True
+        self.tokens.pop(task.token, None)
+        del ex.activities[task.activity_id]
+        self._event(ex, e_type, scheduledEventId=task.scheduled_id, **attrs)
+        self._schedule_decision(ex)
+
+    def _decision_timed_out(self, ex, token):
+        if ex.decision_token != token:
+            return
+        self._event(ex, 'DecisionTaskTimedOut', timeoutType='START_TO_CLOSE',
+                    scheduledEventId=ex.decision_scheduled_id,
+                    startedEventId=ex.decision_started_id)
+        self._end_decision(ex)
+        self._schedule_decision(ex)
+
+    def _activity_timed_out(self, task, timeout_type, beat=None):
+        if task.closed:
+            return
+        if timeout_type == 'SCHEDULE_TO_START' and task.started_id is not None:
+            return
+        if timeout_type == 'HEARTBEAT' and beat != task.beats:
+            return  # there was another heartbeat since
+        self._close_activity(task, 'ActivityTaskTimedOut',
+                             timeoutType=timeout_type,
+                             startedEventId=task.started_id,
+                             details=task.details)
+
+    def _timer_fired(self, ex, timer_id, started_id):
+        if ex.timers.get(timer_id) != started_id:
+            return  # canceled or closed
+        del ex.timers[timer_id]
+        self._event(ex, 'TimerFired', timerId=timer_id,
+                    startedEventId=started_id)
+        self._schedule_decision(ex)
+
+    def _workflow_timed_out(self, ex):
+        if ex.open:
+            self._close(ex, 'TIMED_OUT', 'WorkflowExecutionTimedOut',
+                        timeoutType='START_TO_CLOSE',
+                        childPolicy=ex.child_policy)
+
+    def _event(self, ex, e_type, **attrs):
+        event_id = len(ex.events) + 1
+        ex.events.append({'eventId': event_id, 'eventType': e_type,
+                          'eventTimestamp': time.time(),
+                          _attrs_key(e_type): _clean(attrs)})
+        return event_id
+
+    def _queue(self, queues, key, item):
+        queues.setdefault(key, deque()).append(item)
+        self.cond.notify_all()
+
+    def _wait(self, queues, key, ready):
+        """Pop the first ready item from a queue, waiting for one if needed.
+
+        Returns None if there is nothing after the poll timeout.
+        """
+        end = time.time() + self.poll_timeout * self.time_scale
+        while 1:
+            self._expire()
+            queue = queues.get(key)
+            while queue:
+                item = queue.popleft()
+                if ready(item):
+                    return item
+            wait = self._wait_time(end)
+            if wait <= 0:
+                return None
+            self.cond.wait(wait)
+
+    def _count(self, queues, key, ready):
+        self._expire()
+        count = sum(1 for item in queues.get(key, ()) if ready(item))
+        return {'count': count, 'truncated': False}
+
+    def _wait_time(self, end):
+        """How long to wait for a notification or the next deadline."""
+        now = time.time()
+        wait = None if end is None else end - now
+        if self.deadlines:
+            until_deadline = max(self.deadlines[0][0] - now, 0.001)
+            wait = until_deadline if wait is None else min(wait,
+                                                           until_deadline)
+        return wait
+
+    def _at(self, duration, callback, *args):
+        """Call callback after an SWF duration, unless it's NONE/unset."""
+        if duration is None or str(duration).upper() == 'NONE':
+            return
+        at = time.time() + int(duration) * self.time_scale
+        heapq.heappush(self.deadlines, (at, next(self.seq), callback, args))
+
+    def _expire(self):
+        now = time.time()
+        while self.deadlines and self.deadlines[0][0] <= now:
+            _, _, callback, args = heapq.heappop(self.deadlines)
+            callback(*args)
+
+    def _task(self, token, cls, operation):
+        task = self.tokens.get(token)
+        if not isinstance(task, cls):
+            raise _fault('UnknownResourceFault', 'Unknown task token.',
+                         operation)
+        return task
+
+    def _decision_page(self, ex, token, offset, page_size, reverse):
+        page = self._page(self.decision_events[token], offset, page_size,
+                          reverse)
+        if 'nextPageToken' in page:
+            page['nextPageToken'] = '%s:%s' % (token, page['nextPageToken'])
+        page.update({
+            'taskToken': token,
+            'startedEventId': ex.decision_started_id,
+            'previousStartedEventId': ex.previous_started_id,
+            'workflowExecution': ex.execution(),
+            'workflowType': ex.workflow_type,
+        })
+        return page
+
+    def _page(self, events, offset, page_size, reverse):
+        page_size = min(page_size or self.page_size, self.page_size)
+        offset = int(offset or 0)
+        if reverse:
+            events = events[::-1]
+        page = {'events': events[offset:offset + page_size]}
+        if offset + page_size < len(events):
+            page['nextPageToken'] = str(offset + page_size)
+        return page
+
+
+def _new_id():
+    # Not uuid4, the tests are patching it to get predictable ids
+    return uuid.UUID(bytes=os.urandom(16)).hex
+
+
+def _decision_ready(ex):
+    return (ex.open and ex.decision_scheduled_id is not None
+            and ex.decision_started_id is None)
+
+
+def _activity_ready(task):
+    return not task.closed
+
+
+def _attrs_key(e_type, suffix='EventAttributes'):
+    return e_type[0].lower() + e_type[1:] + suffix
+
+
+def _clean(d):
+    return dict((k, v) for k, v in d.items() if v is not None)
+
+
+def _fault(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}},
+                       operation)
+
+
+_CLOSE_DECISIONS = frozenset([
+    'CompleteWorkflowExecution', 'FailWorkflowExecution',
+    'CancelWorkflowExecution', 'ContinueAsNewWorkflowExecution'])
+
+# close status -> (parent event type, {parent attribute: child attribute})
+_PARENT_EVENTS = {
+    'COMPLETED': ('ChildWorkflowExecutionCompleted', {'result': 'result'}),
+    'FAILED': ('ChildWorkflowExecutionFailed',
+               {'reason': 'reason', 'details': 'details'}),
+    'CANCELED': ('ChildWorkflowExecutionCanceled', {'details': 'details'}),
+    'TIMED_OUT': ('ChildWorkflowExecutionTimedOut',
+                  {'timeoutType': 'timeoutType'}),
+    'TERMINATED': ('ChildWorkflowExecutionTerminated', {}),
+}
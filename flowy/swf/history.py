@@ -1,4 +1,7 @@
-from flowy.swf.decision import task_key, timer_key
+import json
+
+
+LOCAL_ACTIVITY_MARKER = 'flowy-local-activity'
 
 
 class SWFExecutionHistory(object):
@@ -36,6 +39,11 @@ class SWFExecutionHistory(object):
     def is_timer_running(self, call_key):
         return timer_key(call_key) in self.running
 
+    def add_local_outcome(self, details):
+        """Add the outcome of a local activity attempt that just ran."""
+        add_local_outcome(details, self.timedout, self.results, self.errors,
+                          self.order_)
+
 
 class SWFTaskExecutionHistory(object):
     def __init__(self, exec_history, identity):
@@ -55,3 +63,40 @@ class SWFTaskExecutionHistory(object):
 
         setattr(self, fname, clos)  # cache it
         return clos
+
+
+def local_outcome(call_key, result=None, error=None, retried=False):
+    """The marker details recording a local activity attempt.
+
+    An attempt has a result, an error or neither, for a timeout. A failed
+    attempt with retries left is retried, like a timeout.
+    """
+    details = {'id': str(call_key)}
+    if result is not None:
+        details['result'] = result
+    elif error is not None:
+        details['error'] = str(error)
+        if retried:
+            details['retried'] = True
+    return json.dumps(details, sort_keys=True)
+
+
+def add_local_outcome(details, timedout, results, errors, order):
+    """Load the outcome recorded by local_outcome in the event collections."""
+    outcome = json.loads(details)
+    call_key = outcome['id']
+    if 'result' in outcome:
+        results[call_key] = outcome['result']
+    elif 'error' in outcome and not outcome.get('retried'):
+        errors[call_key] = outcome['error']
+    else:
+        timedout.add(call_key)
+    order.append(call_key)
+
+
+def timer_key(call_key):
+    return '%s:t' % call_key
+
+
+def task_key(identity, call_number, retry_number):
+    return '%s-%s-%s' % (identity, call_number, retry_number)
@@ -1,4 +1,5 @@
 from flowy.swf.decision import SWFActivityTaskDecision
+from flowy.swf.decision import SWFLocalActivityTaskDecision
 from flowy.swf.decision import SWFWorkflowTaskDecision
 from flowy.swf.history import SWFTaskExecutionHistory
 from flowy.proxy import Proxy
@@ -66,3 +67,48 @@ class SWFWorkflowProxyFactory(object):
         task_decision = SWFWorkflowTaskDecision(decision, execution_history, self, rate_limit)
         return Proxy(task_exec_hist, task_decision, self.retry,
                      self.serialize_input, self.deserialize_result)
+
+
+class SWFLocalActivityProxyFactory(object):
+    """A proxy factory for activities that run in the decider.
+
+    The func is called with the serialized input and returns the serialized
+    result, see ActivityConfig.wrap. The timeout is in seconds, None for no
+    timeout. Unlike the activities, the failed attempts are retried too.
+    """
+
+    def __init__(self, identity, func,
+                 timeout=None,
+                 retry=(0, 0, 0),
+                 serialize_input=None,
+                 deserialize_result=None):
+        self.identity = identity
+        self.func = func
+        self.timeout = timeout
+        self.retry = retry
+        self.serialize_input = serialize_input
+        self.deserialize_result = deserialize_result
+
+    def __call__(self, decision, execution_history, rate_limit=None):
+        """Instantiate Proxy."""
+        task_exec_hist = SWFTaskExecutionHistory(execution_history, self.identity)
+        task_decision = SWFLocalActivityTaskDecision(decision, execution_history, self)
+        return SWFLocalActivityProxy(task_exec_hist, task_decision, self.retry,
+                                     self.serialize_input, self.deserialize_result)
+
+
+class SWFLocalActivityProxy(Proxy):
+    """A proxy that runs the attempts as it schedules them.
+
+    An attempt that ran has its outcome in the history already, so the call
+    is evaluated again, until there's a result, an error or a delayed retry.
+    """
+
+    def call(self, args, kwargs, traversed=None):
+        call_number = self.call_number
+        while 1:
+            self.call_number = call_number
+            self.task_decision.ran = False
+            r = super(SWFLocalActivityProxy, self).call(args, kwargs, traversed)
+            if not self.task_decision.ran:
+                return r
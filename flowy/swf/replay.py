@@ -0,0 +1,149 @@
+"""Replay a saved workflow execution history offline.
+
+The history is cut at a decision task start and it goes through the same
+steps a decider does on a decision task: the events are loaded with
+load_events, wrapped in a SWFExecutionHistory and the workflow registered in
+a SWFWorkflowWorker is run over it. The decisions are captured instead of
+being sent to SWF.
+"""
+
+import importlib
+import io
+import pstats
+
+try:
+    import cProfile as profile_module
+except ImportError:  # pragma: no cover
+    import profile as profile_module
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from flowy.swf.decision import SWFWorkflowDecision
+from flowy.swf.history import SWFExecutionHistory
+from flowy.swf.worker import SWFWorkflowWorker
+from flowy.swf.worker import load_events
+
+
+__all__ = ['CapturingDecision', 'decision_events', 'load_worker', 'replay',
+           'profile']
+
+
+class CapturingDecision(SWFWorkflowDecision):
+    """A workflow decision that keeps the decisions instead of sending them.
+
+    After the workflow code runs, the decisions attribute holds the list of
+    decisions in the format expected by RespondDecisionTaskCompleted.
+    """
+
+    def __init__(self, name, version, task_list, decision_duration,
+                 workflow_duration, tags, child_policy):
+        super(CapturingDecision, self).__init__(
+            None, None, name, version, task_list, decision_duration,
+            workflow_duration, tags, child_policy)
+
+    def flush(self):
+        self.closed = True
+
+
+def decision_events(events, upto=None):
+    """Cut the history at the start of a decision task.
+
+    The last decision task started at or before the upto event id is used,
+    the default is the last decision task in the history. All the events
+    after its start are dropped, they were not seen by the decider.
+    """
+    cut = None
+    for index, event in enumerate(events):
+        if upto is not None and event['eventId'] > upto:
+            break
+        if event['eventType'] == 'DecisionTaskStarted':
+            cut = index
+    if cut is None:
+        raise ValueError('No decision task started in the history.')
+    return events[:cut + 1]
+
+
+def load_worker(spec):
+    """Import a module and return the workflow worker it defines.
+
+    The spec can be 'module:attribute', naming a SWFWorkflowWorker instance,
+    or just 'module', in which case the module is scanned for the workflows
+    registered with the config decorators.
+    """
+    module_name, _, attribute = spec.partition(':')
+    module = importlib.import_module(module_name)
+    if attribute:
+        worker = getattr(module, attribute)
+        if not isinstance(worker, SWFWorkflowWorker):
+            raise ValueError('%r is not a SWFWorkflowWorker.' % spec)
+        return worker
+    worker = SWFWorkflowWorker()
+    worker.scan(package=module)
+    return worker
+
+
+def replay(worker, events, upto=None):
+    """Replay a decision of the history and return the decisions.
+
+    :type worker: :class:`flowy.swf.worker.SWFWorkflowWorker`
+    :param worker: a worker with the workflow registered
+    :param events: the history events, starting with WorkflowExecutionStarted
+    :param upto: the event id used to pick the decision, see
+        :func:`decision_events`
+
+    :rtype: list[dict]
+    :returns: the decisions the workflow would respond with
+    """
+    events = decision_events(events, upto)
+    first_event = events[0]
+    assert first_event['eventType'] == 'WorkflowExecutionStarted'
+    wesea = first_event['workflowExecutionStartedEventAttributes']
+    name = wesea['workflowType']['name']
+    version = wesea['workflowType']['version']
+    if (str(name), str(version)) not in worker.registry:
+        raise ValueError('Workflow %s version %s is not registered.'
+                         % (name, version))
+    running, timedout, results, errors, order = load_events(iter(events[1:]))
+    execution_history = SWFExecutionHistory(running, timedout, results,
+                                            errors, order)
+    decision = CapturingDecision(name, version, wesea['taskList']['name'],
+                                 wesea['taskStartToCloseTimeout'],
+                                 wesea['executionStartToCloseTimeout'],
+                                 wesea.get('tagList'), wesea['childPolicy'])
+    worker(name, version, wesea.get('input'), decision, execution_history)
+    return decision.decisions._data
+
+
+def profile(top, func, *args, **kwargs):
+    """Call func under cProfile and tracemalloc, if available.
+
+    Returns the result and a text report with the top functions by
+    cumulative time and the top lines by allocated memory.
+    """
+    profiler = profile_module.Profile()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    try:
+        result = profiler.runcall(func, *args, **kwargs)
+        if tracemalloc is not None:
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if tracemalloc is not None:
+            tracemalloc.stop()
+    stream = io.StringIO() if str is not bytes else io.BytesIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative').print_stats(top)
+    lines = [stream.getvalue().strip()]
+    if tracemalloc is not None:
+        lines.append('')
+        lines.append('Peak traced memory: %.1f KiB' % (peak / 1024.0))
+        for stat in snapshot.statistics('lineno')[:top]:
+            lines.append(str(stat))
+    return result, '\n'.join(lines)
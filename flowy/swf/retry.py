@@ -0,0 +1,169 @@
+"""Retry the SWF calls with exponential backoff and a circuit breaker.
+
+The errors are split in three classes: throttling, transient (server side
+and connection errors) and the rest, that are not retried. The throttling and
+the transient errors are retried with exponential backoff and full jitter;
+too many of them in a row open the circuit breaker and all the calls using
+the same policy wait until it closes, so that a fleet of workers backs off
+together instead of prolonging the outage.
+"""
+
+import copy
+import functools
+import random
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError
+from botocore.exceptions import ClientError
+
+from flowy.metrics import null_metrics
+from flowy.utils import logger
+
+
+__all__ = ['RetryPolicy', 'RetryingClient', 'CircuitBreaker', 'error_class']
+
+
+THROTTLING_CODES = frozenset([
+    'ThrottlingException', 'Throttling', 'ThrottledException',
+    'RequestLimitExceeded', 'TooManyRequestsException',
+])
+TRANSIENT_CODES = frozenset([
+    'InternalFailure', 'InternalServerError', 'ServiceUnavailable',
+    'ServiceUnavailableException', 'RequestTimeout', 'RequestTimeoutException',
+])
+
+
+def error_class(error):
+    """Classify an error as 'throttling', 'transient' or 'fatal'."""
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        if code in THROTTLING_CODES:
+            return 'throttling'
+        status = error.response.get('ResponseMetadata', {}).get(
+            'HTTPStatusCode') or 0
+        if code in TRANSIENT_CODES or status >= 500:
+            return 'transient'
+        return 'fatal'
+    if isinstance(error, BotoCoreError):  # connection errors, timeouts, ...
+        return 'transient'
+    return 'fatal'
+
+
+class CircuitBreaker(object):
+    """Open after threshold retryable failures in a row, for timeout seconds.
+
+    Any success closes it. It's safe to share between threads.
+    """
+
+    def __init__(self, threshold=10, timeout=30):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self.open_until = 0
+        self.lock = threading.Lock()
+
+    def wait_time(self):
+        """Return how long until the breaker closes, 0 if it's closed."""
+        return max(self.open_until - time.time(), 0)
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+
+    def failure(self):
+        """Record a failure; return True if this opened the breaker."""
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.threshold:
+                return False
+            self.failures = 0
+            self.open_until = time.time() + self.timeout
+            return True
+
+
+class RetryPolicy(object):
+    """Call SWF, retrying the throttling and the transient errors.
+
+    The delay before retry n (counting from 0) is a random value between 0 and
+    min(max_delay, base_delay * 2 ** n), the "full jitter" backoff. A
+    max_attempts of None means retry forever.
+
+    The retries, the backoff time and the breaker openings are reported to
+    metrics, by operation name.
+    """
+
+    def __init__(self, base_delay=0.1, max_delay=20, max_attempts=5,
+                 breaker=None, metrics=None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.breaker = CircuitBreaker() if breaker is None else breaker
+        self.metrics = null_metrics if metrics is None else metrics
+
+    def with_attempts(self, max_attempts):
+        """A copy of this policy with another max_attempts, sharing the
+        breaker and the metrics."""
+        policy = copy.copy(self)
+        policy.max_attempts = max_attempts
+        return policy
+
+    def delay(self, attempt):
+        """The full jitter delay before the retry number attempt."""
+        return random.random() * min(self.max_delay,
+                                     self.base_delay * 2 ** min(attempt, 64))
+
+    def pause(self, op, attempt):
+        """Sleep before the retry number attempt of op."""
+        delay = self.delay(attempt)
+        self.metrics.keyed(op).timing('swf.backoff', delay)
+        time.sleep(delay)
+
+    def call(self, op, func, *args, **kwargs):
+        """Call func with the arguments, retrying the retryable errors.
+
+        The op is the name of the operation, used for logging and metrics.
+        The last error is raised once the attempts are exhausted.
+        """
+        attempt = 0
+        while 1:
+            wait_time = self.breaker.wait_time()
+            if wait_time:
+                self.metrics.keyed(op).timing('swf.breaker_wait', wait_time)
+                time.sleep(wait_time)
+            try:
+                result = func(*args, **kwargs)
+            except (ClientError, BotoCoreError) as e:
+                kind = error_class(e)
+                if kind == 'fatal':
+                    raise
+                self.metrics.keyed(op, kind).incr('swf.retries')
+                if self.breaker.failure():
+                    logger.warning('Too many SWF errors, backing off for %ss.',
+                                   self.breaker.timeout)
+                    self.metrics.keyed(op).incr('swf.breaker_opened')
+                attempt += 1
+                if self.max_attempts is not None and attempt >= self.max_attempts:
+                    raise
+                logger.warning('Retrying %s after error: %s', op, e)
+                self.pause(op, attempt - 1)
+            else:
+                self.breaker.success()
+                return result
+
+
+class RetryingClient(object):
+    """Make all the method calls of client through the retry policy.
+
+    The operation names are derived from the method names, so
+    register_activity_type is reported as RegisterActivityType.
+    """
+
+    def __init__(self, client, policy):
+        self.client = client
+        self.policy = policy
+
+    def __getattr__(self, name):
+        op = ''.join(part.capitalize() for part in name.split('_'))
+        return functools.partial(self.policy.call, op,
+                                 getattr(self.client, name))
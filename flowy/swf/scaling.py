@@ -0,0 +1,41 @@
+"""Scale the worker threads with the task list backlog.
+
+Every few seconds the worker counts the pending tasks in its task lists, with
+CountPendingActivityTasks or CountPendingDecisionTasks, and sets the number of
+threads, each polling and running tasks, to the busy threads plus the
+backlog, between a minimum and a maximum. It scales up at once and down by
+half of the difference at a time, so a short lull doesn't drop the threads.
+
+The threads over the target stop before their next poll, a poll in progress
+is never interrupted. Fewer idle threads means fewer long polls.
+
+    worker.run_forever(domain, task_list, concurrency=(1, 32))
+"""
+
+import threading
+
+
+__all__ = ['AdaptiveConcurrency']
+
+
+class AdaptiveConcurrency(object):
+    """The number of threads wanted for a backlog, between the bounds."""
+
+    def __init__(self, minimum, maximum):
+        if not 0 <= minimum <= maximum or maximum < 1:
+            raise ValueError('Invalid concurrency bounds: %r, %r'
+                             % (minimum, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = minimum
+        self.lock = threading.Lock()
+
+    def update(self, pending, busy):
+        """Set and return the target for pending tasks and busy threads."""
+        wanted = min(max(busy + pending, self.minimum), self.maximum)
+        with self.lock:
+            if wanted >= self.target:
+                self.target = wanted
+            else:
+                self.target = max(wanted, (self.target + wanted) // 2)
+            return self.target
@@ -1,12 +1,30 @@
+from botocore.client import Config
 from botocore.exceptions import ClientError
+import collections
+import itertools
+import threading
 import uuid
 
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
 from flowy.swf.client import SWFClient
 from flowy.swf.decision import INPUT_SIZE
+from flowy.swf.retry import RetryPolicy
 from flowy.utils import logger
 from flowy.proxy import Proxy
 
 
+__all__ = ['SWFWorkflowStarter', 'StartResult']
+
+
+DEFAULT_POOL_SIZE = 10  # botocore's default max_pool_connections
+
+StartResult = collections.namedtuple('StartResult',
+                                     'index wid run_id error')
+
+
 def SWFWorkflowStarter(domain, name, version,
                        swf_client=None,
                        task_list=None,
@@ -17,19 +35,38 @@ def SWFWorkflowStarter(domain, name, version,
                        serialize_input=None,
                        child_policy=None,
                        priority=None,
-                       lambda_role=None):
+                       lambda_role=None,
+                       retry=None):
     """Prepare to start a new workflow, returns a callable.
 
     The callable should be called only with the input arguments and will
-    start the workflow.
+    start the workflow. Its start_many attribute starts many workflows
+    concurrently, see below.
+
+    The start is retried on throttling and transient errors using the retry
+    policy, see flowy.swf.retry. A transient error can hide a successful
+    start; the retry then fails with WorkflowExecutionAlreadyStartedFault.
+
+    If no swf_client is set, a default client is created on the first start
+    and reused for all the others; start_many replaces it with a client with
+    a larger connection pool if needed.
     """
+    if retry is None:
+        retry = RetryPolicy()
+    clients = []  # the (pool size, client) in use
+    client_lock = threading.Lock()
 
-    def really_start(*args, **kwargs):
-        """Use this function to start a workflow by passing in the args."""
-        swf = swf_client if swf_client is not None else SWFClient()
-        l_wid = wid  # closure hack
-        if l_wid is None:
-            l_wid = uuid.uuid4()
+    def default_client(max_pool_connections=None):
+        """Return the default client, rebuilt if it needs a larger pool."""
+        pool_size = max(max_pool_connections or 0, DEFAULT_POOL_SIZE)
+        with client_lock:
+            if not clients or clients[0][0] < pool_size:
+                config = Config(connect_timeout=70, read_timeout=70,
+                                max_pool_connections=pool_size)
+                clients[:] = [(pool_size, SWFClient(config=config))]
+            return clients[0][1]
+
+    def start(swf, l_wid, args, kwargs):
         if serialize_input is None:
             input_data = Proxy.serialize_input(*args, **kwargs)
         else:
@@ -39,7 +76,8 @@ def SWFWorkflowStarter(domain, name, version,
                 "Input too large: %s/%s" % (len(input_data), INPUT_SIZE))
             raise ValueError('Input too large.')
         try:
-            r = swf.start_workflow_execution(
+            r = retry.call(
+                'StartWorkflowExecution', swf.start_workflow_execution,
                 domain, l_wid, name, version, input=input_data,
                 priority=priority, task_list=task_list,
                 execution_start_to_close_timeout=task_duration,
@@ -51,4 +89,58 @@ def SWFWorkflowStarter(domain, name, version,
 
         return r['runId']
 
+    def really_start(*args, **kwargs):
+        """Use this function to start a workflow by passing in the args."""
+        swf = swf_client if swf_client is not None else default_client()
+        l_wid = wid  # closure hack
+        if l_wid is None:
+            l_wid = uuid.uuid4()
+        return start(swf, l_wid, args, kwargs)
+
+    def start_many(inputs, concurrency=16):
+        """Start a workflow for each [args, kwargs] pair in inputs.
+
+        The workflows are started by a pool of concurrency threads sharing the
+        same client; the default client gets a connection pool of the same
+        size. The inputs are consumed lazily, so they can be a stream.
+
+        Generates a StartResult(index, wid, run_id, error) for each input, in
+        the order the starts finish. Either the run_id or the error, the
+        exception raised, is None.
+        """
+        if wid is not None:
+            raise ValueError('Cannot start many workflows with the same id.')
+        swf = swf_client
+        if swf is None:
+            swf = default_client(max_pool_connections=concurrency)
+        return _start_many(start, swf, inputs, concurrency)
+
+    really_start.start_many = start_many
     return really_start
+
+
+def _start_many(start, swf, inputs, concurrency):
+
+    def start_one(index, args, kwargs):
+        wid = str(uuid.uuid4())
+        try:
+            run_id = start(swf, wid, args, kwargs)
+        except Exception as e:
+            return StartResult(index, wid, None, e)
+        return StartResult(index, wid, run_id, None)
+
+    inputs = iter(inputs)
+    counter = itertools.count()
+    pending = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while 1:
+            # Keep the pool busy without reading all the inputs
+            for args, kwargs in itertools.islice(
+                    inputs, 2 * concurrency - len(pending)):
+                pending.add(executor.submit(
+                    start_one, next(counter), args, kwargs))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,179 @@
+"""Run a SWF worker in pre-forked processes.
+
+The supervisor process imports and scans the code once, registers the types
+remotely and forks the children, that share the loaded code copy-on-write.
+Each child runs the worker loop with its own SWF client.
+
+A child that crashes is replaced. A child can also retire itself after
+max_tasks tasks or once its RSS grows over max_rss bytes, to contain the
+leaks in the task code; it's replaced too.
+
+On SIGTERM or SIGINT the supervisor stops replacing children and asks them to
+stop. A child finishes its current tasks and polls, runs the tasks the polls
+return, and exits.
+"""
+
+import gc
+import itertools
+import os
+import signal
+import sys
+import threading
+import time
+
+from flowy.swf.client import SWFClient
+from flowy.utils import logger
+
+
+__all__ = ['Supervisor', 'current_rss']
+
+
+def current_rss():
+    """The resident set size of this process, in bytes.
+
+    Without /proc, on OS X for example, this is the peak resident set size:
+    it never goes down, so a child is recycled after each task once its peak
+    went over max_rss. Set max_rss with that in mind there.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            return peak  # in bytes on OS X
+        return peak * 1024  # in KB on Linux and the BSDs
+
+
+class Supervisor(object):
+    """Run worker.run_forever(domain, task_list) in forked child processes.
+
+    The worker must be ready to run, with its tasks registered. The children
+    create their SWF clients with client_factory, boto clients can't be
+    shared between processes. The task_list and concurrency are passed to
+    run_forever.
+    """
+
+    crash_delay = 1  # seconds to wait before replacing a child that crashed
+
+    def __init__(self, worker, domain, task_list, processes=1, max_tasks=None,
+                 max_rss=None, client_factory=SWFClient, identity=None,
+                 concurrency=1):
+        self.worker = worker
+        self.domain = domain
+        self.task_list = task_list
+        self.processes = processes
+        self.max_tasks = max_tasks
+        self.max_rss = max_rss
+        self.client_factory = client_factory
+        self.identity = identity
+        self.concurrency = concurrency
+        self.children = {}  # pid -> start time
+        self.stopping = False
+
+    def run(self):
+        """Fork the children and replace them until stopped.
+
+        Returns after all the children exited. The signal handlers are only
+        installed when running in the main thread; otherwise use stop.
+        """
+        if threading.current_thread().name == 'MainThread':
+            signal.signal(signal.SIGTERM, self._on_signal)
+            signal.signal(signal.SIGINT, self._on_signal)
+        if hasattr(gc, 'freeze'):
+            # Keep the gc from touching, and copying, the shared objects
+            gc.collect()
+            gc.freeze()
+        try:
+            self._supervise()
+        finally:
+            if hasattr(gc, 'unfreeze'):
+                gc.unfreeze()
+
+    def _supervise(self):
+        while self.children or not self.stopping:
+            while not self.stopping and len(self.children) < self.processes:
+                self._fork()
+            try:
+                pid, status = os.wait()
+            except OSError:  # EINTR on Python 2
+                continue
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            if os.WIFSIGNALED(status) or os.WEXITSTATUS(status) != 0:
+                logger.error('Worker %s crashed with status %s.', pid, status)
+                if (not self.stopping
+                        and time.time() - started < self.crash_delay):
+                    time.sleep(self.crash_delay)
+            else:
+                logger.info('Worker %s exited.', pid)
+
+    def stop(self):
+        """Stop replacing the children and ask them to stop."""
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:  # already gone
+                pass
+
+    def _on_signal(self, signum, frame):
+        logger.info('Stopping the workers.')
+        self.stop()
+
+    def _fork(self):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = time.time()
+            if self.stopping:  # stopped while forking
+                os.kill(pid, signal.SIGTERM)
+            return
+        status = 1
+        try:
+            status = self._child()
+        except BaseException:
+            logger.exception('Worker crashed:')
+        finally:
+            os._exit(status)  # never run the supervisor code after a fork
+
+    def _child(self):
+        stopped = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopped.append(1))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor stops us
+        tasks = itertools.count()
+        done = [0]
+
+        def counted(wrapped_func):
+            def wrapper(*args, **kwargs):
+                try:
+                    return wrapped_func(*args, **kwargs)
+                finally:
+                    done[0] = next(tasks) + 1
+
+            wrapper.takes_metrics = getattr(wrapped_func, 'takes_metrics',
+                                            False)
+            return wrapper
+
+        def break_loop():  # checked between tasks and after empty polls
+            if stopped:
+                return True
+            if self.max_tasks is not None and done[0] >= self.max_tasks:
+                logger.info('Recycling the worker after %s tasks.', done[0])
+                return True
+            rss = current_rss()
+            if self.max_rss is not None and rss > self.max_rss:
+                logger.info('Recycling the worker using %s bytes.', rss)
+                return True
+            return False
+
+        for key, wrapped_func in self.worker.registry.items():
+            self.worker.registry[key] = counted(wrapped_func)
+        self.worker.break_loop = break_loop
+        self.worker.run_forever(self.domain, self.task_list,
+                                swf_client=self.client_factory(),
+                                setup_log=False, register_remote=False,
+                                identity=self.identity,
+                                concurrency=self.concurrency)
+        return 0
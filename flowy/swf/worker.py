@@ -1,13 +1,27 @@
+import functools
+import json
 import os
 import socket
+import threading
+import time
 
 import venusian
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError
 from botocore.exceptions import ClientError
 
+from flowy.metrics import null_metrics
+from flowy.swf.analysis import event_time
 from flowy.swf.client import SWFClient, IDENTITY_SIZE
 from flowy.swf.decision import SWFActivityDecision
 from flowy.swf.decision import SWFWorkflowDecision
+from flowy.swf.history import add_local_outcome
+from flowy.swf.history import LOCAL_ACTIVITY_MARKER
 from flowy.swf.history import SWFExecutionHistory
+from flowy.swf.retry import RetryingClient
+from flowy.swf.retry import RetryPolicy
+from flowy.swf.scaling import AdaptiveConcurrency
+from flowy.swf.tasklist import TaskLists
 from flowy.utils import logger
 from flowy.utils import setup_default_logger
 from flowy.worker import Worker
@@ -16,9 +30,30 @@ from flowy.worker import Worker
 __all__ = ['SWFWorkflowWorker', 'SWFActivityWorker']
 
 
+# Retries of a poll before the error reaches the polling loop, that backs
+# off and checks if it should keep polling.
+POLL_ATTEMPTS = 3
+
+
 class SWFWorker(Worker):
-    def __init__(self):
-        super(SWFWorker, self).__init__()
+    scale_interval = 10  # seconds between the adaptive concurrency updates
+
+    def __init__(self, metrics=None, retry=None, registration_cache=None,
+                 registration_concurrency=10):
+        """Initialize the worker.
+
+        The retry policy, see flowy.swf.retry, is used for all the SWF calls
+        made while polling and responding.
+
+        The registration_cache and registration_concurrency are used by
+        register_remote, see below.
+        """
+        super(SWFWorker, self).__init__(metrics)
+        if retry is None:
+            retry = RetryPolicy(metrics=self.metrics)
+        self.retry = retry
+        self.registration_cache = registration_cache
+        self.registration_concurrency = registration_concurrency
         self.remote_reg_callbacks = []
 
     def __call__(self, name, version, input_data, decision, *extra_args):
@@ -26,14 +61,124 @@ class SWFWorker(Worker):
             (str(name), str(version)), input_data, decision, *extra_args)
 
     def register_remote(self, swf_client, domain):
-        """Register or check compatibility of all configs in Amazon SWF."""
-        for remote_reg_callback in self.remote_reg_callbacks:
-            # Raises if there are registration problems
-            remote_reg_callback(swf_client, domain)
+        """Register or check compatibility of all configs in Amazon SWF.
+
+        The registrations run concurrently, in registration_concurrency
+        threads; the default client has a pool of 10 connections. The calls
+        are retried on throttling using the worker retry policy.
+
+        If registration_cache is set to a file path, the configs that were
+        already verified in the domain with the same name, version and
+        defaults are skipped; the ones verified now are added to the file.
+
+        After all the registrations finish, the first error is raised, if any.
+        """
+        verified = load_registration_cache(self.registration_cache)
+        callbacks = []
+        for callback in self.remote_reg_callbacks:
+            cache_key = getattr(callback, 'cache_key', None)
+            key = cache_key(domain) if cache_key is not None else None
+            if key is None or key not in verified:
+                callbacks.append((callback, key))
+        logger.info('Registering %s types remotely, %s already verified.',
+                    len(callbacks), len(self.remote_reg_callbacks) - len(callbacks))
+        client = RetryingClient(swf_client, self.retry)
+        with ThreadPoolExecutor(
+                max_workers=max(self.registration_concurrency, 1)) as executor:
+            futures = [(executor.submit(callback, client, domain), key)
+                       for callback, key in callbacks]
+        errors = []
+        for future, key in futures:
+            error = future.exception()
+            if error is not None:
+                errors.append(error)
+            elif key is not None:
+                verified.add(key)
+        if self.registration_cache is not None and callbacks:
+            save_registration_cache(self.registration_cache, verified)
+        if errors:
+            raise errors[0]  # Raises if there are registration problems
 
     def register(self, config, func, version, name=None):
         super(SWFWorker, self).register(config, func, (name, version))
 
+    def run_loops(self, loop, concurrency=1, task_lists=None,
+                  count_pending=None):
+        """Run the worker loop in concurrency threads, or in this thread if
+        it's 1, and wait for them to finish.
+
+        The loop is called with a function returning False when the thread
+        should stop polling; it's checked between the tasks and after the
+        empty polls.
+
+        The concurrency can also be a (minimum, maximum) pair; the number of
+        threads is then adjusted every scale_interval seconds to the backlog
+        returned by count_pending, see flowy.swf.scaling.
+        """
+        if isinstance(concurrency, (tuple, list)):
+            return self._run_adaptive(loop, concurrency, task_lists,
+                                      count_pending)
+        if concurrency == 1:
+            return loop(lambda: True)
+        threads = [self._start_thread(loop, lambda: True, i)
+                   for i in range(concurrency)]
+        _join(threads)
+
+    def _run_adaptive(self, loop, bounds, task_lists, count_pending):
+        scaler = AdaptiveConcurrency(*bounds)
+        stopped = threading.Event()
+        threads = {}  # slot -> thread
+
+        def slot_loop(slot):
+            scaled_down = []
+
+            def keep_polling():
+                if stopped.is_set():
+                    return False
+                if slot >= scaler.target:
+                    scaled_down.append(slot)
+                    return False
+                return True
+
+            loop(keep_polling)
+            if not scaled_down:  # break_loop, an error or stopped
+                stopped.set()
+
+        try:
+            while not stopped.is_set() and not self.break_loop():
+                alive = [t for t in threads.values() if t.is_alive()]
+                try:
+                    pending = count_pending()
+                except (ClientError, BotoCoreError):
+                    logger.exception('Error while counting the pending tasks:')
+                else:
+                    busy = max(len(alive) - task_lists.polling_count(), 0)
+                    target = scaler.update(pending, busy)
+                    self.metrics.histogram(self.metrics_prefix + '.pending',
+                                           pending)
+                    self.metrics.histogram(self.metrics_prefix + '.threads',
+                                           target)
+                for slot in range(scaler.target):
+                    if slot not in threads or not threads[slot].is_alive():
+                        threads[slot] = self._start_thread(slot_loop, slot,
+                                                           slot)
+                stopped.wait(self.scale_interval)
+        except KeyboardInterrupt:
+            stopped.set()
+            return
+        _join(threads.values())
+
+    def _start_thread(self, target, arg, i):
+        thread = threading.Thread(target=target, args=(arg, ),
+                                  name='flowy-worker-%s' % i)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def count_pending(self, swf_client, domain, task_lists):
+        """Count the pending tasks in all the task lists."""
+        raise NotImplementedError
+
     def add_remote_reg_callback(self, callback):
         self.remote_reg_callbacks.append(callback)
 
@@ -45,6 +190,7 @@ class SWFWorker(Worker):
 
 class SWFWorkflowWorker(SWFWorker):
     categories = ['swf_workflow']
+    metrics_prefix = 'workflow'
 
     # Be explicit about what arguments are expected
     def __call__(self, name, version, input_data, decision, execution_history):
@@ -56,16 +202,32 @@ class SWFWorkflowWorker(SWFWorker):
         """Used to exit the loop in tests. Return True to break."""
         return False
 
+    def count_pending(self, swf_client, domain, task_lists):
+        """Count the pending decisions in all the task lists."""
+        return sum(self.retry.call(
+            'CountPendingDecisionTasks', swf_client.count_pending_decision_tasks,
+            domain, name)['count'] for name in task_lists.names)
+
     def run_forever(self, domain, task_list,
                     swf_client=None,
                     setup_log=True,
                     register_remote=True,
-                    identity=None):
-        """Starts an endless single threaded/single process worker loop.
+                    identity=None,
+                    concurrency=1):
+        """Starts an endless worker loop.
 
         The worker polls endlessly for new decisions from the specified domain
         and task list and runs them.
 
+        The task_list can also be a list of task lists, polled in strict
+        priority order, or a dict of task lists and their weights; see
+        flowy.swf.tasklist for how the polls are spread across them.
+
+        The loop runs in concurrency threads, polling and deciding in
+        parallel. By default it's single threaded. With a (minimum, maximum)
+        pair, the number of threads follows the backlog of pending decisions,
+        see flowy.swf.scaling.
+
         If reg_remote is set, all registered workflow are registered remotely.
 
         An identity can be set to track this worker in the SWF console,
@@ -83,19 +245,31 @@ class SWFWorkflowWorker(SWFWorker):
         swf_client = SWFClient() if swf_client is None else swf_client
         if register_remote:
             self.register_remote(swf_client, domain)
-        try:
-            while 1:
-                if self.break_loop():
-                    break
-                name, version, input_data, exec_history, decision = poll_decision(
-                    swf_client, domain, task_list, identity)
-                self(name, version, input_data, decision, exec_history)
-        except KeyboardInterrupt:
-            pass
+        task_lists = TaskLists.from_spec(task_list)
+
+        def loop(keep_polling):
+            def polling():
+                return keep_polling() and not self.break_loop()
+
+            try:
+                while polling():
+                    polled = poll_decision(
+                        swf_client, domain, task_lists, identity, self.metrics,
+                        self.retry, keep_polling=polling)
+                    if polled is None:
+                        break
+                    name, version, input_data, exec_history, decision = polled
+                    self(name, version, input_data, decision, exec_history)
+            except KeyboardInterrupt:
+                pass
+
+        self.run_loops(loop, concurrency, task_lists, functools.partial(
+            self.count_pending, swf_client, domain, task_lists))
 
 
 class SWFActivityWorker(SWFWorker):
     categories = ['swf_activity']
+    metrics_prefix = 'activity'
 
     # Be explicit about what arguments are expected
     def __call__(self, name, version, input_data, decision):
@@ -104,15 +278,26 @@ class SWFActivityWorker(SWFWorker):
             name, version, input_data, decision,    # needed for worker logic
             decision.heartbeat)     # extra_args
 
+    def task_metrics(self, key):
+        """Report the activity metrics by name and version."""
+        return self.metrics.keyed(*key)
+
     def break_loop(self):
         """Used to exit the loop in tests. Return True to break."""
         return False
 
+    def count_pending(self, swf_client, domain, task_lists):
+        """Count the pending activities in all the task lists."""
+        return sum(self.retry.call(
+            'CountPendingActivityTasks', swf_client.count_pending_activity_tasks,
+            domain, name)['count'] for name in task_lists.names)
+
     def run_forever(self, domain, task_list,
                     swf_client=None,
                     setup_log=True,
                     register_remote=True,
-                    identity=None):
+                    identity=None,
+                    concurrency=1):
         """Same as SWFWorkflowWorker.run_forever but for activities."""
         if setup_log:
             setup_default_logger()
@@ -120,24 +305,59 @@ class SWFActivityWorker(SWFWorker):
         swf_client = SWFClient() if swf_client is None else swf_client
         if register_remote:
             self.register_remote(swf_client, domain)
-        try:
-            while 1:
-                if self.break_loop():
-                    break
-                swf_response = {}
-                while not swf_response.get('taskToken'):
-                    try:
-                        swf_response = swf_client.poll_for_activity_task(
-                            domain, task_list, identity=identity)
-                    except ClientError:
-                        # add a delay before retrying?
-                        logger.exception('Error while polling for activities:')
-
-                at = swf_response['activityType']
-                decision = SWFActivityDecision(swf_client, swf_response['taskToken'])
-                self(at['name'], at['version'], swf_response['input'], decision)
-        except KeyboardInterrupt:
-            pass
+        task_lists = TaskLists.from_spec(task_list)
+
+        def loop(keep_polling):
+            def polling():
+                return keep_polling() and not self.break_loop()
+
+            try:
+                while polling():
+                    with self.metrics.timer('activity.poll'):
+                        swf_response = poll_activity_task(
+                            swf_client, domain, task_lists, identity,
+                            self.metrics, self.retry, keep_polling=polling)
+                    if swf_response is None:
+                        break
+                    at = swf_response['activityType']
+                    decision = SWFActivityDecision(
+                        swf_client, swf_response['taskToken'],
+                        self.task_metrics((at['name'], at['version'])),
+                        self.retry)
+                    self(at['name'], at['version'], swf_response['input'],
+                         decision)
+            except KeyboardInterrupt:
+                pass
+
+        self.run_loops(loop, concurrency, task_lists, functools.partial(
+            self.count_pending, swf_client, domain, task_lists))
+
+
+def _join(threads):
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(1)  # a timeout, to get KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+
+
+def load_registration_cache(path):
+    """Return the set of verified registration keys cached in path."""
+    if path is None:
+        return set()
+    try:
+        with open(path) as f:
+            return set(tuple(key) for key in json.load(f))
+    except (IOError, OSError, ValueError, TypeError):
+        return set()
+
+
+def save_registration_cache(path, keys):
+    tmp_path = '%s.%s.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(sorted(keys), f, indent=1)
+    os.rename(tmp_path, path)  # readers never see a partial file
 
 
 def default_identity():
@@ -146,22 +366,51 @@ def default_identity():
     return identity[-IDENTITY_SIZE:]    # keep the most important part
 
 
-def poll_decision(swf_client, domain, task_list, identity=None):
+def poll_decision(swf_client, domain, task_list, identity=None, metrics=None,
+                  retry=None, keep_polling=None):
     """Poll a decision and create a SWFWorkflowContext structure.
 
+    The time spent in each phase is reported to metrics: the long poll for
+    the first page, the other pages and loading the events. The history size
+    is reported too, and so is the time the activities that started since the
+    previous decision waited in their task lists.
+
     :type swf_client: :class:`SWFClient`
     :param swf_client: an implementation or duck typing of :class:`SWFClient`
     :param domain: the domain containing the task list to poll
     :param task_list: the task list from which to poll decision
     :param identity: an identity str of the request maker
+    :type metrics: :class:`flowy.metrics.Metrics`
+    :param metrics: the metrics sink, by default nothing is reported
+    :type retry: :class:`flowy.swf.retry.RetryPolicy`
+    :param retry: the retry policy for the SWF calls
+    :param keep_polling: see :func:`poll_first_page`
 
     :rtype: tuple
     :returns: a tuple consisting of (name, version, input_data,
-        :class:'SWFExecutionHistory', :class:`SWFWorkflowDecision`)
+        :class:'SWFExecutionHistory', :class:`SWFWorkflowDecision`), or None
+        if the polling stopped
     """
-    first_page = poll_first_page(swf_client, domain, task_list, identity)
+    metrics = null_metrics if metrics is None else metrics
+    retry = RetryPolicy(metrics=metrics) if retry is None else retry
+    task_lists = TaskLists.from_spec(task_list)
+    with metrics.timer('workflow.poll'):
+        task_list, first_page = _poll_first_page(
+            swf_client, domain, task_lists, identity, metrics, retry,
+            keep_polling)
+    if first_page is None:
+        return None
     token = first_page['taskToken']
-    all_events = events(swf_client, domain, task_list, first_page, identity)
+    if first_page.get('startedEventId'):
+        metrics.histogram('workflow.history_events',
+                          first_page['startedEventId'])
+    pages = metrics.timer('workflow.page')
+    all_events = events(swf_client, domain, task_list, first_page, identity,
+                        pages, retry)
+    if metrics is not null_metrics:
+        all_events = _report_queue_waits(
+            all_events, metrics, first_page.get('previousStartedEventId', 0))
+    started = time.time()
     # Sometimes the first event is on the second page,
     # and the first page is empty
     first_event = next(all_events)
@@ -179,38 +428,118 @@ def poll_decision(swf_client, domain, task_list, identity=None):
         running, timedout, results, errors, order = load_events(all_events)
     except _PaginationError:
         # There's nothing better to do than to retry
-        return poll_decision(swf_client, domain, task_list, identity)
+        metrics.incr('workflow.pagination_errors')
+        return poll_decision(swf_client, domain, task_lists, identity, metrics,
+                             retry, keep_polling)
+    # The pages are timed separately
+    metrics.timing('workflow.load_events',
+                   time.time() - started - pages.elapsed)
+    metrics.histogram('workflow.history_pages', pages.count + 1)
     execution_history = SWFExecutionHistory(running, timedout, results, errors, order)
     decision = SWFWorkflowDecision(swf_client, token, name, version, task_list,
                                    task_duration, workflow_duration, tags,
-                                   child_policy)
+                                   child_policy, metrics, retry)
     return name, version, input_data, execution_history, decision
 
 
-def poll_first_page(swf_client, domain, task_list, identity=None):
+def poll_first_page(swf_client, domain, task_list, identity=None,
+                    metrics=None, retry=None, keep_polling=None):
     """Return the response from loading the first page. In case of errors,
     empty responses or whatnot retry until a valid response.
 
     :type swf_client: :class:`SWFClient`
     :param swf_client: an implementation or duck typing of :class:`SWFClient`
     :param domain: the domain containing the task list to poll
-    :param task_list: the task list from which to poll for events
+    :param task_list: the task list from which to poll for events, or task
+        lists, see :class:`flowy.swf.tasklist.TaskLists`
     :param identity: an identity str of the request maker
+    :type metrics: :class:`flowy.metrics.Metrics`
+    :param metrics: gets the number of empty polls and errors
+    :type retry: :class:`flowy.swf.retry.RetryPolicy`
+    :param retry: the backoff policy used on errors
+    :param keep_polling: if set, it's called after every empty poll; polling
+        stops if it returns False
 
     :rtype: dict[str, str|int|list|dict]
-    :returns: a dict containing workflow information and list of events
+    :returns: a dict containing workflow information and list of events, or
+        None if the polling stopped
     """
+    return _poll_first_page(swf_client, domain, TaskLists.from_spec(task_list),
+                            identity, metrics, retry, keep_polling)[1]
+
+
+def _poll_first_page(swf_client, domain, task_lists, identity=None,
+                     metrics=None, retry=None, keep_polling=None):
+    """Same as poll_first_page, but return the task list polled too."""
+    metrics = null_metrics if metrics is None else metrics
+    retry = RetryPolicy(metrics=metrics) if retry is None else retry
+    poll = retry.with_attempts(POLL_ATTEMPTS)
     swf_response = {}
+    errors = 0
+    empty = None
     while not swf_response.get('taskToken'):
+        task_list = task_lists.acquire(skip=empty)
+        got_task = None
         try:
-            swf_response = swf_client.poll_for_decision_task(domain, task_list,
-                                                             identity=identity)
-        except ClientError:
+            swf_response = poll.call('PollForDecisionTask',
+                                     swf_client.poll_for_decision_task,
+                                     domain, task_list, identity=identity)
+        except (ClientError, BotoCoreError):
             logger.exception('Error while polling for decisions:')
+            metrics.incr('workflow.poll_errors')
+            retry.pause('PollForDecisionTask', errors)
+            errors += 1
+        else:
+            got_task = bool(swf_response.get('taskToken'))
+            if not got_task:
+                metrics.incr('workflow.empty_polls')
+                empty = task_list
+        finally:
+            task_lists.release(task_list, got_task)
+        if not got_task and keep_polling is not None and not keep_polling():
+            return task_list, None
+    return task_list, swf_response
+
+
+def poll_activity_task(swf_client, domain, task_list, identity=None,
+                       metrics=None, retry=None, keep_polling=None):
+    """Poll until an activity task is received and return the response.
+
+    The parameters are the same as for :func:`poll_first_page`.
+    """
+    metrics = null_metrics if metrics is None else metrics
+    retry = RetryPolicy(metrics=metrics) if retry is None else retry
+    task_lists = TaskLists.from_spec(task_list)
+    poll = retry.with_attempts(POLL_ATTEMPTS)
+    swf_response = {}
+    errors = 0
+    empty = None
+    while not swf_response.get('taskToken'):
+        task_list = task_lists.acquire(skip=empty)
+        got_task = None
+        try:
+            swf_response = poll.call('PollForActivityTask',
+                                     swf_client.poll_for_activity_task,
+                                     domain, task_list, identity=identity)
+        except (ClientError, BotoCoreError):
+            logger.exception('Error while polling for activities:')
+            metrics.incr('activity.poll_errors')
+            retry.pause('PollForActivityTask', errors)
+            errors += 1
+        else:
+            got_task = bool(swf_response.get('taskToken'))
+            if not got_task:
+                metrics.incr('activity.empty_polls')
+                empty = task_list
+        finally:
+            task_lists.release(task_list, got_task)
+        if not got_task and keep_polling is not None and not keep_polling():
+            return None
     return swf_response
 
 
-def poll_page(swf_client, domain, task_list, token, identity=None):
+def poll_page(swf_client, domain, task_list, token, identity=None,
+              retry=None):
     """Return a specific page. In case of errors retry a number of times.
 
     :type swf_client: :class:`SWFClient`
@@ -219,23 +548,25 @@ def poll_page(swf_client, domain, task_list, token, identity=None):
     :param task_list: the task list from which to poll for events
     :param token: the token string for the requested page
     :param identity: an identity str of the request maker
+    :type retry: :class:`flowy.swf.retry.RetryPolicy`
+    :param retry: the backoff policy used on errors
 
     :rtype: dict[str, str|int|list|dict]
     :returns: a dict containing workflow information and list of events
     """
-    for _ in range(7):  # give up after a limited number of retries
-        try:
-            swf_response = swf_client.poll_for_decision_task(
-                domain, task_list, identity=identity, next_page_token=token)
-            break
-        except ClientError:
-            logger.exception('Error while polling for decision page:')
-    else:
+    retry = RetryPolicy() if retry is None else retry
+    try:
+        # give up after a limited number of retries
+        return retry.with_attempts(7).call(
+            'PollForDecisionTask', swf_client.poll_for_decision_task,
+            domain, task_list, identity=identity, next_page_token=token)
+    except (ClientError, BotoCoreError):
+        logger.exception('Error while polling for decision page:')
         raise _PaginationError()
-    return swf_response
 
 
-def events(swf_client, domain, task_list, first_page, identity=None):
+def events(swf_client, domain, task_list, first_page, identity=None,
+           timer=None, retry=None):
     """Load pages one by one and generate all events found.
 
     :type swf_client: :class:`SWFClient`
@@ -245,6 +576,10 @@ def events(swf_client, domain, task_list, first_page, identity=None):
     :param first_page: the page dict structure from which to start generating
         the events, usually the response from :func:`poll_first_page`
     :param identity: an identity str of the request maker
+    :type timer: :class:`flowy.metrics.Timer`
+    :param timer: if set, it times loading each page after the first one
+    :type retry: :class:`flowy.swf.retry.RetryPolicy`
+    :param retry: the retry policy used to load the pages
 
     :rtype: collections.Iterator[dict[str, int|str|dict[str, int|str|dict]]
     :returns: iterator over all of the events
@@ -255,8 +590,15 @@ def events(swf_client, domain, task_list, first_page, identity=None):
             yield event
         if not page.get('nextPageToken'):
             break
-        page = poll_page(swf_client, domain, task_list, page['nextPageToken'],
-                         identity=identity)
+        if timer is not None:
+            timer.start()
+        try:
+            page = poll_page(swf_client, domain, task_list,
+                             page['nextPageToken'], identity=identity,
+                             retry=retry)
+        finally:
+            if timer is not None:
+                timer.stop()
 
 
 def load_events(event_iter):
@@ -346,9 +688,34 @@ def load_events(event_iter):
             eid = event['timerFiredEventAttributes']['timerId']
             running.remove(eid)
             results[eid] = None
+        elif e_type == 'MarkerRecorded':
+            mrea = 'markerRecordedEventAttributes'
+            if event[mrea]['markerName'] == LOCAL_ACTIVITY_MARKER:
+                add_local_outcome(event[mrea]['details'], timedout, results,
+                                  errors, order)
     return running, timedout, results, errors, order
 
 
+def _report_queue_waits(event_iter, metrics, since):
+    """Pass the events through, reporting the queue wait of the activities
+    started after the since event id, by name and version."""
+    scheduled = {}
+    for event in event_iter:
+        e_type = event.get('eventType')
+        if 'eventTimestamp' not in event:
+            pass
+        elif e_type == 'ActivityTaskScheduled':
+            at = event['activityTaskScheduledEventAttributes']['activityType']
+            scheduled[event['eventId']] = (
+                event_time(event), at['name'], at['version'])
+        elif e_type == 'ActivityTaskStarted' and event['eventId'] > since:
+            atsea = event['activityTaskStartedEventAttributes']
+            at, name, version = scheduled[atsea['scheduledEventId']]
+            metrics.keyed(name, version).timing('activity.queue_wait',
+                                                event_time(event) - at)
+        yield event
+
+
 class _PaginationError(Exception):
     """Can't retrieve the next page after X retries."""
 
@@ -1,28 +1,44 @@
-import copy
+import itertools
 import tempfile
+import time
 import warnings
 import webbrowser
 
 from flowy.operations import first
 from flowy.proxy import Proxy
 from flowy.result import is_result_proxy
-from flowy.serialization import collect_err_and_results
+from flowy.serialization import collect_dependencies
 from flowy.serialization import traverse_data
+from flowy.utils import chrome_trace
 from flowy.utils import logger
 from flowy.utils import short_repr
 
 
-__all__ = ['TracingProxy', 'ExecutionTracer']
+__all__ = ['TracingProxy', 'ExecutionTracer', 'TraceView']
+
+
+# Render the aggregated graph when displaying more tasks than this
+AGGREGATE_THRESHOLD = 200
+
+# Tracer event types
+SCHEDULE = 'schedule'
+START = 'start'
+FLUSH = 'flush'
+RESULT = 'result'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+DEPENDENCY = 'dependency'
 
 
-# XXX: Trace dependencies even if data structures containing result proxies are used
 class TracingProxy(Proxy):
     """Similar to a BoundProxy but records task dependency.
 
     This works by checking every arguments passed to the proxy for task results
     and records the dependency between this call and the previous ones
-    generating the task results. It also adds some extra information on the
-    task result itself for tracking purposes.
+    generating the task results, including the results nested in lists and
+    dicts. It also adds some extra information on the task result itself for
+    tracking purposes. The arguments are traversed only once, the traversal
+    is shared with the proxy scheduling logic.
 
     This can be used with ExecutionTracer to track the execution dependency and
     display in in different forms for analysis.
@@ -35,10 +51,11 @@ class TracingProxy(Proxy):
 
     def __call__(self, *args, **kwargs):
         node_id = "%s-%s" % (self.trace_name, self.call_number)
-        ((t_args, t_kwargs), (err, results)) = traverse_data(
-            [args, kwargs], f=collect_err_and_results, initial=(None, None)
-        )
-        r = super(TracingProxy, self).__call__(*t_args, **t_kwargs)
+        traversed_args, (err, placeholders, results) = traverse_data(
+            [args, kwargs], f=collect_dependencies,
+            initial=(None, False, None))
+        r = self.call(args, kwargs,
+                      traversed=(traversed_args, (err, placeholders)))
         assert is_result_proxy(r)
         factory = r.__factory__
         factory.node_id = node_id
@@ -53,89 +70,138 @@ class TracingProxy(Proxy):
 
 
 class ExecutionTracer(object):
-    """Record the execution history for display and analysis."""
+    """Record the execution history for display and analysis.
+
+    Everything is recorded as an append-only log of events. A copy shares the
+    log of the original up to the current offset and appends its new events
+    in a log of its own, so it is cheap to make regardless of how much was
+    recorded so far. The recorded graph is rebuilt from the log, or a prefix
+    of it, only when it's needed for display and analysis.
+    """
 
     def __init__(self):
         self.reset()
 
-    def schedule_activity(self, node_id, name):
-        assert node_id not in self.nodes
-        self.nodes[node_id] = name
-        self.current_schedule.append(node_id)
-        self.timeouts[node_id] = 0
-        self.activities.add(node_id)
+    def schedule_activity(self, node_id, name, at=None):
+        self.events.append((SCHEDULE, node_id, name, True, _now(at)))
 
-    def schedule_workflow(self, node_id, name):
-        assert node_id not in self.nodes
-        self.nodes[node_id] = name
-        self.current_schedule.append(node_id)
-        self.timeouts[node_id] = 0
+    def schedule_workflow(self, node_id, name, at=None):
+        self.events.append((SCHEDULE, node_id, name, False, _now(at)))
+
+    def start(self, node_id, at=None):
+        """Record the time a task actually started its execution."""
+        self.events.append((START, node_id, _now(at)))
 
     def flush_scheduled(self):
-        self.levels.append(self.current_schedule)
-        self.current_schedule = []
+        self.events.append((FLUSH, ))
 
-    def result(self, node_id, result):
-        assert node_id in self.nodes
-        assert node_id not in self.levels
-        self.levels.append(node_id)
-        self.results[node_id] = result
+    def result(self, node_id, result, at=None):
+        self.events.append((RESULT, node_id, result, _now(at)))
 
-    def error(self, node_id, reason):
-        assert node_id in self.nodes
-        assert node_id not in self.levels
-        self.levels.append(node_id)
-        self.errors[node_id] = reason
+    def error(self, node_id, reason, at=None):
+        self.events.append((ERROR, node_id, reason, _now(at)))
 
     def timeout(self, node_id):
-        assert node_id in self.nodes
-        assert node_id not in self.results or node_id not in self.errors
-        self.timeouts[node_id] += 1
+        self.events.append((TIMEOUT, node_id))
 
     def add_dependency(self, from_node, to_node):
         """ node_id -> node_id """
-        self.deps.setdefault(from_node, []).append(to_node)
+        self.events.append((DEPENDENCY, from_node, to_node))
 
     def copy(self):
+        """Snapshot the tracer; the copy and the original evolve separately.
+
+        The events recorded so far are not copied, the new tracer only keeps a
+        reference to the log segments and their length at the time of copy.
+        """
         et = ExecutionTracer()
-        et.__dict__ = copy.deepcopy(self.__dict__)
+        et.segments = self.segments + [(self.events, len(self.events))]
         return et
 
     def reset(self):
-        self.levels = []
-        self.current_schedule = []
-        self.timeouts = {}
-        self.results = {}
-        self.errors = {}
-        self.activities = set()
-        self.deps = {}
-        self.nodes = {}
+        # Replace, don't clear, the logs, they may be shared with copies
+        self.segments = []
+        self.events = []
+
+    def __len__(self):
+        return sum(length for _, length in self.segments) + len(self.events)
+
+    def iter_events(self, upto=None):
+        """Iterate over the recorded events, optionally only the first upto."""
+        segments = self.segments + [(self.events, len(self.events))]
+        remaining = len(self) if upto is None else upto
+        for events, length in segments:
+            for event in itertools.islice(events, min(length, remaining)):
+                yield event
+            remaining -= length
+            if remaining <= 0:
+                break
+
+    def view(self, upto=None):
+        """Rebuild the execution graph from the first upto events."""
+        v = TraceView()
+        for event in self.iter_events(upto):
+            v.apply(event)
+        return v
+
+    def __getstate__(self):
+        # Flatten the log when it's sent to other processes
+        return {'segments': [], 'events': list(self.iter_events())}
+
+    def critical_path(self, upto=None):
+        """See TraceView.critical_path."""
+        return self.view(upto).critical_path()
+
+    def slack(self, upto=None):
+        """See TraceView.slack."""
+        return self.view(upto).slack()
+
+    def parallelism(self, upto=None):
+        """See TraceView.parallelism."""
+        return self.view(upto).parallelism()
 
-    def to_dot(self):
-        """Render the dot for the recorded execution."""
+    def summary(self, upto=None, top=10):
+        """See TraceView.summary."""
+        return self.view(upto).summary(top=top)
+
+    def to_dot(self, upto=None, aggregate=False, view=None):
+        """Render the dot for the recorded execution.
+
+        If upto is set, only the first upto events are rendered. If aggregate
+        is set, the sibling calls to the same task are collapsed in a single
+        node, see TraceView.aggregate. Large fan-outs should be aggregated,
+        dot can't lay out thousands of nodes in a reasonable time.
+
+        A view already built can be passed, instead of rebuilding it; upto is
+        ignored then.
+        """
         try:
             import pygraphviz as pgv
         except ImportError:
             warnings.warn('Extra requirements for "trace" are not available.')
             return
         graph = pgv.AGraph(directed=True, strict=False)
+        if view is None:
+            view = self.view(upto)
+        if aggregate:
+            return _aggregated_dot(graph, view)
 
         hanging = set()
-        for node_id, node_name in self.nodes.items():
+        for node_id, node_name in view.nodes.items():
             shape = 'box'
-            if node_id in self.activities:
+            if node_id in view.activities:
                 shape = 'ellipse'
             finish_id = 'finish-%s' % node_id
             color, fontcolor = 'black', 'black'
-            if node_id in self.errors:
+            if node_id in view.errors:
                 color, fontcolor = 'red', 'red'
             graph.add_node(node_id, label=node_name, shape=shape, width=0.8,
                            color=color, fontcolor=fontcolor)
-            if node_id in self.results or node_id in self.errors:
-                if node_id in self.errors:
-                    rlabel = str(self.errors[node_id])
+            if node_id in view.results or node_id in view.errors:
+                if node_id in view.errors:
+                    rlabel = str(view.errors[node_id])
                 else:
-                    rlabel = short_repr.repr(self.results[node_id])
+                    rlabel = short_repr.repr(view.results[node_id])
                     rlabel = ' ' + '\l '.join(rlabel.split('\n'))  # Left align
                 graph.add_node(finish_id, label='', shape='point', width=0.1, color=color)
                 graph.add_edge(node_id, finish_id, arrowhead='none', penwidth=3, fontsize=8,
@@ -143,7 +209,7 @@ class ExecutionTracer(object):
             else:
                 hanging.add(node_id)
 
-        levels = ['l%s' % i for i in range(len(self.levels))]
+        levels = ['l%s' % i for i in range(len(view.levels))]
         for l in levels:
             graph.add_node(l, shape='point', label='', width=0.1, style='invis')
         if levels:
@@ -152,21 +218,21 @@ class ExecutionTracer(object):
                 graph.add_edge(start, l, style='invis')
                 start = l
 
-        for l_id, l in zip(levels, self.levels):
+        for l_id, l in zip(levels, view.levels):
             if isinstance(l, list):
                 graph.add_subgraph([l_id] + l, rank='same')
             else:
                 graph.add_subgraph([l_id, 'finish-%s' % l], rank='same')
 
-        for from_node, to_nodes in self.deps.items():
+        for from_node, to_nodes in view.deps.items():
             if from_node in hanging:
                 hanging.remove(from_node)
             color = 'black'
             style = ''
-            if from_node in self.errors:
+            if from_node in view.errors:
                 color = 'red'
                 from_node = 'finish-%s' % from_node
-            elif from_node in self.results:
+            elif from_node in view.results:
                 from_node = 'finish-%s' % from_node
             else:
                 style = 'dotted'
@@ -181,20 +247,317 @@ class ExecutionTracer(object):
             # l_id is the last level here
             graph.add_subgraph([l_id] + ['finish-%s' % h for h in hanging], rank='same')
 
-        for node_id in self.nodes:
-            retries = self.timeouts[node_id]
+        for node_id in view.nodes:
+            retries = view.timeouts[node_id]
             if retries:
                 graph.add_edge(node_id, node_id, label=' %s' % retries, color='orange',
                                fontcolor='orange', fontsize=8)
 
         return graph
 
-    def display(self):
-        """Create a temp file and render the dot in it."""
-        graph = self.to_dot()
+    def to_chrome_trace(self, upto=None):
+        """Export the recorded execution in the Trace Event Format.
+
+        Returns a JSON serializable dict that can be loaded in Perfetto or
+        chrome://tracing. Each task is a span from its start to its finish
+        time, the tasks that didn't finish end with the trace.
+        """
+        view = self.view(upto)
+        times = list(view.scheduled_at.values()) + list(view.finished_at.values())
+        end = max(times) if times else 0
+        spans = []
+        for node_id, name in view.nodes.items():
+            start = view.start_time(node_id)
+            args = {'id': node_id,
+                    'queued': start - view.scheduled_at[node_id]}
+            if node_id in view.errors:
+                args['error'] = str(view.errors[node_id])
+            elif node_id in view.results:
+                args['result'] = short_repr.repr(view.results[node_id])
+            else:
+                args['unfinished'] = True
+            category = 'activity' if node_id in view.activities else 'workflow'
+            spans.append((name, category, start,
+                          view.finished_at.get(node_id, end), args))
+        return chrome_trace(spans)
+
+    def display(self, aggregate=None):
+        """Log the timing summary, create a temp file and render the dot in it.
+
+        By default, the rendering is aggregated if there are more than
+        AGGREGATE_THRESHOLD tasks.
+        """
+        view = self.view()  # a pass over all the events, do it once
+        logger.info('Workflow execution timings:\n%s', view.summary())
+        if aggregate is None:
+            aggregate = len(view.nodes) > AGGREGATE_THRESHOLD
+        graph = self.to_dot(aggregate=aggregate, view=view)
         if not graph:
             return
         tf = tempfile.NamedTemporaryFile(mode='w+b', prefix='dot_', suffix='.svg', delete=False)
         graph.draw(tf.name, format='svg', prog='dot')
         logger.info('Workflow execution traced: %s', tf.name)
         webbrowser.open(tf.name)
+
+
+class TraceView(object):
+    """The execution graph rebuilt from the tracer events."""
+
+    def __init__(self):
+        self.levels = []
+        self.current_schedule = []
+        self.timeouts = {}
+        self.results = {}
+        self.errors = {}
+        self.activities = set()
+        self.deps = {}
+        self.nodes = {}
+        self.scheduled_at = {}
+        self.started_at = {}
+        self.finished_at = {}
+
+    def apply(self, event):
+        getattr(self, 'apply_%s' % event[0])(*event[1:])
+
+    def apply_schedule(self, node_id, name, is_activity, at):
+        assert node_id not in self.nodes
+        self.nodes[node_id] = name
+        self.current_schedule.append(node_id)
+        self.timeouts[node_id] = 0
+        self.scheduled_at[node_id] = at
+        if is_activity:
+            self.activities.add(node_id)
+
+    def apply_start(self, node_id, at):
+        assert node_id in self.nodes
+        self.started_at[node_id] = at
+
+    def apply_flush(self):
+        self.levels.append(self.current_schedule)
+        self.current_schedule = []
+
+    def apply_result(self, node_id, result, at):
+        assert node_id in self.nodes
+        assert node_id not in self.finished_at
+        self.levels.append(node_id)
+        self.results[node_id] = result
+        self.finished_at[node_id] = at
+
+    def apply_error(self, node_id, reason, at):
+        assert node_id in self.nodes
+        assert node_id not in self.finished_at
+        self.levels.append(node_id)
+        self.errors[node_id] = reason
+        self.finished_at[node_id] = at
+
+    def apply_timeout(self, node_id):
+        assert node_id in self.nodes
+        assert node_id not in self.results or node_id not in self.errors
+        self.timeouts[node_id] += 1
+
+    def apply_dependency(self, from_node, to_node):
+        self.deps.setdefault(from_node, []).append(to_node)
+
+    def start_time(self, node_id):
+        """When the task started, the schedule time if it's not known."""
+        return self.started_at.get(node_id, self.scheduled_at[node_id])
+
+    def latency(self, node_id):
+        """The time from schedule to finish of a finished task."""
+        return self.finished_at[node_id] - self.scheduled_at[node_id]
+
+    def predecessors(self):
+        """Map each node to the nodes it depends on."""
+        preds = {}
+        for from_node, to_nodes in self.deps.items():
+            for to_node in to_nodes:
+                preds.setdefault(to_node, set()).add(from_node)
+        return preds
+
+    def critical_path(self):
+        """The chain of finished tasks that determined the run duration.
+
+        Start from the task that finished last and walk back, always through
+        the dependency that finished last, as that's the one that delayed
+        the scheduling of its successor.
+        """
+        finished = self.finished_at
+        if not finished:
+            return []
+        preds = self.predecessors()
+        node_id = max(finished, key=lambda n: (finished[n], n))
+        path = [node_id]
+        while 1:
+            deps = [n for n in preds.get(node_id, ()) if n in finished]
+            if not deps:
+                break
+            node_id = max(deps, key=lambda n: (finished[n], n))
+            path.append(node_id)
+        path.reverse()
+        return path
+
+    def slack(self):
+        """Map each finished task to its slack, in seconds.
+
+        The slack is how much later a task could have finished without
+        delaying the end of the run, if its successors were scheduled as soon
+        as their dependencies were ready. The tasks on the critical path have
+        (almost) no slack, the difference is the decision latency.
+        """
+        finished = self.finished_at
+        if not finished:
+            return {}
+        end = max(finished.values())
+        latest = {}
+        # Walk the tasks in the reverse finish order, the successors finish
+        # after their dependencies so they are handled first.
+        for node_id in sorted(finished, key=lambda n: finished[n],
+                              reverse=True):
+            succ_latest = [latest[s] - self.latency(s)
+                           for s in self.deps.get(node_id, ())
+                           if s in latest]
+            latest[node_id] = min(succ_latest) if succ_latest else end
+        return dict((n, latest[n] - finished[n]) for n in finished)
+
+    def parallelism(self):
+        """The number of tasks executing over time.
+
+        Returns a list of (timestamp, running tasks) tuples, one for each
+        change. A task is executing from its start until its finish time.
+        """
+        changes = []
+        for node_id, finished in self.finished_at.items():
+            changes.append((self.start_time(node_id), 1))
+            changes.append((finished, -1))
+        changes.sort()
+        profile = []
+        running = 0
+        for at, delta in changes:
+            running += delta
+            if profile and profile[-1][0] == at:
+                profile[-1] = (at, running)
+            else:
+                profile.append((at, running))
+        return profile
+
+    def aggregate(self):
+        """Collapse the sibling calls to the same task.
+
+        The calls to the same activity or workflow scheduled together, at the
+        same level, are merged in a group. Returns a (groups, edges) tuple:
+        groups is a list of dicts with the group id, name, level, the node ids
+        and the counts of errors, unfinished tasks and timeouts, plus the
+        min/mean/max latency of the finished tasks (None if there are none);
+        edges maps (from group id, to group id) to the number of dependencies
+        between the two groups. It runs in linear time.
+        """
+        schedules = [l for l in self.levels if isinstance(l, list)]
+        if self.current_schedule:
+            schedules.append(self.current_schedule)
+        groups = []
+        group_of = {}
+        for level, node_ids in enumerate(schedules):
+            by_name = {}
+            for node_id in node_ids:
+                name = self.nodes[node_id]
+                group = by_name.get(name)
+                if group is None:
+                    group = by_name[name] = {
+                        'id': '%s@%s' % (name, level), 'name': name,
+                        'level': level, 'nodes': [],
+                        'activity': node_id in self.activities}
+                    groups.append(group)
+                group['nodes'].append(node_id)
+                group_of[node_id] = group['id']
+        for group in groups:
+            node_ids = group['nodes']
+            latencies = [self.latency(n) for n in node_ids
+                         if n in self.finished_at]
+            group['errors'] = sum(1 for n in node_ids if n in self.errors)
+            group['unfinished'] = len(node_ids) - len(latencies)
+            group['timeouts'] = sum(self.timeouts[n] for n in node_ids)
+            group['latency'] = None
+            if latencies:
+                group['latency'] = (min(latencies),
+                                    sum(latencies) / float(len(latencies)),
+                                    max(latencies))
+        edges = {}
+        for from_node, to_nodes in self.deps.items():
+            from_group = group_of.get(from_node)
+            for to_node in to_nodes:
+                to_group = group_of.get(to_node)
+                if from_group is None or to_group is None:
+                    continue
+                key = (from_group, to_group)
+                edges[key] = edges.get(key, 0) + 1
+        return groups, edges
+
+    def summary(self, top=10):
+        """A plain text report of the run timings."""
+        finished = self.finished_at
+        if not finished:
+            return 'No finished tasks.'
+        begin = min(self.scheduled_at.values())
+        end = max(finished.values())
+        profile = self.parallelism()
+        max_parallelism = max(running for _, running in profile)
+        lines = ['Duration: %.3fs, finished tasks: %s, max parallelism: %s' %
+                 (end - begin, len(finished), max_parallelism)]
+        slack = self.slack()
+
+        def describe(node_id):
+            start = self.start_time(node_id)
+            return '  %-20s %-20s queued %8.3fs  ran %8.3fs  slack %8.3fs' % (
+                node_id, self.nodes[node_id],
+                start - self.scheduled_at[node_id],
+                finished[node_id] - start,
+                slack[node_id])
+
+        path = self.critical_path()
+        path_latency = sum(self.latency(n) for n in path)
+        lines.append('Critical path: %s tasks, %.3fs in tasks' %
+                     (len(path), path_latency))
+        lines.extend(describe(n) for n in path)
+        lines.append('Top latency contributors:')
+        by_latency = sorted(finished, key=lambda n: (-self.latency(n), n))
+        lines.extend(describe(n) for n in by_latency[:top])
+        return '\n'.join(lines)
+
+
+def _aggregated_dot(graph, view):
+    groups, edges = view.aggregate()
+    levels = {}
+    for group in groups:
+        label = group['name']
+        if len(group['nodes']) > 1:
+            label += ' x%s' % len(group['nodes'])
+        details = []
+        if group['errors']:
+            details.append('errors: %s' % group['errors'])
+        if group['unfinished']:
+            details.append('unfinished: %s' % group['unfinished'])
+        if group['timeouts']:
+            details.append('timeouts: %s' % group['timeouts'])
+        if group['latency'] is not None:
+            details.append('latency: %.3f/%.3f/%.3fs' % group['latency'])
+        color = 'black'
+        if group['errors'] == len(group['nodes']):
+            color = 'red'
+        elif group['errors'] or group['timeouts']:
+            color = 'orange'
+        shape = 'ellipse' if group['activity'] else 'box'
+        style = 'dashed' if group['unfinished'] else ''
+        graph.add_node(group['id'], label='\n'.join([label] + details),
+                       shape=shape, color=color, fontcolor=color,
+                       style=style, fontsize=10)
+        levels.setdefault(group['level'], []).append(group['id'])
+    for level in sorted(levels):
+        graph.add_subgraph(levels[level], rank='same')
+    for (from_group, to_group), count in edges.items():
+        label = ' %s' % count if count > 1 else ''
+        graph.add_edge(from_group, to_group, label=label, fontsize=8)
+    return graph
+
+
+def _now(at):
+    return time.time() if at is None else at
@@ -1,3 +1,4 @@
+import heapq
 import itertools
 import logging
 import sys
@@ -9,7 +10,7 @@ except ImportError:
 
 
 __all__ = ['logger', 'sentinel', 'setup_default_logger', 'i_or_args',
-           'short_repr', 'caller_module']
+           'short_repr', 'caller_module', 'chrome_trace']
 
 
 logger = logging.getLogger(__name__.split('.', 1)[0])
@@ -103,6 +104,42 @@ class DescCounter(object):
         return next(self.iterator)
 
 
+def chrome_trace(spans, process_name='flowy'):
+    """Convert spans to the Trace Event Format used by chrome://tracing.
+
+    The result is a JSON serializable dict that can be loaded in Perfetto or
+    chrome://tracing. Each span is a (name, category, start, finish, args)
+    tuple, with the times in seconds since the epoch. Overlapping spans are
+    placed on different lanes (threads), reusing the free lanes first.
+    """
+    spans = sorted(spans, key=lambda span: (span[2], span[3]))
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': 1, 'tid': 0,
+               'args': {'name': process_name}}]
+    if not spans:
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+    origin = spans[0][2]
+    busy, free = [], []  # (finish, lane) and lane heaps
+    lanes = 0
+    for name, category, start, finish, args in spans:
+        while busy and busy[0][0] <= start:
+            heapq.heappush(free, heapq.heappop(busy)[1])
+        if free:
+            lane = heapq.heappop(free)
+        else:
+            lane = lanes
+            lanes += 1
+        heapq.heappush(busy, (finish, lane))
+        events.append({'name': name, 'cat': category, 'ph': 'X',
+                       'pid': 1, 'tid': lane,
+                       'ts': (start - origin) * 1e6,
+                       'dur': (finish - start) * 1e6,
+                       'args': args})
+    for lane in range(lanes):
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                       'tid': lane, 'args': {'name': 'lane %s' % lane}})
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
 # Stolen from Pyramid
 def caller_module(level=2, sys=sys):
     module_globals = sys._getframe(level).f_globals
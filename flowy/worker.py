@@ -1,6 +1,9 @@
 import venusian
 
 from flowy.config import Restart
+from flowy.manifest import dump_manifest
+from flowy.manifest import load_manifest
+from flowy.metrics import null_metrics
 from flowy.result import SuspendTask
 from flowy.result import TaskError
 from flowy.utils import logger
@@ -14,9 +17,16 @@ class Worker(object):
     """A runner for all registered wrapped functions."""
 
     categories = []  # venusian categories to scan for
+    metrics_prefix = 'task'  # the prefix of the metric names
 
-    def __init__(self):
+    def __init__(self, metrics=None):
+        """Initialize the worker.
+
+        The metrics object, see flowy.metrics, gets the timings and the
+        outcomes of the executions; by default they are discarded.
+        """
         self.registry = {}
+        self.metrics = null_metrics if metrics is None else metrics
 
     def register(self, config, func, key=None):
         """Register a config and a function with a key."""
@@ -37,6 +47,10 @@ class Worker(object):
 
         Any exra_args are also passed along to the wrapped_key.
 
+        If the wrapped func has a true takes_metrics attribute, as the config
+        wrappers do, it's also called with the worker metrics as the metrics
+        keyword argument.
+
         The actual actions are dispatched to the decision object and can be one
         of:
             * flush() - nothing to do, any pending actions should be commited
@@ -44,27 +58,43 @@ class Worker(object):
             * finish(e) - ignore pending actions, complete the execution
             * restart(serialized_input) - ignore pending actions, restart the execution
         """
+        metrics = self.task_metrics(key)
+        prefix = self.metrics_prefix
         try:
             wrapped_func = self.registry[key]
         except KeyError:
             logger.error("Colud not find implementation for key: %r", (key,))
+            metrics.incr(prefix + '.unknown')
             return  # Let it timeout
+        running = metrics.timer(prefix + '.run').start()
+        options = {}
+        if getattr(wrapped_func, 'takes_metrics', False):
+            options['metrics'] = metrics
         try:
-            serialized_result = wrapped_func(input_data, *extra_args)
+            serialized_result = wrapped_func(input_data, *extra_args, **options)
         except SuspendTask:  # only from workflows
-            decision.flush()
+            outcome, respond, args = 'suspend', decision.flush, ()
         except TaskError as e:  # only from workflows
             logger.exception('Unhandled task error in task:')
-            decision.fail(e)
+            outcome, respond, args = 'fail', decision.fail, (e, )
         except Restart as e:  # only from workflows
-            decision.restart(e.input_data)
+            outcome, respond, args = 'restart', decision.restart, (e.input_data, )
         except Exception as e:
             logger.exception('Unhandled exception in task:')
-            decision.fail(e)
+            outcome, respond, args = 'error', decision.fail, (e, )
         else:
-            decision.finish(serialized_result)
-
-    def scan(self, categories=None, package=None, ignore=None, level=0):
+            outcome, respond, args = 'finish', decision.finish, (serialized_result, )
+        running.stop()
+        metrics.incr('%s.outcome.%s' % (prefix, outcome))
+        with metrics.timer(prefix + '.respond'):
+            respond(*args)
+
+    def task_metrics(self, key):
+        """Return the metrics used for the executions of key."""
+        return self.metrics
+
+    def scan(self, categories=None, package=None, ignore=None, level=0,
+             manifest=None):
         """Scan for registered implementations and their configs.
 
         The categories can be used to scan for only a subset of tasks. By
@@ -78,13 +108,42 @@ class Worker(object):
         The level represents the additional stack frames to add to the caller
         package identification code. This is useful when this call happens
         inside another function.
+
+        If the path of a manifest written by write_manifest is set, only the
+        modules listed in it are imported; if the manifest is stale, a full
+        scan is done instead. The ignore argument doesn't apply to the
+        manifest, the one used to write it does.
         """
         if categories is None:
             categories = self.categories
+        if package is None:
+            package = caller_package(level=2 + level)
+        if manifest is not None:
+            registrations = load_manifest(manifest, package, categories)
+            if registrations is not None:
+                for config, key, func in registrations:
+                    config.register(self, key, func)
+                return
+            logger.warning('Falling back to a full scan of %s.',
+                           package.__name__)
         scanner = self.make_scanner()
+        scanner.scan(package, categories=categories, ignore=ignore)
+
+    def write_manifest(self, path, categories=None, package=None, ignore=None,
+                       level=0):
+        """Scan, like scan does, and write the registrations found to path.
+
+        See flowy.manifest. The configs must be module globals.
+        """
+        if categories is None:
+            categories = self.categories
         if package is None:
             package = caller_package(level=2 + level)
+        registrations = []
+        scanner = self.make_scanner()
+        scanner.record_registration = lambda *r: registrations.append(r)
         scanner.scan(package, categories=categories, ignore=ignore)
+        dump_manifest(path, package, categories, registrations)
 
     def make_scanner(self):
         return venusian.Scanner(register_task=self.register_task)
@@ -0,0 +1,21 @@
+"""Coroutine activities, kept apart so that python 2 can skip them."""
+import asyncio
+
+
+in_flight = 0
+max_in_flight = 0
+
+
+async def atactivity(a=None, b=None, err=None):
+    global in_flight, max_in_flight
+    in_flight += 1
+    max_in_flight = max(max_in_flight, in_flight)
+    try:
+        await asyncio.sleep(0.01)
+    finally:
+        in_flight -= 1
+    if err is not None:
+        raise RuntimeError(err)
+    if b is not None:
+        return a + b
+    return a + 1
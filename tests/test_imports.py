@@ -0,0 +1,30 @@
+import subprocess
+import sys
+import unittest
+
+import flowy
+
+
+def imported_modules(statement):
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        '%s\nimport sys\nprint(" ".join(sys.modules))' % statement])
+    return set(output.decode('utf-8').split())
+
+
+class TestLazyImports(unittest.TestCase):
+    def test_local_does_not_import_boto(self):
+        modules = imported_modules('from flowy import LocalWorkflow')
+        self.assertTrue('flowy.local.config' in modules)
+        self.assertFalse('boto3' in modules)
+        self.assertFalse('botocore' in modules)
+
+    def test_swf_imports_boto(self):
+        modules = imported_modules('from flowy import SWFWorkflowWorker')
+        self.assertTrue('boto3' in modules)
+
+    def test_public_names(self):
+        for name in flowy.__all__:
+            self.assertTrue(getattr(flowy, name) is not None)
+            self.assertTrue(name in dir(flowy))
+        self.assertRaises(AttributeError, getattr, flowy, 'missing')
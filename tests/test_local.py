@@ -1,4 +1,5 @@
 import inspect
+import threading
 import time
 import unittest
 from functools import partial
@@ -7,12 +8,27 @@ from flowy import LocalWorkflow
 from flowy import TaskError
 from flowy import parallel_reduce
 from flowy import restart
+from flowy.local.runner import WorkflowRunner
+from flowy.local.transport import MappedResult
+from flowy.local.transport import MmapTransport
+from flowy.local.transport import loads as transport_loads
+from flowy.serialization import dumps
+from flowy.serialization import loads
 
 try:
+    from concurrent.futures import Future
+    from concurrent.futures import ProcessPoolExecutor
     from concurrent.futures import ThreadPoolExecutor
 except ImportError:
+    from futures import Future
+    from futures import ProcessPoolExecutor
     from futures import ThreadPoolExecutor
 
+try:
+    import aio_activities
+except SyntaxError:  # no async def on python 2
+    aio_activities = None
+
 
 def tactivity(a=None, b=None, err=None):
     if a is not None and b is not None:
@@ -54,6 +70,24 @@ class F(object):
         return self.task(err='Err!')
 
 
+def blob(n):
+    return b'x' * n
+
+
+def blob_size(b):
+    assert isinstance(b, MappedResult)
+    return len(b.view())
+
+
+class B(object):
+    def __init__(self, blob, size):
+        self.blob = blob
+        self.size = size
+
+    def __call__(self, n):
+        return self.size(self.blob(n)), self.blob(n)
+
+
 class TestLocalWorkflow(unittest.TestCase):
     def test_activities_processes(self):
         main = LocalWorkflow(W)
@@ -146,6 +180,108 @@ class TestLocalWorkflow(unittest.TestCase):
         main.conf_workflow('task', sub)
         self.assertRaises(TaskError, lambda: main.run(throw=True, _wait=True))
 
+    def test_mmap_transport_processes(self):
+        main = LocalWorkflow(B, mmap_threshold=1024)
+        main.conf_activity('blob', blob)
+        main.conf_activity('size', blob_size)
+        size, data = main.run(4096, _wait=True)
+        self.assertEquals(size, 4096)
+        # copied from the mapped file before the transport was closed
+        self.assertEquals(data, b'x' * 4096)
+
+    def test_mmap_handles_only_decoded_locally(self):
+        data = dumps([MappedResult('/tmp/result', 10)])
+        self.assertEquals(loads(data), [{' m': ['/tmp/result', 10]}])
+        self.assertEquals(transport_loads(data),
+                          [MappedResult('/tmp/result', 10)])
+
+    def test_mmap_transport_small_results(self):
+        t = MmapTransport(1024)
+        try:
+            self.assertEquals(t.put(b'x' * 10), b'x' * 10)
+            self.assertEquals(t.put(u'x' * 2048), u'x' * 2048)
+            r = t.put(bytearray(2048))
+            self.assertTrue(isinstance(r, MappedResult))
+            self.assertEquals(r.tobytes(), b'\0' * 2048)
+        finally:
+            t.close()
+
+    def test_split_executors_warm_up(self):
+        main = LocalWorkflow(W,
+                             activity_executor=ProcessPoolExecutor,
+                             decision_executor=ThreadPoolExecutor,
+                             warm_up=True)
+        main.conf_activity('m', tactivity)
+        main.conf_activity('r', tactivity)
+        self.assertEquals(main.modules(), set([__name__]))
+        result = main.run(8, r=True, _wait=True)
+        self.assertEquals(result, 45)
+
+    @unittest.skipIf(aio_activities is None, 'coroutines not supported')
+    def test_coroutine_activities(self):
+        main = LocalWorkflow(W, executor=ThreadPoolExecutor,
+                             coroutine_workers=4)
+        main.conf_activity('m', aio_activities.atactivity)
+        main.conf_activity('r', tactivity)
+        result = main.run(32, r=True, _wait=True)
+        self.assertEquals(result, 561)
+        self.assertTrue(aio_activities.max_in_flight <= 4)
+
+    @unittest.skipIf(aio_activities is None, 'coroutines not supported')
+    def test_fail_coroutine_activity(self):
+        main = LocalWorkflow(F, executor=ThreadPoolExecutor)
+        main.conf_activity('task', aio_activities.atactivity)
+        self.assertRaises(TaskError, lambda: main.run(_wait=True))
+
+
+class BlockingExecutor(object):
+    """Return futures completed by the test; the block_at submit blocks."""
+
+    def __init__(self, block_at=None):
+        self.futures = []
+        self.block_at = block_at
+        self.blocked = threading.Event()
+        self.unblock = threading.Event()
+
+    def submit(self, fn, *args, **kwargs):
+        f = Future()
+        self.futures.append(f)
+        if len(self.futures) == self.block_at:
+            self.blocked.set()
+            self.unblock.wait(10)
+        return f
+
+
+class TestCompletionBatching(unittest.TestCase):
+    def test_completions_during_decision(self):
+        decisions = BlockingExecutor()
+        activities = BlockingExecutor(block_at=4)
+        runner = WorkflowRunner(None, decisions, activities, 'input')
+        decision = Future()
+        decision.set_result({'type': 'schedule', 'activities': [
+            {'id': 'a-%s-0' % i, 'input_data': dumps([[i], {}]),
+             'f': tactivity} for i in range(4)]})
+        # The decision holds the runner lock while scheduling, and it's
+        # blocked when scheduling the last activity
+        t = threading.Thread(target=runner.schedule_tasks, args=(decision, ))
+        t.start()
+        self.assertTrue(activities.blocked.wait(10))
+        for i, f in enumerate(activities.futures[:3]):
+            f.set_result(i)
+        self.assertEquals(len(runner.completions), 3)  # none applied yet
+        activities.unblock.set()
+        t.join(10)
+        # The three completions are applied in a single new decision
+        self.assertEquals(len(runner.completions), 0)
+        self.assertEquals(len(decisions.futures), 1)
+        self.assertEquals(sorted(runner.state.results),
+                          ['a-0-0', 'a-1-0', 'a-2-0'])
+        # With that decision in flight, the last one waits for the next
+        activities.futures[3].set_result(3)
+        self.assertEquals(len(decisions.futures), 1)
+        self.assertEquals(len(runner.state.results), 4)
+        self.assertTrue(runner.history_updated)
+
 
 class TestExamples(unittest.TestCase):
     """Since there are time assertions, this tests can generate false
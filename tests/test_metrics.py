@@ -0,0 +1,250 @@
+import logging
+import socket
+import time
+import unittest
+
+from flowy import AggregateMetrics
+from flowy import StatsdMetrics
+from flowy import SWFActivityConfig
+from flowy import SWFActivityWorker
+from flowy import SWFWorkflowConfig
+from flowy import SWFWorkflowWorker
+from flowy.serialization import dumps
+from flowy.swf.worker import poll_decision
+from flowy.worker import Worker
+
+
+w_conf = SWFWorkflowConfig()
+w_conf.conf_activity('double', 1)
+
+
+class Quadruple(object):
+    def __init__(self, double):
+        self.double = double
+
+    def __call__(self, x):
+        return self.double(self.double(x))
+
+
+def make_history():
+    events = [
+        ('WorkflowExecutionStarted', {
+            'workflowType': {'name': 'Quadruple', 'version': '1'},
+            'taskList': {'name': 'tl'},
+            'taskStartToCloseTimeout': '60',
+            'executionStartToCloseTimeout': '600',
+            'childPolicy': 'TERMINATE',
+            'input': dumps([[3], {}])}),
+        ('DecisionTaskScheduled', {}),
+        ('DecisionTaskStarted', {'scheduledEventId': 2}),
+        ('DecisionTaskCompleted', {'scheduledEventId': 2}),
+        ('ActivityTaskScheduled', {
+            'activityId': 'double-0-0',
+            'activityType': {'name': 'double', 'version': '1'}}),
+        ('ActivityTaskStarted', {'scheduledEventId': 5}),
+        ('ActivityTaskCompleted', {'scheduledEventId': 5,
+                                   'result': dumps(6)}),
+        ('DecisionTaskScheduled', {}),
+        ('DecisionTaskStarted', {'scheduledEventId': 8}),
+    ]
+    history = []
+    for event_id, (e_type, attrs) in enumerate(events, 1):
+        attrs_key = e_type[0].lower() + e_type[1:] + 'EventAttributes'
+        history.append({'eventId': event_id, 'eventType': e_type,
+                        'eventTimestamp': 1000 + event_id, attrs_key: attrs})
+    return history
+
+
+class PagesClient(object):
+    """Serve a history in pages of 4 events, after an empty poll."""
+
+    def __init__(self, events):
+        self.events = events
+        self.polls = 0
+        self.decisions = None
+
+    def poll_for_decision_task(self, domain, task_list, identity=None,
+                               next_page_token=None):
+        self.polls += 1
+        if self.polls == 1:
+            return {'taskToken': '', 'events': []}
+        start = int(next_page_token or 0)
+        page = {'taskToken': 'token', 'events': self.events[start:start + 4],
+                'startedEventId': len(self.events)}
+        if start + 4 < len(self.events):
+            page['nextPageToken'] = str(start + 4)
+        return page
+
+    def respond_decision_task_completed(self, token, decisions=None):
+        self.decisions = decisions
+
+
+class TestAggregateMetrics(unittest.TestCase):
+    def test_summary(self):
+        metrics = AggregateMetrics(sample_size=10)
+        for i in range(100):
+            metrics.histogram('h', i)
+        metrics.incr('c')
+        metrics.incr('c', 2)
+        with metrics.timer('t'):
+            pass
+        summary = metrics.summary()
+        self.assertEquals(summary['counters'], {'c': 3})
+        h = summary['histograms']['h']
+        self.assertEquals((h['count'], h['min'], h['max'], h['mean']),
+                          (100, 0, 99, 49.5))
+        self.assertEquals(summary['timings']['t']['count'], 1)
+        self.assertTrue('c' in metrics.report())
+        self.assertEquals(metrics.summary(reset=True)['counters'], {'c': 3})
+        self.assertEquals(metrics.summary()['counters'], {})
+
+    def test_keyed(self):
+        metrics = AggregateMetrics()
+        metrics.keyed('my task', 1).incr('c')
+        self.assertEquals(metrics.summary()['counters'], {'c.my_task.1': 1})
+
+    def test_report_every(self):
+        metrics = AggregateMetrics()
+        metrics.incr('reported')
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        logger = logging.getLogger('flowy')
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel('INFO')
+        try:
+            metrics.report_every(0.01)
+            for _ in range(500):
+                if records:
+                    break
+                time.sleep(0.01)
+            metrics.stop_reporting()
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+        self.assertTrue('reported' in records[0].getMessage())
+
+    def test_timer(self):
+        metrics = AggregateMetrics()
+        timer = metrics.timer('t')
+        for _ in range(3):
+            timer.start()
+            timer.stop()
+        self.assertEquals(timer.count, 3)
+        self.assertEquals(metrics.summary()['timings']['t']['count'], 3)
+
+
+class TestStatsdMetrics(unittest.TestCase):
+    def test_send(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        server.settimeout(5)
+        try:
+            metrics = StatsdMetrics(port=server.getsockname()[1], prefix='x')
+            metrics.incr('c')
+            metrics.timing('t', 0.5)
+            metrics.histogram('h', 7)
+            received = [server.recv(1024) for _ in range(3)]
+        finally:
+            server.close()
+        self.assertEquals(received, [b'x.c:1|c', b'x.t:500.000|ms',
+                                     b'x.h:7|h'])
+
+
+class TestDecisionMetrics(unittest.TestCase):
+    def test_phases(self):
+        metrics = AggregateMetrics()
+        worker = SWFWorkflowWorker(metrics=metrics)
+        worker.register(w_conf, Quadruple, version=1)
+        client = PagesClient(make_history())
+        name, version, input_data, exec_history, decision = poll_decision(
+            client, 'domain', 'tl', metrics=metrics)
+        worker(name, version, input_data, decision, exec_history)
+        self.assertEquals(len(client.decisions), 1)
+        summary = metrics.summary()
+        self.assertEquals(summary['counters'], {
+            'workflow.empty_polls': 1, 'workflow.outcome.suspend': 1})
+        self.assertEquals(sorted(summary['timings']), [
+            'activity.queue_wait.double.1', 'workflow.deserialize', 'workflow.load_events', 'workflow.page',
+            'workflow.poll', 'workflow.replay', 'workflow.respond',
+            'workflow.run', 'workflow.serialize'])
+        self.assertEquals(
+            summary['timings']['activity.queue_wait.double.1']['max'], 1)
+        self.assertEquals(summary['timings']['workflow.page']['count'], 2)
+        histograms = dict((name, h['max'])
+                          for name, h in summary['histograms'].items())
+        self.assertEquals(histograms, {
+            'workflow.history_events': 9, 'workflow.history_pages': 3,
+            'workflow.proxy_calls': 2, 'workflow.decisions': 1})
+
+
+a_conf = SWFActivityConfig()
+
+
+def double(heartbeat, x):
+    heartbeat()
+    heartbeat()
+    return x * 2
+
+
+class ActivityClient(object):
+    """Serve an activity task after an empty poll."""
+
+    def __init__(self):
+        self.polls = 0
+        self.result = None
+
+    def poll_for_activity_task(self, domain, task_list, identity=None):
+        self.polls += 1
+        if self.polls == 1:
+            return {'taskToken': ''}
+        return {'taskToken': 'token', 'input': dumps([[21], {}]),
+                'activityType': {'name': 'double', 'version': '1'}}
+
+    def record_activity_task_heartbeat(self, token, details=None):
+        pass
+
+    def respond_activity_task_completed(self, token, result=None):
+        self.result = result
+
+
+class OneTaskWorker(SWFActivityWorker):
+    def break_loop(self):
+        return self.client.result is not None
+
+
+class TestActivityMetrics(unittest.TestCase):
+    def test_activity(self):
+        metrics = AggregateMetrics()
+        worker = OneTaskWorker(metrics=metrics)
+        worker.register(a_conf, double, version=1)
+        worker.client = ActivityClient()
+        worker.run_forever('domain', 'tl', swf_client=worker.client,
+                           setup_log=False, register_remote=False)
+        self.assertEquals(worker.client.result, '42')
+        summary = metrics.summary()
+        self.assertEquals(summary['counters'], {
+            'activity.empty_polls': 1,
+            'activity.heartbeats.double.1': 2,
+            'activity.outcome.finish.double.1': 1})
+        self.assertEquals(sorted(summary['timings']), [
+            'activity.deserialize.double.1', 'activity.execute.double.1',
+            'activity.poll', 'activity.respond.double.1',
+            'activity.run.double.1', 'activity.serialize.double.1'])
+        self.assertEquals(summary['histograms']['activity.input_size.double.1'][
+            'max'], len(dumps([[21], {}])))
+        self.assertEquals(summary['histograms'][
+            'activity.result_size.double.1']['max'], 2)
+
+    def test_plain_task(self):
+        # registered without a config, it doesn't take the metrics
+        metrics = AggregateMetrics()
+        worker = Worker(metrics=metrics)
+        worker.register_task('plain', lambda input_data: input_data * 2)
+        finished = []
+        decision = type('Decision', (object, ), {'finish': finished.append})()
+        worker('plain', 'ab', decision)
+        self.assertEquals(finished, ['abab'])
+        self.assertEquals(metrics.summary()['counters'],
+                          {'task.outcome.finish': 1})
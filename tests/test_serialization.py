@@ -109,6 +109,30 @@ def test_collect_err_and_results(value, result):
     assert collect_err_and_results(r, v) == result
 
 
+def make_dependencies_cases():
+    from flowy.result import error, placeholder, result
+
+    r0 = result(u'r0', 0)
+    e1 = error('err1', 1)
+    e2 = error('err2', 2)
+    ph = placeholder()
+
+    return (
+        (((None, False, None), 1), (None, False, None)),
+        (((None, False, None), ph), (None, True, None)),
+        (((None, False, None), e1), (e1, False, None)),
+        (((e2, True, None), e1), (e1, True, None)),
+        (((None, False, None), r0), (None, False, [r0])),
+    )
+
+
+@pytest.mark.parametrize(['value', 'result'], make_dependencies_cases())
+def test_collect_dependencies(value, result):
+    from flowy.serialization import collect_dependencies
+    r, v = value
+    assert collect_dependencies(r, v) == result
+
+
 
 import uuid
 x_uuid = uuid.uuid4()
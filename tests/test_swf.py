@@ -1,5 +1,8 @@
 import json
+import os
 import pprint
+import shutil
+import tempfile
 import unittest
 
 from flowy.swf.history import SWFExecutionHistory
@@ -222,6 +225,47 @@ class TestScan(unittest.TestCase):
         assert ('Closure', '1') in worker.registry
         assert ('Named', '1') in worker.registry
 
+    def test_scan_manifest(self):
+        from flowy import SWFWorkflowWorker
+        import workflows
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'manifest.json')
+            worker = SWFWorkflowWorker()
+            worker.write_manifest(path, package=workflows)
+            from_manifest = SWFWorkflowWorker()
+            from_manifest.scan(package=workflows, manifest=path)
+            self.assertEquals(sorted(from_manifest.registry),
+                              sorted(worker.registry))
+            self.assertEquals(len(from_manifest.remote_reg_callbacks),
+                              len(worker.remote_reg_callbacks))
+            with open(path) as f:
+                manifest = json.load(f)
+            manifest['fingerprint'] = 'stale'
+            with open(path, 'w') as f:
+                json.dump(manifest, f)
+            full_scan = SWFWorkflowWorker()
+            full_scan.scan(package=workflows, manifest=path)
+            self.assertEquals(sorted(full_scan.registry),
+                              sorted(worker.registry))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_fingerprint_mtime(self):
+        from flowy.manifest import fingerprint
+        import workflows
+        path = workflows.__file__
+        if path.endswith('.pyc'):
+            path = path[:-1]
+        stat = os.stat(path)
+        before = fingerprint(workflows)
+        try:
+            os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+            self.assertNotEqual(fingerprint(workflows), before)
+        finally:
+            os.utime(path, (stat.st_atime, stat.st_mtime))
+        self.assertEquals(fingerprint(workflows), before)
+
 
 class TestParallelReduce(unittest.TestCase):
     def test_empty_iterable(self):
@@ -0,0 +1,158 @@
+import datetime
+import unittest
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+from flowy.swf.analysis import event_time
+from flowy.swf.analysis import history_dependencies
+from flowy.swf.analysis import history_tracer
+from flowy.swf.analysis import history_tasks
+from flowy.swf.analysis import latency_stats
+from flowy.swf.analysis import load_history_file
+from flowy.swf.analysis import report
+from flowy.swf.analysis import time_breakdown
+from flowy.swf.analysis import to_chrome_trace
+
+
+def make_history():
+    """A workflow with a decision, an activity and a failed child workflow.
+
+    A second decision schedules another activity after both of them finish.
+    """
+    events = [
+        ('WorkflowExecutionStarted', 0, {}),
+        ('DecisionTaskScheduled', 0, {}),
+        ('DecisionTaskStarted', 1, {'scheduledEventId': 2}),
+        ('DecisionTaskCompleted', 2, {'scheduledEventId': 2}),
+        ('ActivityTaskScheduled', 2, {
+            'activityId': 'a-0-0',
+            'activityType': {'name': 'a', 'version': '1'},
+            'decisionTaskCompletedEventId': 4}),
+        ('StartChildWorkflowExecutionInitiated', 2, {
+            'workflowId': 'x:w-0-0',
+            'workflowType': {'name': 'w', 'version': '1'},
+            'decisionTaskCompletedEventId': 4}),
+        ('ActivityTaskStarted', 4, {'scheduledEventId': 5}),
+        ('ChildWorkflowExecutionStarted', 5, {'initiatedEventId': 6}),
+        ('ActivityTaskCompleted', 7, {'scheduledEventId': 5}),
+        ('ChildWorkflowExecutionFailed', 8, {'initiatedEventId': 6}),
+        ('DecisionTaskScheduled', 8, {}),
+        ('DecisionTaskStarted', 9, {'scheduledEventId': 11}),
+        ('DecisionTaskCompleted', 10, {'scheduledEventId': 11}),
+        ('ActivityTaskScheduled', 10, {
+            'activityId': 'b-0-0',
+            'activityType': {'name': 'b', 'version': '1'},
+            'decisionTaskCompletedEventId': 13}),
+        ('ActivityTaskStarted', 11, {'scheduledEventId': 14}),
+        ('ActivityTaskCompleted', 13, {'scheduledEventId': 14}),
+    ]
+    history = []
+    for event_id, (e_type, at, attrs) in enumerate(events, 1):
+        attrs_key = e_type[0].lower() + e_type[1:] + 'EventAttributes'
+        history.append({'eventId': event_id, 'eventType': e_type,
+                        'eventTimestamp': 1000 + at, attrs_key: attrs})
+    return history
+
+
+class TestHistoryTasks(unittest.TestCase):
+    def test_event_time(self):
+        self.assertEquals(event_time({'eventTimestamp': 1.5}), 1.5)
+        dt = datetime.datetime(1970, 1, 1, 0, 0, 2, 500000)
+        self.assertEquals(event_time({'eventTimestamp': dt}), 2.5)
+
+    def test_tasks(self):
+        tasks = history_tasks(make_history())
+        summary = [(t.kind, t.task_id, t.name, t.scheduled, t.started,
+                    t.finished, t.outcome) for t in tasks]
+        self.assertEquals(summary, [
+            ('decision', '2', 'decision', 1000, 1001, 1002,
+             'DecisionTaskCompleted'),
+            ('activity', 'a-0-0', 'a', 1002, 1004, 1007,
+             'ActivityTaskCompleted'),
+            ('workflow', 'x:w-0-0', 'w', 1002, 1005, 1008,
+             'ChildWorkflowExecutionFailed'),
+            ('decision', '11', 'decision', 1008, 1009, 1010,
+             'DecisionTaskCompleted'),
+            ('activity', 'b-0-0', 'b', 1010, 1011, 1013,
+             'ActivityTaskCompleted'),
+        ])
+        self.assertEquals([t.decision for t in tasks],
+                          [None, tasks[0], tasks[0], None, tasks[3]])
+
+    def test_chrome_trace(self):
+        trace = to_chrome_trace(make_history())
+        spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEquals(
+            [(s['name'], s['tid'], s['ts'], s['dur']) for s in spans],
+            [('decision', 0, 0, 1e6),
+             ('a', 0, 3e6, 3e6),
+             ('w', 1, 4e6, 3e6),
+             ('decision', 0, 8e6, 1e6),
+             ('b', 0, 10e6, 2e6)])
+
+
+class TestHistoryAnalysis(unittest.TestCase):
+    def test_dependencies(self):
+        tasks = history_tasks(make_history())
+        deps = history_dependencies(tasks)
+        self.assertEquals(
+            dict((t.task_id, sorted(d.task_id for d in ds))
+                 for t, ds in deps.items()),
+            {'a-0-0': [], 'x:w-0-0': [], 'b-0-0': ['a-0-0', 'x:w-0-0']})
+
+    def test_tracer_levels(self):
+        history = make_history()
+        # b is scheduled again, in the same decision, after it closed
+        history.append({'eventId': 17, 'eventType': 'ActivityTaskScheduled',
+                        'eventTimestamp': 1014,
+                        'activityTaskScheduledEventAttributes': {
+                            'activityId': 'b-0-0',
+                            'activityType': {'name': 'b', 'version': '1'},
+                            'decisionTaskCompletedEventId': 13}})
+        view = history_tracer(history).view()
+        schedules = [l for l in view.levels if isinstance(l, list)]
+        # one level for the decision that scheduled a and w together
+        self.assertEquals(schedules, [['a-0-0', 'x:w-0-0'], ['b-0-0'],
+                                      ['b-0-0#2']])
+        self.assertEquals(sorted(view.nodes),
+                          ['a-0-0', 'b-0-0', 'b-0-0#2', 'x:w-0-0'])
+
+    def test_latency_stats(self):
+        stats = latency_stats(history_tasks(make_history()))
+        self.assertEquals(sorted(stats), [('activity', 'a'),
+                                          ('activity', 'b'),
+                                          ('decision', 'decision'),
+                                          ('workflow', 'w')])
+        decisions = stats[('decision', 'decision')]
+        self.assertEquals(decisions['count'], 2)
+        self.assertEquals(decisions['schedule_to_start']['mean'], 1)
+        self.assertEquals(stats[('activity', 'b')]['start_to_close']['max'],
+                          2)
+
+    def test_time_breakdown(self):
+        breakdown = time_breakdown(make_history())
+        self.assertEquals(breakdown, {
+            'total': 13, 'queueing': 4, 'executing': 5, 'decider_lag': 4,
+            'critical_path': ['x:w-0-0', 'b-0-0']})
+
+    def test_report(self):
+        text = report(make_history())
+        self.assertTrue(text.startswith('Events: 16, duration: 13.000s'))
+        self.assertIn('decider lag', text)
+
+    def test_load_history_file(self):
+        d = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, d)
+        history = make_history()
+        plain = os.path.join(d, 'history.json')
+        with open(plain, 'w') as f:
+            json.dump({'events': history}, f)
+        compressed = os.path.join(d, 'history.json.gz')
+        with gzip.open(compressed, 'wb') as f:
+            f.write(json.dumps(history).encode('utf-8'))
+        self.assertEquals(load_history_file(plain), history)
+        self.assertEquals(load_history_file(compressed), history)
@@ -0,0 +1,333 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+
+from botocore.exceptions import ClientError
+
+from flowy import SWFActivityConfig
+from flowy import SWFActivityWorker
+from flowy import SWFClient
+from flowy import SWFWorkflowConfig
+from flowy import SWFWorkflowStarter
+from flowy import SWFWorkflowWorker
+from flowy import TaskError
+from flowy import wait
+from flowy.__main__ import start_many
+from flowy.serialization import loads
+from flowy.swf.config import SWFRegistrationError
+from flowy.swf.emulator import SWFEmulator
+
+
+DOMAIN = 'emulator'
+TASKLIST = 'tl'
+IDLE_TASKLIST = 'idle'  # no workers are polling this one
+TIME_SCALE = 0.05
+
+
+a_conf = SWFActivityConfig(default_task_list=TASKLIST,
+                           default_schedule_to_start=60,
+                           default_schedule_to_close=120,
+                           default_start_to_close=60,
+                           default_heartbeat=60)
+
+
+def square(hb, x):
+    hb()
+    return x * x
+
+
+def slow(hb, x):
+    time.sleep(20 * TIME_SCALE)
+    return x
+
+
+w_conf = SWFWorkflowConfig(default_task_list=TASKLIST,
+                           default_decision_duration=60,
+                           default_workflow_duration=600,
+                           default_child_policy='TERMINATE')
+w_conf.conf_activity('square', 1)
+w_conf.conf_activity('slow', 1, start_to_close=1, retry=(0, ))
+w_conf.conf_activity('delayed', 1, 'square', retry=(3, ))
+w_conf.conf_workflow('child', 1, 'Child')
+
+
+class Parent(object):
+    def __init__(self, square, slow, delayed, child):
+        self.square = square
+        self.slow = slow
+        self.delayed = delayed
+        self.child = child
+
+    def __call__(self, n):
+        squares = [self.square(i) for i in range(n)]
+        try:
+            wait(self.slow(1))
+        except TaskError:
+            timed_out = True
+        else:
+            timed_out = False
+        return sum(squares), self.delayed(3), self.child(2), timed_out
+
+
+class Child(object):
+    def __init__(self, square, slow, delayed, child):
+        self.square = square
+
+    def __call__(self, x):
+        return self.square(x) + 1
+
+
+local_attempts = []
+
+
+def double(x):
+    return 2 * x
+
+
+def flaky(x):
+    local_attempts.append(x)
+    if len(local_attempts) < 2:
+        raise ValueError('first attempt')
+    return x + 1
+
+
+def hang(x):
+    time.sleep(1)
+
+
+l_conf = SWFWorkflowConfig(default_task_list=TASKLIST,
+                           default_decision_duration=60,
+                           default_workflow_duration=600,
+                           default_child_policy='TERMINATE')
+l_conf.conf_activity('square', 1)
+l_conf.conf_local_activity('double', double)
+l_conf.conf_local_activity('flaky', flaky, retry=(0, 1))
+l_conf.conf_local_activity('hang', hang, timeout=0.05, retry=(0, ))
+
+
+class Local(object):
+    def __init__(self, square, double, flaky, hang):
+        self.square = square
+        self.double = double
+        self.flaky = flaky
+        self.hang = hang
+
+    def __call__(self, n):
+        try:
+            wait(self.hang(n))
+        except TaskError:
+            timed_out = True
+        else:
+            timed_out = False
+        return self.double(self.square(n)), self.flaky(n), timed_out
+
+
+workflow_worker = SWFWorkflowWorker()
+workflow_worker.register(w_conf, Parent, version=1)
+workflow_worker.register(w_conf, Child, version=1)
+workflow_worker.register(l_conf, Local, version=1)
+activity_worker = SWFActivityWorker()
+activity_worker.register(a_conf, square, version=1)
+activity_worker.register(a_conf, slow, version=1)
+
+
+class TestSWFEmulator(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A small page size so that the deciders have to load more pages
+        cls.emulator = SWFEmulator(time_scale=TIME_SCALE, page_size=10)
+        cls.client = SWFClient(client=cls.emulator)
+        workflow_worker.register_remote(cls.client, DOMAIN)
+        activity_worker.register_remote(cls.client, DOMAIN)
+        cls.client.register_workflow_type(DOMAIN, 'Idle', '1',
+                                          default_task_list=IDLE_TASKLIST,
+                                          default_task_timeout=1,
+                                          default_exec_timeout=600,
+                                          default_child_policy='TERMINATE')
+        # The workers threads are never stopped, they wait in polls
+        for worker, count in ((workflow_worker, 2), (activity_worker, 4)):
+            for _ in range(count):
+                t = threading.Thread(target=worker.run_forever,
+                                     args=(DOMAIN, TASKLIST),
+                                     kwargs={'swf_client': cls.client,
+                                             'setup_log': False,
+                                             'register_remote': False})
+                t.daemon = True
+                t.start()
+
+    def setUp(self):
+        del local_attempts[:]  # flaky fails its first attempt in each test
+
+    def history(self, wid, run_id, page_size=1000):
+        events = []
+        token = None
+        while 1:
+            page = self.client.get_workflow_execution_history(
+                DOMAIN, wid, run_id, next_page_token=token,
+                max_page_size=page_size)
+            events.extend(page['events'])
+            token = page.get('nextPageToken')
+            if not token:
+                return events
+
+    def test_workflow(self):
+        wid = str(uuid.uuid4())
+        run_id = SWFWorkflowStarter(DOMAIN, 'Parent', 1, wid=wid,
+                                    swf_client=self.client)(4)
+        self.assertEquals(self.emulator.wait_closed(wid, run_id, timeout=30),
+                          'COMPLETED')
+        events = self.history(wid, run_id)
+        e_types = set(e['eventType'] for e in events)
+        for e_type in ('ActivityTaskTimedOut', 'TimerFired',
+                       'ChildWorkflowExecutionCompleted'):
+            self.assertTrue(e_type in e_types, e_type)
+        completed = events[-1]
+        self.assertEquals(completed['eventType'], 'WorkflowExecutionCompleted')
+        result = completed['workflowExecutionCompletedEventAttributes'][
+            'result']
+        self.assertEquals(loads(result), [14, 9, 5, True])
+        self.assertEquals(self.history(wid, run_id, page_size=3), events)
+
+    def test_local_activities(self):
+        wid = str(uuid.uuid4())
+        run_id = SWFWorkflowStarter(DOMAIN, 'Local', 1, wid=wid,
+                                    swf_client=self.client)(3)
+        self.assertEquals(self.emulator.wait_closed(wid, run_id, timeout=30),
+                          'COMPLETED')
+        events = self.history(wid, run_id)
+        markers = [e['markerRecordedEventAttributes']['details']
+                   for e in events if e['eventType'] == 'MarkerRecorded']
+        # double, hang, and two flaky attempts, the second after a timer
+        self.assertEquals(len(markers), 4)
+        self.assertEquals(local_attempts, [3, 3])
+        self.assertTrue(any(e['eventType'] == 'TimerFired' for e in events))
+        result = events[-1]['workflowExecutionCompletedEventAttributes'][
+            'result']
+        self.assertEquals(loads(result), [18, 4, True])
+
+    def test_start_errors(self):
+        wid = str(uuid.uuid4())
+        self.assertRaises(ClientError, self.client.start_workflow_execution,
+                          DOMAIN, wid, 'Unknown', '1')
+        self.client.start_workflow_execution(DOMAIN, wid, 'Idle', '1')
+        try:
+            self.client.start_workflow_execution(DOMAIN, wid, 'Idle', '1')
+        except ClientError as e:
+            self.assertEquals(e.response['Error']['Code'],
+                              'WorkflowExecutionAlreadyStartedFault')
+        else:
+            self.fail('The same workflow id was started twice.')
+
+    def test_count_pending(self):
+        task_list = 'count-%s' % uuid.uuid4()
+        for _ in range(2):
+            self.client.start_workflow_execution(
+                DOMAIN, str(uuid.uuid4()), 'Idle', '1', task_list=task_list)
+        self.assertEquals(self.client.count_pending_decision_tasks(
+            DOMAIN, task_list)['count'], 2)
+        self.client.poll_for_decision_task(DOMAIN, task_list)
+        self.assertEquals(self.client.count_pending_decision_tasks(
+            DOMAIN, task_list)['count'], 1)
+        self.assertEquals(self.client.count_pending_activity_tasks(
+            DOMAIN, task_list)['count'], 0)
+
+    def test_long_poll_and_decision_timeout(self):
+        result = {}
+
+        def poll():
+            result['first'] = self.client.poll_for_decision_task(
+                DOMAIN, IDLE_TASKLIST)
+
+        poller = threading.Thread(target=poll)
+        poller.start()
+        time.sleep(0.1)
+        wid = str(uuid.uuid4())
+        run_id = self.client.start_workflow_execution(
+            DOMAIN, wid, 'Idle', '1', task_list=IDLE_TASKLIST)['runId']
+        poller.join(10)
+        first = result['first']
+        self.assertEquals(first['workflowExecution']['workflowId'], wid)
+        # The first decision times out and another one is scheduled
+        second = self.client.poll_for_decision_task(DOMAIN, IDLE_TASKLIST)
+        self.assertEquals(second['workflowExecution']['runId'], run_id)
+        self.assertEquals([e['eventType'] for e in second['events']], [
+            'WorkflowExecutionStarted', 'DecisionTaskScheduled',
+            'DecisionTaskStarted', 'DecisionTaskTimedOut',
+            'DecisionTaskScheduled', 'DecisionTaskStarted'])
+        self.assertRaises(ClientError,
+                          self.client.respond_decision_task_completed,
+                          first['taskToken'])
+        self.client.respond_decision_task_completed(
+            second['taskToken'], decisions=[{
+                'decisionType': 'CompleteWorkflowExecution',
+                'completeWorkflowExecutionDecisionAttributes': {}}])
+        self.assertEquals(self.emulator.wait_closed(wid, run_id, timeout=0),
+                          'COMPLETED')
+
+    def test_registration_cache(self):
+        calls = []
+
+        class CountingClient(object):
+            def __init__(self, client):
+                self.client = client
+
+            def __getattr__(self, name):
+                calls.append(name)
+                return getattr(self.client, name)
+
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            cache = os.path.join(tmp_dir, 'cache.json')
+            client = CountingClient(self.client)
+            for expected_calls in (4, 0):
+                del calls[:]
+                worker = SWFActivityWorker(registration_cache=cache,
+                                           registration_concurrency=2)
+                worker.register(a_conf, square, version=1)
+                worker.register(a_conf, slow, version=1)
+                worker.register_remote(client, DOMAIN)
+                self.assertEquals(len(calls), expected_calls)
+            changed = SWFActivityConfig(default_task_list='other')
+            worker = SWFActivityWorker(registration_cache=cache)
+            worker.register(changed, square, version=1)
+            self.assertRaises(SWFRegistrationError, worker.register_remote,
+                              client, DOMAIN)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_start_many(self):
+        starter = SWFWorkflowStarter(DOMAIN, 'Idle', 1, swf_client=self.client)
+        inputs = [[[i], {}] for i in range(20)] + [[['x' * 40000], {}]]
+        results = sorted(starter.start_many(iter(inputs), concurrency=4))
+        self.assertEquals([r.index for r in results], list(range(21)))
+        for r in results[:-1]:
+            self.assertEquals(r.error, None)
+            events = self.history(r.wid, r.run_id)
+            attrs = events[0]['workflowExecutionStartedEventAttributes']
+            self.assertEquals(loads(attrs['input']), [[r.index], {}])
+        self.assertTrue(isinstance(results[-1].error, ValueError))
+        self.assertEquals(results[-1].run_id, None)
+        unknown = SWFWorkflowStarter(DOMAIN, 'Unknown', 1,
+                                     swf_client=self.client)
+        result, = unknown.start_many([[[], {}]])
+        self.assertTrue(isinstance(result.error, ClientError))
+
+    def test_start_from_lines(self):
+        starter = SWFWorkflowStarter(DOMAIN, 'Idle', 1, swf_client=self.client)
+        lines = ['[[1], {}]\n', '\n', 'not json\n', '[[], {"x": 2}]\n']
+        out, progress = io.StringIO(), io.StringIO()
+        self.assertEquals(start_many(starter, lines, 2, out, progress), 1)
+        results = sorted((json.loads(line) for line in
+                          out.getvalue().splitlines()),
+                         key=lambda r: r['line'])
+        self.assertEquals([r['line'] for r in results], [1, 3, 4])
+        self.assertTrue('error' in results[1])
+        for r in (results[0], results[2]):
+            self.assertEquals(sorted(r), ['line', 'runId', 'workflowId'])
+        self.assertTrue(progress.getvalue().startswith('2 started, 1 failed'))
@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from flowy import SWFWorkflowConfig
+from flowy import SWFWorkflowWorker
+from flowy.__main__ import main
+from flowy.serialization import dumps
+from flowy.serialization import loads
+from flowy.swf.replay import decision_events
+from flowy.swf.replay import load_worker
+from flowy.swf.replay import profile
+from flowy.swf.replay import replay
+
+
+w_conf = SWFWorkflowConfig()
+w_conf.conf_activity('double', 1)
+
+
+class Quadruple(object):
+    def __init__(self, double):
+        self.double = double
+
+    def __call__(self, x):
+        return self.double(self.double(x))
+
+
+worker = SWFWorkflowWorker()
+worker.register(w_conf, Quadruple, version=1)
+
+
+def make_history():
+    """Two decisions: the first schedules an activity, the second finds it
+    completed and schedules another one with its result."""
+    events = [
+        ('WorkflowExecutionStarted', {
+            'workflowType': {'name': 'Quadruple', 'version': '1'},
+            'taskList': {'name': 'tl'},
+            'taskStartToCloseTimeout': '60',
+            'executionStartToCloseTimeout': '600',
+            'childPolicy': 'TERMINATE',
+            'input': dumps([[3], {}])}),
+        ('DecisionTaskScheduled', {}),
+        ('DecisionTaskStarted', {'scheduledEventId': 2}),
+        ('DecisionTaskCompleted', {'scheduledEventId': 2}),
+        ('ActivityTaskScheduled', {
+            'activityId': 'double-0-0',
+            'activityType': {'name': 'double', 'version': '1'}}),
+        ('ActivityTaskStarted', {'scheduledEventId': 5}),
+        ('ActivityTaskCompleted', {'scheduledEventId': 5,
+                                   'result': dumps(6)}),
+        ('DecisionTaskScheduled', {}),
+        ('DecisionTaskStarted', {'scheduledEventId': 8}),
+    ]
+    history = []
+    for event_id, (e_type, attrs) in enumerate(events, 1):
+        attrs_key = e_type[0].lower() + e_type[1:] + 'EventAttributes'
+        history.append({'eventId': event_id, 'eventType': e_type,
+                        'eventTimestamp': 1000 + event_id, attrs_key: attrs})
+    return history
+
+
+class TestReplay(unittest.TestCase):
+    def scheduled(self, decisions):
+        result = []
+        for d in decisions:
+            attrs = d['scheduleActivityTaskDecisionAttributes']
+            result.append((attrs['activityId'], loads(attrs['input'])))
+        return result
+
+    def test_decision_events(self):
+        history = make_history()
+        self.assertEquals(len(decision_events(history)), 9)
+        self.assertEquals(len(decision_events(history, upto=8)), 3)
+        self.assertRaises(ValueError, decision_events, history, upto=2)
+
+    def test_replay(self):
+        history = make_history()
+        self.assertEquals(self.scheduled(replay(worker, history)),
+                          [('double-1-0', [[6], {}])])
+        self.assertEquals(self.scheduled(replay(worker, history, upto=3)),
+                          [('double-0-0', [[3], {}])])
+
+    def test_unregistered(self):
+        self.assertRaises(ValueError, replay, SWFWorkflowWorker(),
+                          make_history())
+
+    def test_load_worker(self):
+        self.assertTrue(load_worker('%s:worker' % __name__) is worker)
+        self.assertRaises(ValueError, load_worker, '%s:w_conf' % __name__)
+
+    def test_profile(self):
+        decisions, report = profile(5, replay, worker, make_history())
+        self.assertEquals(len(decisions), 1)
+        self.assertTrue('function calls' in report)
+
+
+class TestReplayCommand(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'history.json')
+        with open(self.path, 'w') as f:
+            json.dump({'events': make_history()}, f)
+        self.stdout = sys.stdout
+        sys.stdout = self.output = tempfile.TemporaryFile('w+')
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        self.output.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_replay(self):
+        self.assertEquals(main(['replay', self.path, '%s:worker' % __name__,
+                                '--profile', '--top', '3']), 0)
+        self.output.seek(0)
+        output = self.output.read()
+        decisions = json.loads(output[:output.index('\n]') + 2])
+        self.assertEquals(decisions[0]['decisionType'], 'ScheduleActivityTask')
+        self.assertTrue('cumulative' in output)
@@ -0,0 +1,154 @@
+import time
+import unittest
+
+from botocore.exceptions import ClientError
+from botocore.exceptions import EndpointConnectionError
+
+from flowy import AggregateMetrics
+from flowy.swf.retry import CircuitBreaker
+from flowy.swf.retry import RetryPolicy
+from flowy.swf.retry import error_class
+from flowy.swf.worker import poll_activity_task
+from flowy.swf.worker import poll_first_page
+
+
+def client_error(code, status=400):
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}},
+                       'Operation')
+
+
+class Flaky(object):
+    """Raise the errors, in order, then return 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+class FlakyPollClient(object):
+    def __init__(self, *errors):
+        self.poll = Flaky(*errors)
+
+    def poll_for_decision_task(self, domain, task_list, identity=None):
+        self.poll()
+        return {'taskToken': 'token', 'events': []}
+
+    def poll_for_activity_task(self, domain, task_list, identity=None):
+        self.poll()
+        return {'taskToken': 'token'}
+
+
+class TestErrorClass(unittest.TestCase):
+    def test_classes(self):
+        self.assertEquals(error_class(client_error('ThrottlingException')),
+                          'throttling')
+        self.assertEquals(error_class(client_error('InternalFailure', 500)),
+                          'transient')
+        self.assertEquals(error_class(client_error('Whatever', 503)),
+                          'transient')
+        self.assertEquals(
+            error_class(EndpointConnectionError(endpoint_url='x')),
+            'transient')
+        self.assertEquals(error_class(client_error('UnknownResourceFault')),
+                          'fatal')
+        self.assertEquals(error_class(ValueError()), 'fatal')
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_retries(self):
+        metrics = AggregateMetrics()
+        policy = RetryPolicy(base_delay=0, metrics=metrics)
+        func = Flaky(client_error('ThrottlingException'),
+                     client_error('InternalFailure', 500))
+        self.assertEquals(policy.call('Op', func), 'ok')
+        self.assertEquals(func.calls, 3)
+        self.assertEquals(metrics.summary()['counters'], {
+            'swf.retries.Op.throttling': 1, 'swf.retries.Op.transient': 1})
+
+    def test_fatal(self):
+        policy = RetryPolicy(base_delay=0)
+        func = Flaky(client_error('UnknownResourceFault'))
+        self.assertRaises(ClientError, policy.call, 'Op', func)
+        self.assertEquals(func.calls, 1)
+
+    def test_max_attempts(self):
+        policy = RetryPolicy(base_delay=0, max_attempts=2)
+        func = Flaky(*[client_error('ThrottlingException')] * 3)
+        self.assertRaises(ClientError, policy.call, 'Op', func)
+        self.assertEquals(func.calls, 2)
+        self.assertEquals(policy.with_attempts(None).call('Op', func), 'ok')
+
+    def test_delay(self):
+        policy = RetryPolicy(base_delay=1, max_delay=10)
+        for attempt in range(100):
+            delay = policy.delay(attempt)
+            self.assertTrue(0 <= delay <= min(10, 2 ** attempt))
+
+    def test_breaker(self):
+        metrics = AggregateMetrics()
+        breaker = CircuitBreaker(threshold=2, timeout=0.05)
+        policy = RetryPolicy(base_delay=0, max_attempts=1, breaker=breaker,
+                             metrics=metrics)
+        func = Flaky(*[client_error('ThrottlingException')] * 2)
+        self.assertRaises(ClientError, policy.call, 'Op', func)
+        self.assertEquals(breaker.wait_time(), 0)
+        self.assertRaises(ClientError, policy.call, 'Op', func)
+        self.assertTrue(breaker.wait_time() > 0)
+        # The next call waits for the breaker to close
+        start = time.time()
+        self.assertEquals(policy.call('Op', func), 'ok')
+        self.assertTrue(time.time() - start >= 0.04)
+        summary = metrics.summary()
+        self.assertEquals(summary['counters']['swf.breaker_opened.Op'], 1)
+        self.assertEquals(summary['timings']['swf.breaker_wait.Op']['count'],
+                          1)
+
+    def test_breaker_ignores_fatal_errors(self):
+        breaker = CircuitBreaker(threshold=1)
+        policy = RetryPolicy(breaker=breaker)
+        func = Flaky(client_error('UnknownResourceFault'))
+        self.assertRaises(ClientError, policy.call, 'Op', func)
+        self.assertEquals(breaker.wait_time(), 0)
+
+
+class TestPollRetry(unittest.TestCase):
+    def test_poll_backs_off(self):
+        metrics = AggregateMetrics()
+        policy = RetryPolicy(base_delay=0, max_attempts=1, metrics=metrics)
+        client = FlakyPollClient(
+            client_error('ThrottlingException'),
+            client_error('ThrottlingException'),
+            client_error('UnknownResourceFault'))
+        page = poll_first_page(client, 'domain', 'tl', metrics=metrics,
+                               retry=policy)
+        self.assertEquals(page['taskToken'], 'token')
+        self.assertEquals(client.poll.calls, 4)
+        counters = metrics.summary()['counters']
+        self.assertEquals(counters['swf.retries.PollForDecisionTask.throttling'],
+                          2)
+        self.assertEquals(counters['workflow.poll_errors'], 1)
+
+    def test_poll_stops_while_throttled(self):
+        for poll in poll_first_page, poll_activity_task:
+            policy = RetryPolicy(base_delay=0,
+                                 breaker=CircuitBreaker(threshold=1000))
+            client = FlakyPollClient(
+                *[client_error('ThrottlingException')] * 100)
+            checks = []
+
+            def keep_polling():
+                checks.append(1)
+                return len(checks) < 2
+
+            page = poll(client, 'domain', 'tl', retry=policy,
+                        keep_polling=keep_polling)
+            self.assertEquals(page, None)
+            self.assertEquals(len(checks), 2)
+            self.assertTrue(client.poll.calls < 100)
@@ -0,0 +1,113 @@
+import threading
+import time
+import unittest
+
+from flowy import AggregateMetrics
+from flowy import SWFActivityConfig
+from flowy import SWFActivityWorker
+from flowy.serialization import dumps
+from flowy.swf.scaling import AdaptiveConcurrency
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def test_update(self):
+        scaler = AdaptiveConcurrency(1, 10)
+        self.assertEquals(scaler.target, 1)
+        self.assertEquals(scaler.update(pending=5, busy=2), 7)
+        self.assertEquals(scaler.update(pending=100, busy=0), 10)
+        # down by half the difference at a time
+        self.assertEquals(scaler.update(pending=0, busy=0), 5)
+        self.assertEquals(scaler.update(pending=0, busy=0), 3)
+        self.assertEquals(scaler.update(pending=0, busy=0), 2)
+        self.assertEquals(scaler.update(pending=0, busy=0), 1)
+        self.assertEquals(scaler.update(pending=0, busy=0), 1)
+
+    def test_bounds(self):
+        self.assertRaises(ValueError, AdaptiveConcurrency, 2, 1)
+        self.assertRaises(ValueError, AdaptiveConcurrency, 0, 0)
+        self.assertEquals(AdaptiveConcurrency(0, 1).update(0, 0), 0)
+
+
+a_conf = SWFActivityConfig()
+
+
+def slow_square(heartbeat, x):
+    time.sleep(0.02)
+    return x * x
+
+
+class BacklogClient(object):
+    """Serve a backlog of square tasks."""
+
+    def __init__(self, tasks):
+        self.pending = tasks
+        self.results = []
+        self.lock = threading.Lock()
+
+    def count_pending_activity_tasks(self, domain, task_list):
+        return {'count': self.pending, 'truncated': False}
+
+    def poll_for_activity_task(self, domain, task_list, identity=None):
+        with self.lock:
+            if self.pending:
+                self.pending -= 1
+                return {'taskToken': 'token', 'input': dumps([[3], {}]),
+                        'activityType': {'name': 'slow_square',
+                                         'version': '1'}}
+        time.sleep(0.01)
+        return {'taskToken': ''}
+
+    def respond_activity_task_completed(self, token, result=None):
+        with self.lock:
+            self.results.append(result)
+
+
+class BacklogWorker(SWFActivityWorker):
+    scale_interval = 0.01
+
+    def break_loop(self):
+        return len(self.client.results) == 40
+
+
+class TestAdaptiveWorker(unittest.TestCase):
+    def test_scale_with_backlog(self):
+        metrics = AggregateMetrics()
+        worker = BacklogWorker(metrics=metrics)
+        worker.register(a_conf, slow_square, version=1)
+        worker.client = BacklogClient(40)
+        worker.run_forever('domain', 'tl', swf_client=worker.client,
+                           setup_log=False, register_remote=False,
+                           concurrency=(1, 8))
+        self.assertEquals(worker.client.results, ['9'] * 40)
+        threads = metrics.summary()['histograms']['activity.threads']
+        self.assertEquals(threads['max'], 8)
+        self.assertEquals(metrics.summary()['histograms'][
+            'activity.pending']['max'], 40)
+
+    def test_scaled_down_while_target_raised(self):
+        worker = SWFActivityWorker()
+        worker.scale_interval = 0.01
+        backlog = [2, 0, 0, 2] + [2] * 20
+        calls = []
+        raised = threading.Event()
+
+        def count_pending():
+            calls.append(1)
+            if len(calls) == 4:  # the target goes up again
+                raised.set()
+            return backlog[min(len(calls), len(backlog)) - 1]
+
+        worker.break_loop = lambda: len(calls) >= 20
+
+        def loop(keep_polling):
+            while keep_polling() and not worker.break_loop():
+                time.sleep(0.001)
+            if not worker.break_loop():  # scaled down
+                raised.wait(1)
+                time.sleep(0.05)  # the new target is set by now
+
+        # all the threads look busy polling
+        task_lists = type('TaskLists', (object, ),
+                          {'polling_count': lambda self: 100})()
+        worker.run_loops(loop, (1, 2), task_lists, count_pending)
+        self.assertEquals(len(calls), 20)
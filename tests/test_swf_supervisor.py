@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from flowy import SWFActivityConfig
+from flowy import SWFActivityWorker
+from flowy.serialization import dumps
+from flowy.swf.supervisor import Supervisor
+
+
+a_conf = SWFActivityConfig()
+
+
+def square(heartbeat, x):
+    return x * x
+
+
+class TasksClient(object):
+    """Serve square tasks forever, record the results by pid in a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def poll_for_activity_task(self, domain, task_list, identity=None):
+        time.sleep(0.01)
+        return {'taskToken': 'token', 'input': dumps([[3], {}]),
+                'activityType': {'name': 'square', 'version': '1'}}
+
+    def respond_activity_task_completed(self, token, result=None):
+        with open(self.path, 'a') as f:
+            f.write('%s %s\n' % (os.getpid(), result))
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'results')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def results(self):
+        try:
+            with open(self.path) as f:
+                return [line.split() for line in f]
+        except IOError:
+            return []
+
+    def test_recycle_and_stop(self):
+        worker = SWFActivityWorker()
+        worker.register(a_conf, square, version=1)
+        supervisor = Supervisor(worker, 'domain', 'tl', processes=2,
+                                max_tasks=3,
+                                client_factory=lambda: TasksClient(self.path))
+
+        def stop_later():
+            for _ in range(1000):
+                if len(self.results()) >= 12:
+                    break
+                time.sleep(0.01)
+            supervisor.stop()
+
+        stopper = threading.Thread(target=stop_later)
+        stopper.start()
+        supervisor.run()
+        stopper.join()
+        self.assertEquals(supervisor.children, {})
+        results = self.results()
+        self.assertTrue(len(results) >= 12)
+        self.assertEquals(set(result for _, result in results), set(['9']))
+        tasks_by_pid = {}
+        for pid, _ in results:
+            tasks_by_pid[pid] = tasks_by_pid.get(pid, 0) + 1
+        self.assertTrue(len(tasks_by_pid) >= 4)
+        self.assertTrue(max(tasks_by_pid.values()) <= 3)
@@ -0,0 +1,70 @@
+import unittest
+
+from flowy.swf.tasklist import TaskLists
+from flowy.swf.worker import poll_first_page
+
+
+class TestTaskLists(unittest.TestCase):
+    def test_from_spec(self):
+        self.assertEquals(TaskLists.from_spec('tl').names, ['tl'])
+        strict = TaskLists.from_spec(['fast', 'bulk'])
+        self.assertTrue(strict.strict)
+        self.assertEquals(strict.names, ['fast', 'bulk'])
+        weighted = TaskLists.from_spec({'bulk': 1, 'fast': 3})
+        self.assertFalse(weighted.strict)
+        self.assertEquals(weighted.names, ['fast', 'bulk'])
+        self.assertTrue(TaskLists.from_spec(weighted) is weighted)
+        self.assertRaises(ValueError, TaskLists, [('tl', 0)])
+        self.assertRaises(ValueError, TaskLists, [])
+
+    def test_strict(self):
+        task_lists = TaskLists.from_spec(['fast', 'bulk'])
+        # Both active, all the pollers go to fast
+        self.assertEquals(task_lists.acquire(), 'fast')
+        self.assertEquals(task_lists.acquire(), 'fast')
+        task_lists.release('fast', False)
+        # fast is idle but watched by the other poller
+        self.assertEquals(task_lists.acquire(), 'bulk')
+        task_lists.release('bulk', False)
+        task_lists.release('fast', False)
+        # both idle, nobody watching
+        self.assertEquals(task_lists.acquire(), 'fast')
+        self.assertEquals(task_lists.acquire(), 'bulk')
+        # all idle and watched
+        self.assertEquals(task_lists.acquire(), 'fast')
+        task_lists.release('bulk', True)
+        self.assertEquals(task_lists.acquire(), 'bulk')
+
+    def test_weighted(self):
+        task_lists = TaskLists.from_spec({'fast': 3, 'bulk': 1})
+        counts = {'fast': 0, 'bulk': 0}
+        for _ in range(4000):
+            name = task_lists.acquire()
+            task_lists.release(name, True)
+            counts[name] += 1
+        self.assertTrue(2700 < counts['fast'] < 3300)
+
+
+class OneListClient(object):
+    """Only the busy task list has decisions."""
+
+    def __init__(self):
+        self.polled = []
+
+    def poll_for_decision_task(self, domain, task_list, identity=None):
+        self.polled.append(task_list)
+        if task_list == 'busy':
+            return {'taskToken': 'token', 'events': []}
+        return {'taskToken': '', 'events': []}
+
+
+class TestPollTaskLists(unittest.TestCase):
+    def test_poll_until_task(self):
+        client = OneListClient()
+        task_lists = TaskLists.from_spec(['idle', 'busy'])
+        page = poll_first_page(client, 'domain', task_lists)
+        self.assertEquals(page['taskToken'], 'token')
+        self.assertEquals(client.polled, ['idle', 'busy'])
+        page = poll_first_page(client, 'domain', task_lists)
+        # idle is still idle, but nobody watches it
+        self.assertEquals(client.polled, ['idle', 'busy', 'idle', 'busy'])
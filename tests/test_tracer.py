@@ -0,0 +1,202 @@
+import pickle
+import unittest
+
+from flowy.result import placeholder
+from flowy.result import result
+from flowy.serialization import loads
+from flowy.tracer import ExecutionTracer
+from flowy.tracer import TracingProxy
+
+
+class TestExecutionTracer(unittest.TestCase):
+    def make_tracer(self):
+        t = ExecutionTracer()
+        t.schedule_activity('a-0', 'a')
+        t.schedule_activity('a-1', 'a')
+        t.flush_scheduled()
+        t.result('a-0', 1)
+        t.error('a-1', 'err')
+        return t
+
+    def test_view(self):
+        v = self.make_tracer().view()
+        self.assertEquals(v.nodes, {'a-0': 'a', 'a-1': 'a'})
+        self.assertEquals(v.levels, [['a-0', 'a-1'], 'a-0', 'a-1'])
+        self.assertEquals(v.results, {'a-0': 1})
+        self.assertEquals(v.errors, {'a-1': 'err'})
+        self.assertEquals(v.activities, set(['a-0', 'a-1']))
+
+    def test_view_prefix(self):
+        t = self.make_tracer()
+        v = t.view(upto=3)
+        self.assertEquals(v.levels, [['a-0', 'a-1']])
+        self.assertEquals(v.results, {})
+
+    def test_copy_is_isolated(self):
+        t = self.make_tracer()
+        c = t.copy()
+        t.schedule_workflow('w-0', 'w')
+        c.add_dependency('a-0', 'b-0')
+        self.assertEquals(len(t), 6)
+        self.assertEquals(len(c), 6)
+        self.assertTrue('w-0' in t.view().nodes)
+        self.assertFalse('w-0' in c.view().nodes)
+        self.assertEquals(c.view().deps, {'a-0': ['b-0']})
+        self.assertEquals(t.view().deps, {})
+
+    def test_copy_of_copy(self):
+        t = self.make_tracer()
+        c = t.copy()
+        c.schedule_activity('b-0', 'b')
+        cc = c.copy()
+        c.flush_scheduled()
+        self.assertEquals(len(cc), 6)
+        self.assertEquals(cc.view().current_schedule, ['b-0'])
+
+    def test_reset_keeps_copies(self):
+        t = self.make_tracer()
+        c = t.copy()
+        t.reset()
+        self.assertEquals(len(t), 0)
+        self.assertEquals(len(c), 5)
+
+    def test_pickle(self):
+        c = self.make_tracer().copy()
+        c.add_dependency('a-0', 'b-0')
+        p = pickle.loads(pickle.dumps(c))
+        self.assertEquals(list(p.iter_events()), list(c.iter_events()))
+
+
+class TestTimingAnalysis(unittest.TestCase):
+    def make_tracer(self):
+        # a-0 -> b-0 is the critical path, c-0 -> d-0 has 2s of slack
+        t = ExecutionTracer()
+        t.schedule_activity('a-0', 'a', at=0)
+        t.schedule_activity('c-0', 'c', at=0)
+        t.flush_scheduled()
+        t.start('a-0', at=0)
+        t.start('c-0', at=0.5)
+        t.result('a-0', 1, at=1)
+        t.add_dependency('a-0', 'b-0')
+        t.schedule_activity('b-0', 'b', at=1)
+        t.flush_scheduled()
+        t.result('c-0', 2, at=2)
+        t.add_dependency('c-0', 'd-0')
+        t.schedule_activity('d-0', 'd', at=2)
+        t.flush_scheduled()
+        t.result('d-0', 3, at=3)
+        t.result('b-0', 4, at=5)
+        return t
+
+    def test_critical_path(self):
+        self.assertEquals(self.make_tracer().critical_path(), ['a-0', 'b-0'])
+
+    def test_slack(self):
+        self.assertEquals(self.make_tracer().slack(),
+                          {'a-0': 0, 'b-0': 0, 'c-0': 2, 'd-0': 2})
+
+    def test_parallelism(self):
+        self.assertEquals(self.make_tracer().parallelism(),
+                          [(0, 1), (0.5, 2), (1, 2), (2, 2), (3, 1), (5, 0)])
+
+    def test_summary(self):
+        summary = self.make_tracer().summary(top=1)
+        lines = summary.split('\n')
+        self.assertTrue(lines[0].startswith('Duration: 5.000s'))
+        self.assertTrue(lines[1].startswith('Critical path: 2 tasks'))
+        self.assertTrue(lines[-1].strip().startswith('b-0'))
+
+    def test_chrome_trace(self):
+        trace = self.make_tracer().to_chrome_trace()
+        spans = sorted((e['name'], e['tid'], e['ts'], e['dur'])
+                       for e in trace['traceEvents'] if e['ph'] == 'X')
+        self.assertEquals(spans, [('a', 0, 0, 1e6), ('b', 0, 1e6, 4e6),
+                                  ('c', 1, 0.5e6, 1.5e6),
+                                  ('d', 1, 2e6, 1e6)])
+
+
+class TestAggregate(unittest.TestCase):
+    def make_tracer(self, n):
+        # a fan-out of n a calls and a b call reducing all of them
+        t = ExecutionTracer()
+        for i in range(n):
+            t.schedule_activity('a-%s' % i, 'a', at=0)
+        t.flush_scheduled()
+        for i in range(n):
+            if i % 2:
+                t.error('a-%s' % i, 'err', at=i)
+            else:
+                t.result('a-%s' % i, i, at=i)
+            t.add_dependency('a-%s' % i, 'b-0')
+        t.schedule_activity('b-0', 'b', at=n)
+        t.flush_scheduled()
+        return t
+
+    def test_aggregate(self):
+        groups, edges = self.make_tracer(4).view().aggregate()
+        self.assertEquals(
+            [(g['id'], g['nodes'], g['errors'], g['unfinished'], g['latency'])
+             for g in groups],
+            [('a@0', ['a-0', 'a-1', 'a-2', 'a-3'], 2, 0, (0, 1.5, 3)),
+             ('b@1', ['b-0'], 0, 1, None)])
+        self.assertEquals(edges, {('a@0', 'b@1'): 4})
+
+    def test_aggregate_large_fan_out(self):
+        groups, edges = self.make_tracer(5000).view().aggregate()
+        self.assertEquals(len(groups), 2)
+        self.assertEquals(edges, {('a@0', 'b@1'): 5000})
+
+    def test_display_builds_one_view(self):
+        tracer = self.make_tracer(10)
+        views = []
+        build_view = tracer.view
+
+        def view(upto=None):
+            views.append(upto)
+            return build_view(upto)
+
+        tracer.view = view
+        tracer.to_dot = lambda aggregate, view: views.append(aggregate)
+        tracer.display()  # to_dot returns no graph, nothing is drawn
+        self.assertEquals(views, [None, False])
+
+
+class NotScheduledHistory(object):
+    def is_timeout(self, call_number, retry_number):
+        return False
+
+    is_running = has_result = is_error = is_timeout
+
+
+class RecordingDecision(object):
+    def __init__(self):
+        self.scheduled = []
+
+    def schedule(self, call_number, retry_number, delay, input_data):
+        self.scheduled.append(loads(input_data))
+
+
+class TestTracingProxy(unittest.TestCase):
+    def make_result(self, value, order, node_id):
+        r = result(value, order)
+        r.__factory__.node_id = node_id
+        return r
+
+    def test_nested_dependencies(self):
+        t = ExecutionTracer()
+        d = RecordingDecision()
+        p = TracingProxy(t, 'b', NotScheduledHistory(), d)
+        r0 = self.make_result(1, 0, 'a-0')
+        r1 = self.make_result(2, 1, 'a-1')
+        p([r0, {'x': r1}], y=(r0, ))
+        self.assertEquals(d.scheduled, [[[[1, {'x': 2}]], {'y': [1]}]])
+        self.assertEquals(t.view().deps, {'a-0': ['b-0', 'b-0'],
+                                          'a-1': ['b-0']})
+
+    def test_placeholder_dependencies(self):
+        t = ExecutionTracer()
+        d = RecordingDecision()
+        p = TracingProxy(t, 'b', NotScheduledHistory(), d)
+        p({'x': [self.make_result(1, 0, 'a-0'), placeholder()]})
+        self.assertEquals(d.scheduled, [])
+        self.assertEquals(t.view().deps, {'a-0': ['b-0']})